@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+# Adaptive frequency grids for the responses of the model and the circuit
+# solver, instead of a fixed dense linspace.
+#
+# The sweep starts from a coarse uniform grid. Every interval is tested at
+# its midpoint: the response there is compared with what interpolating
+# linearly in dB and (unwrapped) phase between the ends predicts, and the
+# interval is split in two wherever the error exceeds the tolerance in
+# magnitude or phase. The midpoint is kept either way, so the accepted
+# intervals are the halves of tested ones. All midpoints of a level are
+# evaluated in one call, so a response that takes a frequency array (and
+# returns design_shape + f.shape, like HybridPiModel.gain) is evaluated a
+# handful of times rather than once per point. For a batch of designs the
+# grid is shared, refined wherever any design needs it.
+#
+# Error bound: the interpolation error on an accepted interval is at most the
+# tolerance wherever the response is smooth on the scale of the interval
+# (second order, the midpoint error of its halves is then a quarter of the
+# tested one). Features narrower than the initial spacing can be missed if
+# no initial point falls near them, so n_initial should resolve the
+# narrowest resonance expected. verify measures the actual error against a
+# dense grid.
+
+import numpy as np
+
+# largest phase step (rad) between neighbouring points, so the phase can be
+# unwrapped unambiguously
+MAX_PHASE_STEP = np.pi/4
+
+# halvings of the initial intervals before sample gives up
+DEFAULT_MAX_DEPTH = 16
+
+# magnitudes below this count as this in the dB test (-240 dB), so a zero
+# doesn't make the error infinite. An interval that is zero at both ends
+# and the midpoint, e.g. a dead design in a batch, is converged
+MAGNITUDE_FLOOR = 1e-12
+
+def _db(values):
+    with np.errstate(divide='ignore'):
+        return 20*np.log10(np.abs(values))
+
+def _batch_max(error):
+    # worst case over the design (leading) axes, leaving the interval axis
+    return error.reshape(-1, error.shape[-1]).max(axis=0)
+
+def midpoint_error(left, middle, right, floor=MAGNITUDE_FLOOR):
+    # (dB error, phase error in degrees, largest phase step in rad) of
+    # predicting middle from left and right by linear interpolation, with
+    # magnitudes below floor raised to it
+    with np.errstate(divide='ignore', invalid='ignore'):
+        step_left = np.angle(middle / left)
+        step_right = np.angle(right / middle)
+        error_db = np.abs(_db(np.maximum(np.abs(middle), floor)) -
+                          (_db(np.maximum(np.abs(left), floor)) + _db(np.maximum(np.abs(right), floor)))/2)
+    error_deg = np.abs(step_left - step_right)/2 * 180/np.pi
+    step = np.maximum(np.abs(step_left), np.abs(step_right))
+    # a non finite value can't be interpolated in dB, refine around it
+    error_db = np.where(np.isfinite(error_db), error_db, np.inf)
+
+    # nothing to interpolate where all three are below the floor, the phase
+    # of a zero is meaningless
+    silent = (np.abs(left) < floor) & (np.abs(middle) < floor) & (np.abs(right) < floor)
+    return (np.where(silent, 0, error_db), np.where(silent, 0, error_deg), np.where(silent, 0, step))
+
+def sample(response, f_min, f_max, tolerance_db=0.01, tolerance_deg=0.1, n_initial=33, max_depth=DEFAULT_MAX_DEPTH, log=False,
+           floor=MAGNITUDE_FLOOR):
+    # Returns a dict with the sorted grid 'f', the response on it ('values',
+    # design_shape + f.shape), the number of response calls, and 'converged',
+    # False if some interval still exceeded the tolerance after max_depth
+    # halvings. With log the grid and the midpoints are spaced
+    # logarithmically, for sweeps over decades like the LTspice .ac runs.
+    # Magnitudes below floor are treated as floor (see MAGNITUDE_FLOOR)
+    f = np.geomspace(f_min, f_max, n_initial) if log else np.linspace(f_min, f_max, n_initial)
+    values = np.asarray(response(f))
+    grids = [f]
+    results = [values]
+    calls = 1
+
+    # ends of the intervals still to be tested
+    (f_left, f_right) = (f[:-1], f[1:])
+    (v_left, v_right) = (values[..., :-1], values[..., 1:])
+
+    depth = 0
+    while f_left.size and depth < max_depth:
+        depth += 1
+        f_middle = np.sqrt(f_left * f_right) if log else (f_left + f_right)/2
+        v_middle = np.asarray(response(f_middle))
+        calls += 1
+        grids.append(f_middle)
+        results.append(v_middle)
+
+        (error_db, error_deg, step) = midpoint_error(v_left, v_middle, v_right, floor)
+        split = ((_batch_max(error_db) > tolerance_db) | (_batch_max(error_deg) > tolerance_deg) |
+                 (_batch_max(step) > MAX_PHASE_STEP))
+
+        (f_left, f_right) = (np.concatenate([f_left[split], f_middle[split]]),
+                             np.concatenate([f_middle[split], f_right[split]]))
+        (v_left, v_right) = (np.concatenate([v_left[..., split], v_middle[..., split]], axis=-1),
+                             np.concatenate([v_middle[..., split], v_right[..., split]], axis=-1))
+
+    f = np.concatenate(grids)
+    order = np.argsort(f, kind='stable')
+    return {
+        'f': f[order],
+        'values': np.concatenate(results, axis=-1)[..., order],
+        'calls': calls,
+        'converged': f_left.size == 0,
+    }
+
+def interpolate(f_grid, values, f, log=False):
+    # values (design_shape + f_grid.shape) on the sorted grid interpolated to
+    # f, linearly in dB and unwrapped phase like sample assumes, over log(f)
+    # for a grid sampled with log
+    f = np.asarray(f, dtype=float)
+    right = np.clip(np.searchsorted(f_grid, f), 1, len(f_grid) - 1)
+    left = right - 1
+    if log:
+        weight = np.log(f / f_grid[left]) / np.log(f_grid[right] / f_grid[left])
+    else:
+        weight = (f - f_grid[left]) / (f_grid[right] - f_grid[left])
+
+    with np.errstate(divide='ignore'):
+        log_magnitude = np.log(np.abs(values))
+    phase = np.unwrap(np.angle(values), axis=-1)
+    log_magnitude = log_magnitude[..., left] * (1 - weight) + log_magnitude[..., right] * weight
+    phase = phase[..., left] * (1 - weight) + phase[..., right] * weight
+    return np.exp(log_magnitude + 1j*phase)
+
+def verify(grid, values, f_dense, dense_values, log=False):
+    # (max dB error, max phase error in degrees) of interpolating the
+    # adaptive result against a dense evaluation
+    estimate = interpolate(grid, values, f_dense, log=log)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        error_db = np.nanmax(np.abs(_db(estimate) - _db(dense_values)))
+        error_deg = np.nanmax(np.abs(np.angle(estimate / dense_values))) * 180/np.pi
+    return (float(error_db), float(error_deg))
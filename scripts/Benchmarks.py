@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+
+# Benchmarks of the compute paths behind the scripts, without argparse or
+# plotting. Each benchmark is a setup function that takes one size parameter
+# and returns the function to time, so inputs are built outside the timed
+# region. run_benchmarks.py runs them and records the results as json.
+#
+# Besides the run times, run records the peak memory numpy allocates for one
+# call (traced with tracemalloc, inputs excluded). A benchmark can register a
+# reference setup for the same size, the implementation it replaced, which
+# is timed and traced the same way so the allocation savings stay measured.
+
+import os
+import time
+import tracemalloc
+import numpy as np
+import AdaptiveSampling
+import BiasCalculations
+import CalculationUtils
+import MNASolver
+import SmallSignalModel
+import SpiceReader
+
+REPOSITORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# name -> (setup, sizes, sizes used with --quick)
+BENCHMARKS = {}
+
+# name -> setup of the previous implementation of that benchmark
+REFERENCES = {}
+
+def benchmark(name, sizes, quick_sizes=None):
+    def register(setup):
+        BENCHMARKS[name] = (setup, list(sizes), list(quick_sizes or sizes[:1]))
+        return setup
+    return register
+
+def reference(name):
+    def register(setup):
+        REFERENCES[name] = setup
+        return setup
+    return register
+
+### Helpers ###
+
+# frequency points per design of the (design x frequency) helper inputs
+HELPER_FREQUENCIES = 4000
+
+def _design_array(n_designs):
+    rng = np.random.default_rng(0)
+    shape = (n_designs, HELPER_FREQUENCIES)
+    return rng.normal(size=shape) + 1j*rng.normal(size=shape)
+
+def _parallel_terms(n_designs):
+    # a (design x frequency) array with a per design and a per frequency term
+    rng = np.random.default_rng(0)
+    r_pi = rng.uniform(100, 1000, (n_designs, 1))
+    z_mu = 1/(1j*rng.uniform(1e-3, 1e-2, (1, HELPER_FREQUENCIES)))
+    return (_design_array(n_designs), r_pi, z_mu)
+
+# the helpers before they avoided copies: complex conversion, re**2 + im**2
+# and a python sum of reciprocals
+def _magnitude_reference(c):
+    c = c.astype(complex)
+    return np.sqrt(c.real**2 + c.imag**2)
+
+def _phase_reference(c):
+    c = c.astype(complex)
+    return np.arctan2(c.imag, c.real)
+
+def _parallel_reference(*impedances):
+    reciprocal_sum = 1/impedances[0] + 1/impedances[1]
+    for z in impedances[2:]:
+        reciprocal_sum = reciprocal_sum + 1/z
+    return 1/reciprocal_sum
+
+@benchmark('magnitude', [100, 1000])
+def magnitude(n_designs):
+    z = _design_array(n_designs)
+    return lambda: CalculationUtils.magnitude(z)
+
+@reference('magnitude')
+def magnitude_reference(n_designs):
+    z = _design_array(n_designs)
+    return lambda: _magnitude_reference(z)
+
+@benchmark('magnitude_out', [100, 1000])
+def magnitude_out(n_designs):
+    z = _design_array(n_designs)
+    out = np.empty(z.shape)
+    return lambda: CalculationUtils.magnitude(z, out=out)
+
+@reference('magnitude_out')
+def magnitude_out_reference(n_designs):
+    return magnitude_reference(n_designs)
+
+@benchmark('phase', [100, 1000])
+def phase(n_designs):
+    z = _design_array(n_designs)
+    return lambda: CalculationUtils.phase(z)
+
+@reference('phase')
+def phase_reference(n_designs):
+    z = _design_array(n_designs)
+    return lambda: _phase_reference(z)
+
+@benchmark('parallel', [100, 1000])
+def parallel(n_designs):
+    terms = _parallel_terms(n_designs)
+    return lambda: CalculationUtils.parallel(*terms)
+
+@reference('parallel')
+def parallel_reference(n_designs):
+    terms = _parallel_terms(n_designs)
+    return lambda: _parallel_reference(*terms)
+
+@benchmark('parallel_axis', [100, 1000])
+def parallel_axis(n_designs):
+    stack = np.stack([_design_array(n_designs)]*3)
+    return lambda: CalculationUtils.parallel(stack, axis=0)
+
+@reference('parallel_axis')
+def parallel_axis_reference(n_designs):
+    stack = np.stack([_design_array(n_designs)]*3)
+    return lambda: _parallel_reference(*stack)
+
+### Small signal model ###
+
+@benchmark('gain_response', [10**3, 10**4, 10**5, 10**6])
+def gain_response(n_points):
+    model = SmallSignalModel.HybridPiModel(useCascode=True)
+    f = SmallSignalModel.nmr_band(n_points)
+    return lambda: model.gain(f)
+
+@benchmark('input_impedance_response', [10**3, 10**4, 10**5, 10**6])
+def input_impedance_response(n_points):
+    model = SmallSignalModel.HybridPiModel(useCascode=False)
+    f = SmallSignalModel.nmr_band(n_points)
+    return lambda: CalculationUtils.magnitude(model.input_impedance(f))
+
+@benchmark('adaptive_gain_response', [1, 100, 10**4])
+def adaptive_gain_response(n_designs):
+    # the same designs on a grid refined to 0.01 dB / 0.1 degrees
+    model = SmallSignalModel.HybridPiModel(useCascode=True, I_E=np.linspace(1e-3, 20e-3, n_designs))
+    return lambda: AdaptiveSampling.sample(model.gain, SmallSignalModel.F_MIN, SmallSignalModel.F_MAX)
+
+### Bias network ###
+
+@benchmark('sensitivity_grid', [100, 500, 1000, 2000])
+def sensitivity_grid(n_points):
+    axes = {'Vbe': np.linspace(0.5, 1.25, n_points), 'beta': np.logspace(0, 2.7, n_points)}
+    fixed = {'Vcc': 3.3, 'R1': 60.4, 'R2': 357, 'R3': 13, 'RE': 412}
+    return lambda: BiasCalculations.sensitivity_grid(useCascode=True, I_target=5e-3, axes=axes, fixed=fixed)
+
+@benchmark('solve_R_values', [10**3, 10**5, 10**6], quick_sizes=[10**3, 10**5])
+def solve_R_values(n_designs):
+    rng = np.random.default_rng(0)
+    I_E = rng.uniform(1e-3, 20e-3, n_designs)
+    RC = rng.uniform(20, 200, n_designs)
+    R_parallel = rng.uniform(20, 200, n_designs)
+    return lambda: BiasCalculations.solve_R_values(useCascode=True, Vcc=3.3, Vbe=0.76, Vce1=1, Vce2=0.4,
+            I_E=I_E, RC=RC, R_parallel=R_parallel)
+
+### Circuit solver ###
+
+@benchmark('mna_ac_solve', [10**3, 10**4, 10**5])
+def mna_ac_solve(n_points):
+    circuit = MNASolver.ACCircuit(os.path.join(REPOSITORY, 'LTspice', 'Cascode', 'cascode.net'))
+    f = SmallSignalModel.nmr_band(n_points)
+    return lambda: circuit.solve(f)['V(vout)/V(vin)']
+
+### Simulation files ###
+
+SIMULATION_FILES = {
+    'cascode.txt': os.path.join('LTspice', 'Cascode', 'cascode.txt'),
+    'CE_2stage.txt': os.path.join('LTspice', 'DoubleCommonEmitter', 'BJT_CommonEmitter_2stage_sim.txt'),
+    'CE_PreampSim.raw': os.path.join('LTspice', 'CommonEmitterSingleStage', 'BJT_CommonEmitter_PreampSim.raw'),
+}
+
+@benchmark('parse_simulation', list(SIMULATION_FILES), quick_sizes=list(SIMULATION_FILES))
+def parse_simulation(name):
+    path = os.path.join(REPOSITORY, SIMULATION_FILES[name])
+
+    def parse():
+        # reading every trace completely, so the memory mapped .raw data is touched too
+        traces = SpiceReader.load_traces(path)
+        return [np.asarray(traces[trace]).sum() for trace in traces.keys()]
+    return parse
+
+def peak_bytes(function):
+    # peak memory allocated during one call, the inputs already exist
+    tracemalloc.start()
+    try:
+        result = function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak
+
+def time_function(function, repeats=5, min_time=0.2):
+    # statistics of the run times in seconds, over at least repeats runs and
+    # at least min_time seconds
+    function()
+
+    times = []
+    start = time.perf_counter()
+    while len(times) < repeats or time.perf_counter() - start < min_time:
+        begin = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - begin)
+
+    times = np.array(times)
+    return {'min': float(times.min()), 'median': float(np.median(times)),
+            'mean': float(times.mean()), 'std': float(times.std()), 'runs': len(times)}
+
+def run(name, size, repeats=5, min_time=0.2):
+    # Times one benchmark at one size and traces its peak allocation. With a
+    # reference implementation registered, its fastest run time and peak are
+    # added as reference_min and reference_peak_bytes
+    (setup, _, _) = BENCHMARKS[name]
+    function = setup(size)
+    result = time_function(function, repeats, min_time)
+    result['peak_bytes'] = peak_bytes(function)
+    del function
+
+    if name in REFERENCES:
+        function = REFERENCES[name](size)
+        result['reference_min'] = time_function(function, repeats, min_time)['min']
+        result['reference_peak_bytes'] = peak_bytes(function)
+    return result
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+# Bias network equations for the common-emitter and cascode amplifiers.
+# Everything here works on numpy arrays as well as plain floats, and all
+# design parameters broadcast against each other, so a whole design-space
+# sweep can be solved in one call. Instead of raising on an invalid design,
+# the checks return boolean masks that are True where the design is valid.
+
+import numpy as np
+import CalculationUtils
+
+# collector-emitter voltage below which the BJT is considered saturated
+V_CE_SAT = 0.3
+
+def find_RE(I_E, RC, Vcc, Vce1, Vce2=None):
+    # Whatever is left of Vcc after the collector resistor and the
+    # collector-emitter drop(s) is dropped across RE
+    if Vce2 is None:
+        return (Vcc - I_E*RC - Vce1)/I_E
+
+    return (Vcc - I_E*RC - Vce1 - Vce2)/I_E
+
+def find_R_vals_common_emitter(I_E, RE, Vbe, Vcc, R_parallel):
+    # rearranged from I_E = (Vdiv - Vbe) / RE
+    # Vdiv = Vcc * R2 / (R1 + R2)
+    # rearranging this gives R2 = ( Vdiv / (Vcc - Vdiv) )*R1 = a*R1
+    Vdiv = I_E * RE + Vbe
+    a = Vdiv / (Vcc - Vdiv)
+
+    # R_parallel = R1 * R2 / (R1 + R2)
+    # Plugging in R2 = a*R1 -> R1 = ( (a + 1) / a ) * R_parallel = b * R_parallel
+    b = (a + 1) / a
+    R1 = b * R_parallel
+    R2 = a * R1
+
+    return (R1, R2)
+
+def find_R_vals_cascode(I_E, RE, Vbe, Vcc, Vce2, R_parallel, maximize_input_impedance=False):
+    # Assuming that the effects of beta are negligible:
+    # Current through all three resistors is identical so
+    # V_R3/R3 = V_R2/R2 = V_R1/R1
+    # let a = V_R1/V_R3 = (V1-V2) / (Vcc - V1)
+    # let b = V_R2/V_R3 = V2 / (Vcc - V1)
+    # Then R1 = aR3, R2 = bR3
+    V1 = I_E*RE + Vce2 + Vbe
+    V2 = I_E*RE + Vbe
+
+    a = (V1 - V2) / (Vcc - V1)
+    b = V2 / (Vcc - V1)
+
+    # Plugging equations above into RE = (R2 * (2R3 + R1)) / (R1 + R2 + R3)
+    # and rearranging for R3 maximizes the input impedance. Otherwise plug
+    # them into R_parallel = R1||R2 and rearrange for R3.
+    # maximize_input_impedance may itself be a boolean array.
+    # Indexing with () turns the 0-d result of scalar inputs back into a float
+    R3 = np.where(maximize_input_impedance,
+                  (a + b + 1) / (2*b + a*b) * RE,
+                  (a + b) / (a * b) * R_parallel)[()]
+
+    R1 = a * R3
+    R2 = b * R3
+
+    return (R1, R2, R3)
+
+def check_common_emitter(I_E, RE, RC, Vbe, Vce1, R_parallel):
+    # Returns masks for (beta insensitivity, Q1 in linear region, Q1 not saturated)
+    beta_insensitive = np.asarray(R_parallel <= RE)
+    linear = np.asarray(Vbe <= I_E*RC + Vce1)
+    not_saturated = np.asarray(Vce1 >= V_CE_SAT)
+
+    return (beta_insensitive, linear, not_saturated)
+
+def check_cascode(I_E, RE, RC, Vbe, Vce1, Vce2, R1, R2, R3):
+    # Returns masks for (beta insensitivity, Q1 in linear region, Q1 and Q2 not saturated)
+    beta_insensitive = np.asarray(RE >= (R2 * (2*R3 + R1)) / (R1 + R2 + R3))
+    linear = np.asarray(Vbe <= I_E*RC + Vce1)
+    not_saturated = np.asarray((Vce1 >= V_CE_SAT) & (Vce2 >= V_CE_SAT))
+
+    return (beta_insensitive, linear, not_saturated)
+
+def solve_R_values(useCascode, Vcc, Vbe, Vce1, Vce2, I_E, RC, R_parallel,
+                   RE=None, maximize_input_impedance=False):
+    # Batch equivalent of calculate_R_values.py. All parameters broadcast
+    # against each other. If RE is None it is derived from RC and the
+    # collector-emitter voltages. Returns a dict of equally shaped arrays
+    # holding the resistor values, every individual check and the combined
+    # feasibility mask. R3 is nan for the common-emitter amplifier.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if RE is None:
+            RE = find_RE(I_E, RC, Vcc, Vce1, Vce2 if useCascode else None)
+
+        # maximizing the input impedance means R1||R2 is bounded by RE
+        R_parallel = np.where(maximize_input_impedance, RE, R_parallel)
+
+        if useCascode:
+            (R1, R2, R3) = find_R_vals_cascode(I_E=I_E, RE=RE, Vbe=Vbe, Vcc=Vcc, Vce2=Vce2,
+                    R_parallel=R_parallel, maximize_input_impedance=maximize_input_impedance)
+            # for the cascode the bound is on R2(2R3 + R1)/(R1 + R2 + R3), the
+            # R1||R2 it leaves is lower than RE
+            R_parallel = np.where(maximize_input_impedance, CalculationUtils.parallel(R1, R2), R_parallel)
+            checks = check_cascode(I_E=I_E, RE=RE, RC=RC, Vbe=Vbe, Vce1=Vce1, Vce2=Vce2,
+                    R1=R1, R2=R2, R3=R3)
+        else:
+            (R1, R2) = find_R_vals_common_emitter(I_E=I_E, RE=RE, Vbe=Vbe, Vcc=Vcc,
+                    R_parallel=R_parallel)
+            R3 = np.full(np.shape(R1), np.nan)
+            checks = check_common_emitter(I_E=I_E, RE=RE, RC=RC, Vbe=Vbe, Vce1=Vce1,
+                    R_parallel=R_parallel)
+
+    (beta_insensitive, linear, not_saturated) = np.broadcast_arrays(*checks)
+    shape = np.broadcast_shapes(np.shape(R1), beta_insensitive.shape)
+
+    results = {
+        'R1': R1, 'R2': R2, 'R3': R3, 'RE': RE, 'R_parallel': R_parallel,
+        'beta_insensitive': beta_insensitive,
+        'linear': linear,
+        'not_saturated': not_saturated,
+        'feasible': beta_insensitive & linear & not_saturated,
+    }
+
+    return {name: np.broadcast_to(value, shape) for (name, value) in results.items()}
+
+def get_I_E_cascode(Vbe, beta, Vcc, R1, R2, R3, RE):
+    Vdiv = Vcc * R2 / (R1 + R2 + R3)
+    Rbott = R2 * (2*R3 + R1) / (R1 + R2 + R3)
+
+    return (Vdiv - Vbe) / (Rbott / beta + RE)
+
+def get_I_E_CE(Vbe, beta, Vcc, R1, R2, RE):
+    Vdiv = Vcc * R2 / (R1 + R2)
+    Rbott = CalculationUtils.parallel(R1, R2)
+
+    return (Vdiv - Vbe) / (Rbott / beta + RE)
+
+def get_I_E(useCascode, Vbe, beta, Vcc, R1, R2, RE, R3=None):
+    if useCascode:
+        return get_I_E_cascode(Vbe=Vbe, beta=beta, Vcc=Vcc, R1=R1, R2=R2, R3=R3, RE=RE)
+
+    return get_I_E_CE(Vbe=Vbe, beta=beta, Vcc=Vcc, R1=R1, R2=R2, RE=RE)
+
+# parameters of get_I_E that can be swept in a sensitivity grid
+SENSITIVITY_PARAMETERS = ['Vbe', 'beta', 'Vcc', 'R1', 'R2', 'R3', 'RE']
+
+def sensitivity_grid(useCascode, I_target, axes, fixed, dtype=np.float64, tile_size=2**22):
+    # Percent error of the emitter current from I_target over an N-dimensional
+    # grid. axes is an ordered dict of parameter name -> 1-D array of values,
+    # the result has one dimension per axis in that order. fixed holds the
+    # value of every parameter that isn't swept.
+    #
+    # A parameter can also be swept as a relative deviation by naming the
+    # axis <parameter>_tolerance, e.g. {'RE_tolerance': np.linspace(-0.05, 0.05, 11)}
+    # evaluates RE * (1 + tolerance) around its value in fixed.
+    #
+    # The grid is broadcast from 1-D axes rather than built with meshgrid and
+    # evaluated in tiles along the first axis of at most tile_size points, so
+    # temporaries stay bounded no matter how large the grid is. Passing
+    # dtype=np.float32 halves the memory of the result and every temporary.
+    names = list(axes)
+    values = [np.asarray(axes[name], dtype=dtype) for name in names]
+    shape = tuple(len(value) for value in values)
+
+    for name in names:
+        if name.replace('_tolerance', '') not in SENSITIVITY_PARAMETERS:
+            raise ValueError("Can't sweep " + name + ". Sweepable parameters are: " +
+                             ", ".join(SENSITIVITY_PARAMETERS) + " (optionally with a _tolerance suffix)")
+        # a tolerance is relative to a nominal value, swept or fixed
+        parameter = name.replace('_tolerance', '')
+        if name.endswith('_tolerance') and parameter not in axes and fixed.get(parameter) is None:
+            raise ValueError("Sweeping " + name + " needs the nominal value of " + parameter +
+                             ", either in fixed or as an axis of its own")
+
+    # reshape every axis to broadcast along its own dimension only
+    open_axes = {}
+    for (k, (name, value)) in enumerate(zip(names, values)):
+        open_axes[name] = value.reshape([-1 if i == k else 1 for i in range(len(shape))])
+
+    result = np.empty(shape, dtype=dtype)
+    row_size = int(np.prod(shape[1:]))
+    rows_per_tile = max(1, tile_size // max(row_size, 1))
+
+    for start in range(0, shape[0], rows_per_tile):
+        rows = slice(start, start + rows_per_tile)
+
+        params = {name: (np.asarray(value, dtype=dtype) if value is not None else None)
+                  for (name, value) in fixed.items() if name in SENSITIVITY_PARAMETERS}
+
+        # only the first axis is split into tiles. Swept values are set before
+        # tolerances are applied so that both can be swept for one parameter
+        tile_axes = {name: (open_axes[name][rows] if name == names[0] else open_axes[name]) for name in names}
+        for name in names:
+            if not name.endswith('_tolerance'):
+                params[name] = tile_axes[name]
+        for name in names:
+            if name.endswith('_tolerance'):
+                parameter = name.replace('_tolerance', '')
+                params[parameter] = params[parameter] * (1 + tile_axes[name])
+
+        I = get_I_E(useCascode, **params)
+        result[rows] = (I - I_target) / I_target * 100
+
+    return result
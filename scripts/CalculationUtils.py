@@ -1,31 +1,89 @@
 #!/usr/bin/env python
 
 # Contains helper functions used in other scripts
+#
+# These run on (design x frequency) arrays with tens of millions of points,
+# so they avoid copies: complex input is never converted, real and imaginary
+# parts are read as views, and results can be written into an out= buffer.
 
 import numpy as np
-from numbers import Number
 
-def parallel(z1, z2, *args):
+def _inexact(c):
+    # float or complex array without copying one that already is
+    c = np.asarray(c)
+    if not np.issubdtype(c.dtype, np.inexact):
+        c = c.astype(float)
+    return c
 
-    reciprocal_sum = 1/z1 + 1/z2
+def _scalar(result):
+    # plain inputs give a numpy scalar back rather than a 0-d array
+    return result[()] if result.ndim == 0 else result
 
-    for arg in list(args):
-        reciprocal_sum += 1/arg
+def parallel(*impedances, axis=None, out=None):
+    # Parallel combination of the impedances, broadcast against each other:
+    # parallel(z1, z2, z3). With axis, a single array is reduced along that
+    # axis instead: parallel(z, axis=0).
+    if axis is not None:
+        if len(impedances) != 1:
+            raise ValueError("parallel takes a single array when reducing along an axis")
+        # the slices along the axis are the impedances, so the same buffer is reused
+        stacked = np.moveaxis(_inexact(impedances[0]), axis, 0)
+        if len(stacked) == 0:
+            # no branches at all, an open circuit
+            result = out if out is not None else np.empty(stacked.shape[1:], dtype=stacked.dtype)
+            result[...] = np.inf
+            return _scalar(result)
+        impedances = list(stacked)
+    elif len(impedances) < 2:
+        raise ValueError("parallel needs at least two impedances")
 
-    return 1/reciprocal_sum
+    # accumulate the reciprocals in one buffer of the final shape and type,
+    # the only temporary per term is the reciprocal of that term itself
+    impedances = [_inexact(z) for z in impedances]
+    shape = np.broadcast_shapes(*[z.shape for z in impedances])
+    dtype = np.result_type(*impedances)
 
-def magnitude(c):
-    if isinstance(c, Number):
-        complex_num = complex(c)
-    else:
-        complex_num = c.astype(complex)
+    # out can only hold the running sum if no later term is read from it
+    aliased = out is not None and any(np.may_share_memory(out, z) for z in impedances[1:])
+    reciprocal_sum = out if out is not None and not aliased else np.empty(shape, dtype=dtype)
+    np.divide(1, impedances[0], out=reciprocal_sum)
+    for z in impedances[1:]:
+        np.add(reciprocal_sum, np.reciprocal(z), out=reciprocal_sum)
 
-    return np.sqrt(complex_num.real**2 + complex_num.imag**2)
+    return _scalar(np.divide(1, reciprocal_sum, out=out if aliased else reciprocal_sum))
 
-def phase(c):
-    if isinstance(c, Number):
-        complex_num = complex(c)
-    else:
-        complex_num = c.astype(complex)
+def magnitude(c, out=None):
+    # np.abs of a complex array uses hypot, no re**2 + im**2 temporaries
+    return _scalar(np.abs(_inexact(c), out=out))
 
-    return np.arctan2(complex_num.imag, complex_num.real)
\ No newline at end of file
+def phase(c, out=None):
+    c = _inexact(c)
+    if np.iscomplexobj(c):
+        # .real and .imag of an array are views
+        return _scalar(np.arctan2(c.imag, c.real, out=out))
+
+    return _scalar(np.arctan2(0.0, c, out=out))
+
+def _finite_list(values):
+    # tolist with NaN and inf as None, JSON has no literal for them
+    if values.dtype.kind != 'f':
+        return values.tolist()
+    finite = np.isfinite(values)
+    values = values.astype(object)
+    values[~finite] = None
+    return values.tolist()
+
+def to_json(value):
+    # numpy results as plain python for json.dump(..., allow_nan=False).
+    # Complex arrays become {'real': [...], 'imag': [...]}, non finite values
+    # (an open resistor, a pole) become None
+    if isinstance(value, dict):
+        return {str(key): to_json(item) for (key, item) in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    if isinstance(value, (np.ndarray, np.generic, complex, float)):
+        value = np.asarray(value)
+        if np.iscomplexobj(value):
+            return {'real': _finite_list(value.real), 'imag': _finite_list(value.imag)}
+        return _finite_list(value)
+    return value
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+# DC operating point of the common-emitter and cascode bias networks with an
+# exponential base-emitter junction, instead of the fixed Vbe of
+# BiasCalculations.get_I_E.
+#
+# The transistor is the forward active Ebers-Moll model with a constant beta:
+#     I_C = I_S (exp(Vbe / (NF v_t)) - 1),  I_B = I_C / beta
+# with I_S and v_t at the given temperature as SPICE scales them. Seen from
+# the junction of Q1, both networks reduce to a Thevenin source V_th and a
+# resistance R_eq that the collector current flows through (the base current
+# loading of the divider and the emitter current through RE both scale with
+# I_C), leaving one equation per case:
+#     g(I_C) = V_th - NF v_t ln(I_C / I_S + 1) - R_eq I_C = 0
+# g is convex and decreasing, so Newton started left of the root climbs to it
+# monotonically without overshooting. The start is the current at which g
+# would be zero if Vbe were the junction voltage at the largest possible
+# current V_th / R_eq, which is always left of the root and usually within a
+# few percent of it, converging in 3-4 iterations. Where that start is
+# negative (R_eq so small the junction alone sets the current) Newton starts
+# from I_C = 0 and takes up to ~20.
+#
+# Every case is iterated independently. Cases that have converged are
+# written out and dropped from the working arrays, so later iterations only
+# touch the few that haven't, and the iteration count of every case is
+# reported along with a mask of the ones that didn't converge.
+
+import numpy as np
+import BiasCalculations
+import CalculationUtils
+
+BOLTZMANN = 1.380649e-23
+ELECTRON_CHARGE = 1.602176634e-19
+ZERO_CELSIUS = 273.15
+
+def thermal_voltage(temperature):
+    # kT/q at a temperature in degrees Celsius
+    return BOLTZMANN * (np.asarray(temperature, dtype=float) + ZERO_CELSIUS) / ELECTRON_CHARGE
+
+def saturation_current(I_S, temperature, TNOM=27, XTI=3, EG=1.11, NF=1):
+    # I_S given at TNOM scaled to temperature (both Celsius) as SPICE does:
+    # I_S(T) = I_S (T/TNOM)^XTI exp((T/TNOM - 1) EG / (NF v_t(T)))
+    ratio = (np.asarray(temperature, dtype=float) + ZERO_CELSIUS) / (np.asarray(TNOM, dtype=float) + ZERO_CELSIUS)
+    return I_S * ratio**XTI * np.exp((ratio - 1) * EG / (NF * thermal_voltage(temperature)))
+
+def thevenin(useCascode, Vcc, R1, R2, RE, beta, R3=None):
+    # (V_th, R_eq) of the bias network seen by Q1 with I_C as the unknown.
+    # For the cascode, R3 is the top resistor of the divider with Q2's base
+    # between R3 and R1 and Q1's base between R1 and R2, as in
+    # BiasCalculations.find_R_vals_cascode
+    alpha_inverse = (beta + 1) / beta
+    if not useCascode:
+        V_th = Vcc * R2 / (R1 + R2)
+        return (V_th, CalculationUtils.parallel(R1, R2) / beta + RE * alpha_inverse)
+
+    # Q1's base current loads its node through R2||(R1 + R3). Q2 carries
+    # Q1's collector current, and its base current I_C/(beta + 1) drawn from
+    # the upper node pulls Q1's base down through the transfer resistance R2 R3 / S
+    S = R1 + R2 + R3
+    V_th = Vcc * R2 / S
+    R_eq = R2 * (R1 + R3) / S / beta + R2 * R3 / S / (beta + 1) + RE * alpha_inverse
+    return (V_th, R_eq)
+
+def solve_junction(V_th, R_eq, I_S, n_vt, rtol=1e-10, atol=1e-15, vtol=1e-9, max_iterations=100):
+    # Solves V_th = n_vt ln(I/I_S + 1) + R_eq I for I, elementwise over the
+    # broadcast shape of the parameters. A case has converged once the
+    # Newton step is below rtol*I + atol and the residual below vtol volts,
+    # the residual check keeps the tiny first steps of a start from I = 0 from
+    # passing as converged. Returns (I, iterations, converged).
+    # Cases with V_th <= 0 are cut off and return I = 0 after 0 iterations
+    (V_th, R_eq, I_S, n_vt) = np.broadcast_arrays(*[np.asarray(value, dtype=float)
+                                                    for value in (V_th, R_eq, I_S, n_vt)])
+    shape = V_th.shape
+    I = np.zeros(shape).ravel()
+    iterations = np.zeros(shape, dtype=np.int32).ravel()
+    converged = np.ones(shape, dtype=bool).ravel()
+
+    # working copies of the cases still iterating, compacted as they finish
+    index = np.flatnonzero(V_th.ravel() > 0)
+    V = V_th.ravel()[index]
+    R = R_eq.ravel()[index]
+    IS = I_S.ravel()[index]
+    nvt = n_vt.ravel()[index]
+
+    with np.errstate(divide='ignore', over='ignore'):
+        V_max = nvt * np.log1p(V / (R * IS))
+        x = np.where(np.isfinite(V_max), np.maximum((V - V_max) / R, 0.0), 0.0)
+
+    for iteration in range(1, max_iterations + 1):
+        if index.size == 0:
+            break
+
+        g = V - nvt * np.log1p(x / IS) - R * x
+        dg = -nvt / (x + IS) - R
+        step = -g / dg
+        x = x + step
+        done = (np.abs(step) <= rtol * np.abs(x) + atol) & (np.abs(g) <= vtol)
+
+        finished = index[done]
+        I[finished] = x[done]
+        iterations[finished] = iteration
+
+        keep = ~done
+        (index, V, R, IS, nvt, x) = (index[keep], V[keep], R[keep], IS[keep], nvt[keep], x[keep])
+
+    # whatever is left ran out of iterations
+    I[index] = x
+    iterations[index] = max_iterations
+    converged[index] = False
+
+    return (I.reshape(shape), iterations.reshape(shape), converged.reshape(shape))
+
+def operating_point(useCascode, Vcc, R1, R2, RE, RC=0, R3=None, beta=330, I_S=1e-16, NF=1, temperature=27,
+                    TNOM=27, XTI=3, EG=1.11, XTB=0, rtol=1e-10, atol=1e-15, vtol=1e-9, max_iterations=100):
+    # Bias point of every case, with all parameters broadcast against each
+    # other, e.g. resistor sets along one axis and temperature along another.
+    # I_S and beta are the values at TNOM (Celsius), beta is scaled by
+    # (T/TNOM)^XTB. Returns a dict of arrays of the broadcast shape:
+    #   I_C, I_B, I_E, Vbe and the base/emitter voltages V_B, V_E of Q1,
+    #   Vce1 (and Vce2, Vbe2 of Q2 for the cascode), saturated where a
+    #   collector-emitter voltage is below BiasCalculations.V_CE_SAT,
+    #   iterations and converged from the Newton solve
+    if useCascode and R3 is None:
+        raise ValueError("The cascode bias network needs R3")
+
+    ratio = (np.asarray(temperature, dtype=float) + ZERO_CELSIUS) / (np.asarray(TNOM, dtype=float) + ZERO_CELSIUS)
+    beta = np.asarray(beta, dtype=float) * ratio**XTB
+    I_S = saturation_current(I_S, temperature, TNOM=TNOM, XTI=XTI, EG=EG, NF=NF)
+    n_vt = NF * thermal_voltage(temperature)
+
+    (V_th, R_eq) = thevenin(useCascode, Vcc, R1, R2, RE, beta, R3)
+    (I_C, iterations, converged) = solve_junction(V_th, R_eq, I_S, n_vt, rtol=rtol, atol=atol, vtol=vtol,
+                                                  max_iterations=max_iterations)
+
+    I_B = I_C / beta
+    I_E = I_C + I_B
+    Vbe = n_vt * np.log1p(I_C / I_S)
+    V_E = I_E * RE
+    V_B = V_E + Vbe
+
+    results = {'I_C': I_C, 'I_B': I_B, 'I_E': I_E, 'Vbe': Vbe, 'V_B': V_B, 'V_E': V_E,
+               'iterations': iterations, 'converged': converged}
+
+    if useCascode:
+        # Q2 carries Q1's collector current. Its base sits on the upper node
+        # of the divider, loaded by both base currents
+        S = R1 + R2 + R3
+        I_C2 = I_C * beta / (beta + 1)
+        I_B2 = I_C / (beta + 1)
+        V_1 = Vcc * (R1 + R2) / S - I_B * R2 * R3 / S - I_B2 * R3 * (R1 + R2) / S
+        Vbe2 = n_vt * np.log1p(I_C2 / I_S)
+        V_C1 = V_1 - Vbe2
+        results.update({'Vbe2': Vbe2, 'Vce1': V_C1 - V_E, 'Vce2': Vcc - I_C2 * RC - V_C1})
+        results['saturated'] = (results['Vce1'] < BiasCalculations.V_CE_SAT) | (results['Vce2'] < BiasCalculations.V_CE_SAT)
+    else:
+        results['Vce1'] = Vcc - I_C * RC - V_E
+        results['saturated'] = results['Vce1'] < BiasCalculations.V_CE_SAT
+
+    shape = np.shape(I_C)
+    return {name: np.broadcast_to(value, shape) for (name, value) in results.items()}
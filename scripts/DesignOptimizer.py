@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+# Searches R1||R2, RC and I_E for the best input match to a target impedance
+# over the whole NMR band, using the vectorized hybrid-pi model.
+#
+# The mismatch of a design is the mean of |gamma|^2 over the band, where
+# gamma = (Z_in - z_target) / (Z_in + z_target) is the reflection coefficient.
+# Match alone is best with as little gain as possible (less Miller
+# capacitance), so designs whose gain drops below min_gain_db anywhere in the
+# band are penalized by GAIN_PENALTY per dB^2 of shortfall. The cost of a
+# design is the mismatch plus that penalty.
+# Every iteration evaluates a full grid of candidate designs (log-spaced in
+# each free parameter) in one call to the model, then shrinks the search box
+# around the best candidate. This batched grid + refine search needs no
+# gradients and evaluates thousands of designs per numpy call.
+
+import time
+import numpy as np
+import SmallSignalModel
+
+# search ranges used for any parameter that is neither fixed nor given bounds
+DEFAULT_BOUNDS = {'R_parallel': (1, 5e3), 'RC': (5, 2e3), 'I_E': (0.5e-3, 30e-3)}
+
+# cost per dB^2 the band minimum of the gain is below min_gain_db
+GAIN_PENALTY = 1.0
+
+def reflection_coefficient(z_in, z_target):
+    return (z_in - z_target) / (z_in + z_target)
+
+def match_cost(z_in, z_target):
+    # mean squared reflection over the frequency (last) axis
+    gamma = reflection_coefficient(z_in, z_target)
+    return np.mean(gamma.real**2 + gamma.imag**2, axis=-1)
+
+def gain_penalty(gain, min_gain_db):
+    # GAIN_PENALTY * (dB below min_gain_db)^2 of the lowest gain over the
+    # frequency (last) axis, 0 for designs meeting it or without a minimum
+    if min_gain_db is None:
+        return 0
+    shortfall = np.maximum(min_gain_db - 20*np.log10(np.abs(gain)).min(axis=-1), 0)
+    return GAIN_PENALTY * shortfall**2
+
+def optimize_input_match(useCascode, z_target, beta=330, c_pi=0.595e-12, c_mu=0.147e-12, RC=50,
+                         fixed=None, bounds=None, f=None, n_grid=12, shrink=0.3,
+                         max_iterations=30, tolerance=1e-4, min_gain_db=20):
+    # fixed maps any of R_parallel, RC and I_E to a value it is held at,
+    # bounds maps the others to (low, high) search ranges. The search stops
+    # once the box is narrower than tolerance (relative) in every parameter.
+    # min_gain_db=None optimizes the match alone.
+    # Returns a dict with the best design, its cost split into match_cost and
+    # gain_penalty, and the search statistics. converged is False if the
+    # search stopped at max_iterations. With every parameter fixed the design
+    # is only evaluated. Raises ValueError if no design in the search box has
+    # a finite cost.
+    start = time.perf_counter()
+
+    if f is None:
+        f = SmallSignalModel.nmr_band(64)
+    fixed = dict(fixed or {})
+
+    # the cascode input impedance doesn't depend on RC, only the gain does,
+    # so for the cascode RC is searched for the gain constraint alone
+    bounds = dict(DEFAULT_BOUNDS, **(bounds or {}))
+    free = [name for name in DEFAULT_BOUNDS if name not in fixed]
+
+    # search box in log space, the refined box never leaves the initial one
+    log_low = {name: np.log(bounds[name][0]) for name in free}
+    log_high = {name: np.log(bounds[name][1]) for name in free}
+    (box_low, box_high) = (dict(log_low), dict(log_high))
+
+    best = {}
+    best_cost = np.inf
+    best_terms = (np.inf, np.inf)
+    evaluations = 0
+    iterations = 0
+    converged = not free
+
+    while free and iterations < max_iterations:
+        iterations += 1
+
+        # one axis per free parameter, each along its own dimension
+        params = dict(fixed)
+        for (k, name) in enumerate(free):
+            axis = np.exp(np.linspace(box_low[name], box_high[name], n_grid))
+            params[name] = axis.reshape([-1 if i == k else 1 for i in range(len(free))])
+
+        model = SmallSignalModel.HybridPiModel(useCascode=useCascode, I_E=params['I_E'], beta=beta,
+                c_pi=c_pi, c_mu=c_mu, RC=params['RC'], R_parallel=params['R_parallel'])
+        results = model.evaluate(f)
+        shape = np.broadcast_shapes(*[np.shape(params[name]) for name in free])
+        match = np.broadcast_to(match_cost(results['z_in'], z_target), shape)
+        penalty = np.broadcast_to(gain_penalty(results['gain'], min_gain_db), shape)
+        cost = match + penalty
+        evaluations += cost.size * len(f)
+
+        # NaN costs (e.g. a singular design) never win
+        cost = np.where(np.isnan(cost), np.inf, cost)
+        index = np.unravel_index(np.argmin(cost), cost.shape)
+        if cost[index] < best_cost:
+            best = {name: float(np.broadcast_to(params[name], cost.shape)[index]) for name in free}
+            best_cost = float(cost[index])
+            best_terms = (float(match[index]), float(penalty[index]))
+        if not best:
+            raise ValueError("No design in the search box has a finite cost, bounds: " +
+                             ", ".join(name + ' ' + str(bounds[name]) for name in free))
+
+        # shrink the box around the best design found so far
+        widest = 0
+        for name in free:
+            half_width = (box_high[name] - box_low[name]) * shrink / 2
+            centre = np.log(best[name])
+            box_low[name] = max(log_low[name], centre - half_width)
+            box_high[name] = min(log_high[name], centre + half_width)
+            widest = max(widest, box_high[name] - box_low[name])
+
+        if widest < tolerance:
+            converged = True
+            break
+
+    design = dict(fixed, **best)
+    model = SmallSignalModel.HybridPiModel(useCascode=useCascode, I_E=design['I_E'], beta=beta,
+            c_pi=c_pi, c_mu=c_mu, RC=design['RC'], R_parallel=design['R_parallel'])
+    if not free:
+        results = model.evaluate(f)
+        best_terms = (float(match_cost(results['z_in'], z_target)), float(gain_penalty(results['gain'], min_gain_db)))
+        best_cost = sum(best_terms)
+        evaluations = len(f)
+
+    # an optimum on the edge of the search range means the range should grow
+    at_bounds = [name for name in free
+                 if min(abs(np.log(best[name]) - log_low[name]), abs(np.log(best[name]) - log_high[name])) < tolerance]
+
+    # worst case reflection and lowest gain of the final design on a dense grid
+    results = model.evaluate(SmallSignalModel.nmr_band())
+    gamma = reflection_coefficient(results['z_in'], z_target)
+
+    return {
+        'design': design,
+        'cost': best_cost,
+        'match_cost': best_terms[0],
+        'gain_penalty': best_terms[1],
+        'max_reflection': float(np.max(np.abs(gamma))),
+        'min_gain_db': float(np.min(20*np.log10(np.abs(results['gain'])))),
+        'at_bounds': at_bounds,
+        'iterations': iterations,
+        'converged': converged,
+        'evaluations': evaluations,
+        'elapsed': time.perf_counter() - start,
+    }
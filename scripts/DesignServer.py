@@ -0,0 +1,359 @@
+#!/usr/bin/env python
+
+# Long running server for design queries. A tuning GUI or a script calling
+# the calculators thousands of times would otherwise pay for a new python
+# process, the numpy import and the model library index every time; here
+# they are loaded once and the result cache stays warm between requests.
+#
+# The protocol is JSON-RPC 2.0 with one message per line, over stdio, a unix
+# socket or a localhost TCP port. A line holds a single request or a batch
+# (a json list of requests), which is answered with a list in the same order.
+# Arrays can be passed and are returned as
+#     {'__ndarray__': base64 of the raw little endian bytes, 'dtype': ..., 'shape': [...]}
+# which is about half the size of a list of numbers for float64 and keeps the
+# full precision. Passing "encoding": "list" in the params returns plain
+# lists instead. JSON has no NaN or inf, outside the binary arrays non finite
+# values are sent as null. Every response has a 'metrics' member with the time the
+# request waited and the time it took to compute, in ms.
+#
+# Requests are computed one at a time on a worker thread, so the event loop
+# keeps accepting connections and the cache is never used concurrently.
+
+import asyncio
+import base64
+import functools
+import inspect
+import json
+import socket
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import BiasCalculations
+import CalculationUtils
+import ResultCache
+import SmallSignalModel
+import SpiceModelLibrary
+
+# largest request line accepted, batched array requests can be big
+LINE_LIMIT = 2**28
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+DESIGN_ERROR = -32000
+
+# latencies kept per method for the percentiles in stats
+LATENCY_HISTORY = 1000
+
+def encode_array(value):
+    value = np.ascontiguousarray(value)
+    if value.dtype.kind not in 'biufc':
+        return value.tolist()
+    value = value.astype(value.dtype.newbyteorder('<'), copy=False)
+    return {'__ndarray__': base64.b64encode(value.tobytes()).decode('ascii'),
+            'dtype': value.dtype.str, 'shape': list(value.shape)}
+
+def decode_array(value):
+    data = base64.b64decode(value['__ndarray__'])
+    return np.frombuffer(data, dtype=np.dtype(value['dtype'])).reshape(value['shape'])
+
+def encode(value, binary=True):
+    # numpy results (in dicts and lists) as json compatible values
+    if isinstance(value, dict):
+        return {str(key): encode(item, binary) for (key, item) in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode(item, binary) for item in value]
+    if isinstance(value, np.ndarray) and value.ndim > 0 and binary:
+        return encode_array(value)
+    if isinstance(value, (np.ndarray, np.generic, complex, float)):
+        return CalculationUtils.to_json(value)
+    return value
+
+def decode(value):
+    # request params with every encoded array turned back into numpy
+    if isinstance(value, dict):
+        if '__ndarray__' in value:
+            return decode_array(value)
+        return {key: decode(item) for (key, item) in value.items()}
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    return value
+
+class DesignError(Exception):
+    pass
+
+class DesignServer:
+
+    def __init__(self, cache=None, library=SpiceModelLibrary.DEFAULT_LIBRARY):
+        # cache defaults to an in-memory ResultCache that lives as long as the server
+        self.cache = cache if cache is not None else ResultCache.ResultCache(None)
+        self.default_library = library
+        self.libraries = {}
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.started = time.time()
+        self.latencies = {}
+        self.errors = 0
+        self.methods = {
+            'r_values': self.r_values,
+            # partials so that the parameters are checked against _response
+            'gain': functools.partial(self._response, 'gain'),
+            'input_impedance': functools.partial(self._response, 'z_in'),
+            'sensitivity': self.sensitivity,
+            'parts': self.parts,
+            'stats': self.stats,
+            'ping': lambda: 'pong',
+        }
+
+    ### Methods ###
+
+    def library(self, path=None):
+        # model libraries are parsed (or loaded from their index) once per path
+        path = path or self.default_library
+        if path not in self.libraries:
+            self.libraries[path] = SpiceModelLibrary.ModelLibrary(path)
+        return self.libraries[path]
+
+    def r_values(self, useCascode=False, Vcc=3.3, Vbe=0.76, Vce1=1, Vce2=0.4, I_E=5e-3, RC=50, R_parallel=50,
+                 RE=None, maximize_input_impedance=False):
+        # every parameter may be an array, see BiasCalculations.solve_R_values
+        return BiasCalculations.solve_R_values(useCascode=useCascode, Vcc=np.asarray(Vcc), Vbe=np.asarray(Vbe),
+                Vce1=np.asarray(Vce1), Vce2=np.asarray(Vce2), I_E=np.asarray(I_E), RC=np.asarray(RC),
+                R_parallel=np.asarray(R_parallel), RE=None if RE is None else np.asarray(RE),
+                maximize_input_impedance=np.asarray(maximize_input_impedance))
+
+    def _model(self, useCascode, I_E, beta, c_pi, c_mu, RC, R_parallel, part, Vce, lib):
+        if part is None:
+            return SmallSignalModel.HybridPiModel(useCascode=useCascode, I_E=I_E, beta=beta, c_pi=c_pi,
+                    c_mu=c_mu, RC=RC, R_parallel=R_parallel)
+
+        # a list of parts evaluates every part along a new first axis
+        parts = [part] if isinstance(part, str) else list(part)
+        model = self.library(lib).hybrid_pi(useCascode=useCascode, I_E=np.asarray(I_E, dtype=float), Vce=Vce,
+                parts=parts, RC=np.asarray(RC, dtype=float), R_parallel=np.asarray(R_parallel, dtype=float))
+        if isinstance(part, str):
+            for name in ('I_E', 'beta', 'c_pi', 'c_mu', 'v_t'):
+                setattr(model, name, getattr(model, name)[0])
+        return model
+
+    def _response(self, key, useCascode=False, I_E=5e-3, beta=330, c_pi=0.595e-12, c_mu=0.147e-12, RC=50,
+                  R_parallel=50, f=None, n_points=1000, part=None, Vce=1.0, lib=None):
+        # Design parameters broadcast against each other and f is appended as
+        # the last axis, as in SmallSignalModel. f defaults to n_points over the NMR band
+        f = SmallSignalModel.nmr_band(n_points) if f is None else np.asarray(f, dtype=float)
+        model = self._model(useCascode, I_E, beta, c_pi, c_mu, RC, R_parallel, part, Vce, lib)
+        return {'f': f, key: model.evaluate(f, self.cache)[key]}
+
+    def sensitivity(self, useCascode=False, I_target=5e-3, axes=None, fixed=None, dtype='float64'):
+        # axes is a dict of parameter name -> values, in the order of the
+        # result dimensions. See BiasCalculations.sensitivity_grid
+        # fixed defaults to the operating conditions r_values assumes, the
+        # resistors have to be given (or swept)
+        if not axes:
+            raise DesignError("sensitivity needs at least one axis")
+        fixed = dict({'Vbe': 0.76, 'beta': 330, 'Vcc': 3.3, 'R3': None}, **(fixed or {}))
+        resistors = ['R1', 'R2', 'RE'] + (['R3'] if useCascode else [])
+        missing = [name for name in resistors if name not in axes and fixed.get(name) is None]
+        if missing:
+            raise DesignError("sensitivity needs " + ", ".join(missing) + " in fixed or axes")
+        return {'error': BiasCalculations.sensitivity_grid(useCascode=useCascode, I_target=I_target,
+                axes=axes, fixed=fixed, dtype=np.dtype(dtype))}
+
+    def parts(self, lib=None):
+        return self.library(lib).parts
+
+    def stats(self):
+        methods = {}
+        for (method, latencies) in self.latencies.items():
+            (count, total, history) = latencies
+            history = np.array(history)
+            methods[method] = {'count': count, 'mean_ms': total / count,
+                               'p50_ms': float(np.percentile(history, 50)),
+                               'p95_ms': float(np.percentile(history, 95)),
+                               'max_ms': float(history.max())}
+
+        return {'uptime': time.time() - self.started, 'errors': self.errors, 'methods': methods,
+                'cache': dict(self.cache.stats)}
+
+    ### JSON-RPC ###
+
+    def _record(self, method, elapsed):
+        (count, total, history) = self.latencies.setdefault(method, (0, 0.0, deque(maxlen=LATENCY_HISTORY)))
+        history.append(elapsed)
+        self.latencies[method] = (count + 1, total + elapsed, history)
+
+    def _error(self, request_id, code, message):
+        self.errors += 1
+        return {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': code, 'message': message}}
+
+    def call(self, request, received=None):
+        # Answers a single request (already parsed from json). Returns the
+        # response dict, or None for a notification (a request without id)
+        received = time.perf_counter() if received is None else received
+        if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+            return self._error(None, INVALID_REQUEST, "Not a JSON-RPC request")
+
+        request_id = request.get('id')
+        # a notification (no id) is never answered, not even with an error
+        notification = 'id' not in request
+        method = request['method']
+        params = request.get('params') or {}
+        if method not in self.methods:
+            response = self._error(request_id, METHOD_NOT_FOUND, "Unknown method " + method +
+                                   ". Available: " + ", ".join(sorted(self.methods)))
+            return None if notification else response
+        if not isinstance(params, dict):
+            response = self._error(request_id, INVALID_PARAMS, "params must be an object")
+            return None if notification else response
+
+        start = time.perf_counter()
+        try:
+            params = decode(params)
+            binary = params.pop('encoding', 'binary') != 'list'
+            # only a mismatch with the method's signature is a params error,
+            # a TypeError from inside the model is a failure of the method
+            try:
+                inspect.signature(self.methods[method]).bind(**params)
+            except TypeError as error:
+                response = self._error(request_id, INVALID_PARAMS, str(error))
+                return None if notification else response
+            result = self.methods[method](**params)
+        except (DesignError, ValueError, KeyError, OSError) as error:
+            response = self._error(request_id, DESIGN_ERROR, type(error).__name__ + ': ' + str(error))
+            return None if notification else response
+        except Exception as error:
+            response = self._error(request_id, INTERNAL_ERROR, type(error).__name__ + ': ' + str(error))
+            return None if notification else response
+        elapsed = (time.perf_counter() - start) * 1e3
+        self._record(method, elapsed)
+
+        if notification:
+            return None
+        return {'jsonrpc': '2.0', 'id': request_id, 'result': encode(result, binary),
+                'metrics': {'queued_ms': (start - received) * 1e3, 'elapsed_ms': elapsed}}
+
+    def handle_line(self, line, received=None):
+        # response line (bytes, newline terminated) for a request line, or
+        # None if there is nothing to answer
+        try:
+            message = json.loads(line)
+        except ValueError as error:
+            responses = self._error(None, PARSE_ERROR, "Parse error: " + str(error))
+        else:
+            if isinstance(message, list):
+                if not message:
+                    responses = self._error(None, INVALID_REQUEST, "Empty batch")
+                else:
+                    responses = [self.call(request, received) for request in message]
+                    responses = [response for response in responses if response is not None] or None
+            else:
+                responses = self.call(message, received)
+
+        if responses is None:
+            return None
+        return (json.dumps(responses, separators=(',', ':'), allow_nan=False) + '\n').encode()
+
+    async def serve_stream(self, reader, write):
+        # answers request lines from reader until it closes. write is a
+        # coroutine function taking the response bytes
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                # longer than LINE_LIMIT, the rest of the stream can't be trusted
+                await write((json.dumps(self._error(None, INVALID_REQUEST, "Request too long"), allow_nan=False) + '\n').encode())
+                return
+            if not line:
+                return
+            if not line.strip():
+                continue
+
+            response = await loop.run_in_executor(self.executor, self.handle_line, line, time.perf_counter())
+            if response is not None:
+                await write(response)
+
+    async def _connection(self, reader, writer):
+        async def write(data):
+            writer.write(data)
+            await writer.drain()
+
+        try:
+            await self.serve_stream(reader, write)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve_socket(self, path=None, host='127.0.0.1', port=None, ready=None):
+        # Serves on a unix socket (path) or on a TCP port of the local host
+        # until cancelled. ready is called with the server once it listens
+        if path is not None:
+            server = await asyncio.start_unix_server(self._connection, path=path, limit=LINE_LIMIT)
+        else:
+            server = await asyncio.start_server(self._connection, host=host, port=port, limit=LINE_LIMIT)
+
+        if ready is not None:
+            ready(server)
+        async with server:
+            await server.serve_forever()
+
+    async def serve_stdio(self, stdin, stdout):
+        # Serves a single client connected through stdin/stdout (binary file objects)
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=LINE_LIMIT)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), stdin)
+
+        async def write(data):
+            stdout.write(data)
+            stdout.flush()
+
+        await self.serve_stream(reader, write)
+
+class DesignClient:
+    # Blocking client for a server on a unix socket or local TCP port:
+    #     client = DesignClient(path='/tmp/design.sock')
+    #     gain = client.call('gain', useCascode=True, I_E=np.linspace(1e-3, 10e-3, 50))['gain']
+
+    def __init__(self, path=None, host='127.0.0.1', port=None, timeout=None):
+        if path is not None:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(path)
+        else:
+            self.socket = socket.create_connection((host, port))
+        self.socket.settimeout(timeout)
+        self.stream = self.socket.makefile('rb')
+        self.next_id = 0
+        self.metrics = None
+
+    def close(self):
+        self.stream.close()
+        self.socket.close()
+
+    def _request(self, method, params):
+        self.next_id += 1
+        return {'jsonrpc': '2.0', 'id': self.next_id, 'method': method, 'params': encode(params)}
+
+    def _send(self, message):
+        self.socket.sendall((json.dumps(message, separators=(',', ':'), allow_nan=False) + '\n').encode())
+        line = self.stream.readline()
+        if not line:
+            raise ConnectionError("The design server closed the connection")
+        return json.loads(line)
+
+    def _result(self, response):
+        self.metrics = response.get('metrics')
+        if 'error' in response:
+            raise DesignError(response['error']['message'])
+        return decode(response['result'])
+
+    def call(self, method, **params):
+        return self._result(self._send(self._request(method, params)))
+
+    def batch(self, calls):
+        # list of (method, params) sent as one batch, results in the same order
+        requests = [self._request(method, params) for (method, params) in calls]
+        responses = {response['id']: response for response in self._send(requests)}
+        return [self._result(responses[request['id']]) for request in requests]
@@ -0,0 +1,427 @@
+#!/usr/bin/env python
+
+# Small signal AC analysis of LTspice netlists by modified nodal analysis.
+#
+# Every element is stamped once as (row, column, value) triplets into two
+# real matrices, G for the frequency independent part (conductances, source
+# and transconductance terms) and C for the part proportional to j*omega
+# (capacitors, inductors), so the system at any frequency is
+# (G + j*omega*C) x = b. All frequencies are then solved as one stack of
+# small dense systems with np.linalg.solve. For the few dozen unknowns of
+# these netlists a batched dense LU is much faster than factorizing a sparse
+# matrix per frequency point.
+#
+# BJTs (Q elements, or X instances of an NPN subcircuit from the model
+# library) are replaced by their hybrid-pi model: r_pi and C_pi between base
+# and emitter, C_mu between base and collector and g_m*v_be from collector to
+# emitter. The bias point isn't solved, the emitter current of every
+# transistor is given instead and the hybrid-pi parameters are derived from
+# its model card (or overridden) at that current.
+
+import os
+import numpy as np
+import SpiceReader
+import SpiceModelLibrary
+
+GROUND = ('0', 'gnd')
+
+class Netlist:
+
+    def __init__(self, elements, analysis=None, libraries=None, title=''):
+        # elements are dicts with the name, kind (first letter), nodes and
+        # the remaining tokens of the line
+        self.elements = elements
+        self.analysis = analysis
+        self.libraries = libraries or []
+        self.title = title
+
+    def frequencies(self):
+        # frequency points of the .ac analysis
+        if self.analysis is None:
+            raise ValueError("Netlist has no .ac analysis")
+
+        (sweep, n, start, stop) = self.analysis
+        if sweep == 'lin':
+            return np.linspace(start, stop, int(n))
+        if sweep == 'dec':
+            return np.geomspace(start, stop, int(round(n * np.log10(stop / start))) + 1)
+        if sweep == 'oct':
+            return np.geomspace(start, stop, int(round(n * np.log2(stop / start))) + 1)
+
+        raise ValueError("Unknown .ac sweep type " + sweep)
+
+# number of nodes of each element kind, the rest of the line are values
+NODE_COUNTS = {'r': 2, 'c': 2, 'l': 2, 'v': 2, 'i': 2}
+
+def parse_netlist(path):
+    lines = []
+    with open(path, 'r', encoding='latin-1') as netlist_file:
+        for line in netlist_file:
+            line = line.strip()
+            if line.startswith('+') and lines:
+                lines[-1] += ' ' + line[1:]
+            elif line and not line.startswith('*') and not line.startswith(';'):
+                lines.append(line)
+
+    elements = []
+    analysis = None
+    libraries = []
+    for line in lines:
+        tokens = line.split()
+        keyword = tokens[0].lower()
+
+        if keyword == '.ac':
+            analysis = (tokens[1].lower(),) + tuple(SpiceReader.parse_spice_value(token) for token in tokens[2:5])
+        elif keyword in ('.lib', '.include', '.inc'):
+            libraries.append(line.split(None, 1)[1].strip().strip('"'))
+        elif keyword == '.end':
+            break
+        elif keyword.startswith('.'):
+            # .backanno, .tran, .op, ... don't affect the AC analysis
+            continue
+        else:
+            kind = keyword[0]
+            if kind in NODE_COUNTS:
+                n_nodes = NODE_COUNTS[kind]
+            elif kind == 'q':
+                # Q c b e [substrate] model [area], the substrate is sorted out later
+                n_nodes = 3
+            elif kind == 'x':
+                # X nodes... subcircuit [params]
+                n_nodes = len([token for token in tokens[1:] if '=' not in token]) - 1
+            else:
+                raise ValueError("Unsupported element " + tokens[0] + " in " + str(path))
+
+            elements.append({'name': tokens[0], 'kind': kind, 'nodes': [node.lower() for node in tokens[1:1 + n_nodes]],
+                             'values': tokens[1 + n_nodes:]})
+
+    return Netlist(elements, analysis, libraries, title=os.path.basename(str(path)))
+
+def _is_number(token):
+    try:
+        SpiceReader.parse_spice_value(token)
+    except ValueError:
+        return False
+    return True
+
+def _source_value(tokens):
+    # AC value of a source line such as "AC 1e-6", "DC 3.3 AC 1 90" or "3.3".
+    # Sources without an AC part are shorted (V) or opened (I) in the AC analysis
+    lowered = [token.lower() for token in tokens]
+    if 'ac' not in lowered:
+        return 0
+
+    values = tokens[lowered.index('ac') + 1:]
+    magnitude = SpiceReader.parse_spice_value(values[0]) if values else 1.0
+    phase = 0.0
+    if len(values) > 1:
+        try:
+            phase = SpiceReader.parse_spice_value(values[1])
+        except ValueError:
+            pass
+
+    return magnitude * np.exp(1j * np.deg2rad(phase))
+
+class ACCircuit:
+
+    def __init__(self, netlist, I_E=5e-3, Vce=1.0, library=None, overrides=None):
+        # I_E is one emitter current for every BJT or a dict of instance name
+        # -> emitter current. overrides maps any of beta, c_pi, c_mu and g_m
+        # to a value used for every BJT instead of the model card
+        if not isinstance(netlist, Netlist):
+            netlist = parse_netlist(netlist)
+        self.netlist = netlist
+        self.overrides = dict(overrides or {})
+        self._library = library
+
+        # merge nodes that are shorted inside a transistor (the E1/E2 pins of
+        # the Infineon subcircuits) before numbering them
+        self._parent = {}
+        transistors = [self._transistor(element) for element in netlist.elements
+                       if element['kind'] in ('q', 'x')]
+        for transistor in transistors:
+            for node in transistor['emitters'][1:]:
+                self._union(transistor['emitters'][0], node)
+
+        self.nodes = []
+        self.node_index = {}
+        for element in netlist.elements:
+            for node in element['nodes']:
+                root = self._find(node)
+                if root not in GROUND and root not in self.node_index:
+                    self.node_index[root] = len(self.nodes)
+                    self.nodes.append(root)
+
+        # voltage sources and inductors get a branch current unknown
+        self.branches = [element['name'] for element in netlist.elements if element['kind'] in ('v', 'l')]
+        self.size = len(self.nodes) + len(self.branches)
+
+        self.transistors = transistors
+        self._set_transistor_parameters(I_E, Vce)
+        (self.G, self.C, self.b) = self._assemble()
+
+    ### node bookkeeping ###
+
+    def _find(self, node):
+        while self._parent.get(node, node) != node:
+            node = self._parent[node]
+        return node
+
+    def _union(self, a, b):
+        (a, b) = (self._find(a), self._find(b))
+        if a != b:
+            # keep ground as the root so merged nodes stay grounded, and
+            # prefer a named node over an unconnected LTspice pin (NC_01)
+            if b in GROUND or (a.startswith('nc_') and not b.startswith('nc_')):
+                (a, b) = (b, a)
+            self._parent[b] = a
+
+    def index(self, node):
+        # matrix row of a node, -1 for ground
+        root = self._find(node.lower())
+        return -1 if root in GROUND else self.node_index[root]
+
+    ### transistors ###
+
+    @property
+    def library(self):
+        if self._library is None:
+            self._library = SpiceModelLibrary.ModelLibrary()
+        return self._library
+
+    def _transistor(self, element):
+        nodes = element['nodes']
+        if element['kind'] == 'x':
+            # the subcircuit name follows the nodes
+            part = element['values'][0]
+            if len(nodes) < 3:
+                raise ValueError("Unsupported subcircuit instance " + element['name'])
+        else:
+            # the token after the nodes is the model, unless a substrate node comes first
+            values = [token for token in element['values'] if '=' not in token]
+            if not values:
+                raise ValueError("No model given for " + element['name'])
+            part = values[1] if len(values) > 1 and not _is_number(values[1]) else values[0]
+
+        # C B E for Q elements, C B E1 E2 ... for the Infineon subcircuits
+        return {'name': element['name'], 'part': part, 'collector': nodes[0], 'base': nodes[1],
+                'emitters': nodes[2:] if element['kind'] == 'x' else [nodes[2]]}
+
+    def _set_transistor_parameters(self, I_E, Vce):
+        needed = [name for name in ('beta', 'c_pi', 'c_mu', 'g_m') if name not in self.overrides]
+        for transistor in self.transistors:
+            current = I_E.get(transistor['name'], 5e-3) if isinstance(I_E, dict) else I_E
+            params = {}
+            if needed:
+                op = self.library.operating_point(current, Vce=Vce, parts=[transistor['part']])
+                params = {name: float(op[name][0]) for name in needed}
+            params.update(self.overrides)
+            params['I_E'] = current
+            transistor['parameters'] = params
+
+    ### matrix assembly ###
+
+    def _assemble(self):
+        G = ([], [], [])
+        C = ([], [], [])
+        b = np.zeros(self.size, dtype=complex)
+
+        def stamp(matrix, row, column, value):
+            if row >= 0 and column >= 0:
+                matrix[0].append(row)
+                matrix[1].append(column)
+                matrix[2].append(value)
+
+        def admittance(matrix, a, b_, value):
+            (i, j) = (self.index(a), self.index(b_))
+            stamp(matrix, i, i, value)
+            stamp(matrix, j, j, value)
+            stamp(matrix, i, j, -value)
+            stamp(matrix, j, i, -value)
+
+        branch = {name: len(self.nodes) + k for (k, name) in enumerate(self.branches)}
+
+        for element in self.netlist.elements:
+            (kind, nodes) = (element['kind'], element['nodes'])
+
+            if kind == 'r':
+                admittance(G, nodes[0], nodes[1], 1 / SpiceReader.parse_spice_value(element['values'][0]))
+            elif kind == 'c':
+                admittance(C, nodes[0], nodes[1], SpiceReader.parse_spice_value(element['values'][0]))
+            elif kind in ('v', 'l'):
+                (i, j, k) = (self.index(nodes[0]), self.index(nodes[1]), branch[element['name']])
+                for (row, column, value) in ((i, k, 1), (j, k, -1), (k, i, 1), (k, j, -1)):
+                    stamp(G, row, column, value)
+                if kind == 'l':
+                    # V_a - V_b - j*omega*L*I = 0
+                    stamp(C, k, k, -SpiceReader.parse_spice_value(element['values'][0]))
+                else:
+                    b[k] = _source_value(element['values'])
+            elif kind == 'i':
+                # current flows from the + node through the source to the - node
+                value = _source_value(element['values'])
+                (i, j) = (self.index(nodes[0]), self.index(nodes[1]))
+                if i >= 0:
+                    b[i] -= value
+                if j >= 0:
+                    b[j] += value
+
+        for transistor in self.transistors:
+            p = transistor['parameters']
+            (c, base, e) = (transistor['collector'], transistor['base'], transistor['emitters'][0])
+            admittance(G, base, e, p['g_m'] / p['beta'])
+            admittance(C, base, e, p['c_pi'])
+            admittance(C, base, c, p['c_mu'])
+
+            # g_m * (V_b - V_e) from collector to emitter
+            (ic, ib, ie) = (self.index(c), self.index(base), self.index(e))
+            for (row, column, sign) in ((ic, ib, 1), (ic, ie, -1), (ie, ib, -1), (ie, ie, 1)):
+                stamp(G, row, column, sign * p['g_m'])
+
+        matrices = []
+        for (rows, columns, values) in (G, C):
+            matrix = np.zeros((self.size, self.size))
+            np.add.at(matrix, (np.array(rows, dtype=int), np.array(columns, dtype=int)), values)
+            matrices.append(matrix)
+
+        return (matrices[0], matrices[1], b)
+
+    def _selector(self, name):
+        # vector w with trace = x @ w for a single V(node) or I(source) trace
+        w = np.zeros(self.size)
+        lowered = name.strip().lower()
+        if lowered.startswith('v(') and lowered.endswith(')'):
+            node = self._find(lowered[2:-1])
+            if node in GROUND:
+                return w
+            if node in self.node_index:
+                w[self.node_index[node]] = 1
+                return w
+        elif lowered.startswith('i(') and lowered.endswith(')'):
+            for (k, branch) in enumerate(self.branches):
+                if branch.lower() == lowered[2:-1]:
+                    w[len(self.nodes) + k] = 1
+                    return w
+
+        names = ['V(' + node + ')' for node in self.nodes] + ['I(' + branch + ')' for branch in self.branches]
+        raise KeyError("No trace " + name.strip() + ". Available traces: " + ", ".join(names))
+
+    def selectors(self, name):
+        # (numerator, denominator) selectors of a trace, the denominator is
+        # None for single traces. Traces can be ratios such as V(vout)/V(vin),
+        # or Z(source) for the impedance a source sees: the source voltage
+        # over the current flowing out of its + terminal
+        parts = name.split('/')
+        if len(parts) == 2:
+            return (self._selector(parts[0]), self._selector(parts[1]))
+
+        lowered = name.strip().lower()
+        if lowered.startswith('z(') and lowered.endswith(')'):
+            source = self.element(name.strip()[2:-1])
+            voltage = self._selector('V(' + source['nodes'][0] + ')') - self._selector('V(' + source['nodes'][1] + ')')
+            return (voltage, -self._selector('I(' + source['name'] + ')'))
+
+        return (self._selector(name), None)
+
+    def element(self, name):
+        for element in self.netlist.elements:
+            if element['name'].lower() == name.lower():
+                return element
+        raise KeyError("No element " + name + " in " + self.netlist.title)
+
+    def solve(self, f=None, chunk_size=4096):
+        # Solves every frequency point of f (the netlist's .ac sweep if not
+        # given), chunk_size points per batched solve
+        f = self.netlist.frequencies() if f is None else np.asarray(f, dtype=float)
+        x = np.empty((len(f), self.size), dtype=complex)
+
+        for start in range(0, len(f), chunk_size):
+            omega = 2*np.pi*f[start:start + chunk_size]
+            A = self.G + 1j*omega[:, np.newaxis, np.newaxis]*self.C
+            rhs = np.broadcast_to(self.b, (len(omega), self.size))[..., np.newaxis]
+            x[start:start + chunk_size] = np.linalg.solve(A, rhs)[..., 0]
+
+        return ACResult(self, f, x)
+
+    def _update(self, name):
+        # (kind, value, u) of an element whose value change is the rank-1
+        # update delta * u u^T of the MNA matrix
+        element = self.element(name)
+        kind = element['kind']
+        if kind not in ('r', 'c', 'l'):
+            raise ValueError("Only R, C and L values can be swept, not " + element['name'])
+
+        if kind == 'l':
+            u = np.zeros(self.size)
+            u[len(self.nodes) + self.branches.index(element['name'])] = 1
+        else:
+            u = self._selector('V(' + element['nodes'][0] + ')') - self._selector('V(' + element['nodes'][1] + ')')
+
+        return (kind, SpiceReader.parse_spice_value(element['values'][0]), u)
+
+    def sweep(self, name, values, traces, f=None, chunk_size=1024):
+        # Traces for every value of one R, C or L element, as a dict of
+        # (n_values, n_frequencies) arrays. Returns (f, traces).
+        #
+        # Changing the element is a rank-1 update A' = A + delta u u^T, so by
+        # Sherman-Morrison x' = x - delta (u.x) / (1 + delta u.z) z with
+        # A x = b and A z = u. Only those two systems are solved per
+        # frequency, however many values are swept.
+        values = np.asarray(values, dtype=float)
+        f = self.netlist.frequencies() if f is None else np.asarray(f, dtype=float)
+        (kind, base, u) = self._update(name)
+
+        selectors = {trace: self.selectors(trace) for trace in traces}
+        results = {trace: np.empty((len(values), len(f)), dtype=complex) for trace in traces}
+
+        for start in range(0, len(f), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            omega = 2*np.pi*f[chunk]
+            A = self.G + 1j*omega[:, np.newaxis, np.newaxis]*self.C
+            rhs = np.stack(np.broadcast_arrays(self.b, u), axis=-1)
+            solution = np.linalg.solve(A, np.broadcast_to(rhs, (len(omega),) + rhs.shape))
+            (x, z) = (solution[..., 0], solution[..., 1])
+
+            # change of the stamped admittance (or impedance for L) per value and frequency
+            if kind == 'r':
+                delta = (1/values - 1/base)[:, np.newaxis] * np.ones_like(omega)
+            elif kind == 'c':
+                delta = 1j*omega*(values - base)[:, np.newaxis]
+            else:
+                delta = -1j*omega*(values - base)[:, np.newaxis]
+            scale = delta * (x @ u) / (1 + delta * (z @ u))
+
+            for (trace, (numerator, denominator)) in selectors.items():
+                value = (x @ numerator) - scale * (z @ numerator)
+                if denominator is not None:
+                    value = value / ((x @ denominator) - scale * (z @ denominator))
+                results[trace][:, chunk] = value
+
+        return (f, results)
+
+class ACResult:
+    # Node voltages V(node), branch currents I(source) and source impedances
+    # Z(source) of an AC solve, looked up like the traces of a SpiceReader.RawFile
+
+    def __init__(self, circuit, f, x):
+        self.circuit = circuit
+        self.axis = f
+        self.x = x
+        self.names = (['V(' + node + ')' for node in circuit.nodes] +
+                      ['I(' + name + ')' for name in circuit.branches])
+
+    def keys(self):
+        return list(self.names)
+
+    def __contains__(self, name):
+        try:
+            self.circuit.selectors(name)
+        except KeyError:
+            return False
+        return True
+
+    def __getitem__(self, name):
+        (numerator, denominator) = self.circuit.selectors(name)
+        if denominator is None:
+            return self.x @ numerator
+        return (self.x @ numerator) / (self.x @ denominator)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+# Monte Carlo tolerance analysis of the bias network.
+#
+# Component values are drawn in chunks and pushed through the emitter current
+# equations in BiasCalculations. Only running statistics (counts, moments and
+# a fixed-bin histogram for quantiles) are kept per chunk, so memory does not
+# grow with the number of boards simulated. Each chunk draws from its own
+# seed spawned from one master seed, which makes the result independent of
+# how chunks are spread over worker processes.
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import BiasCalculations
+
+# How each parameter varies from its nominal value:
+#   ('uniform_tolerance', tol)  nominal * (1 + U(-tol, tol))
+#   ('normal_tolerance', tol)   nominal * (1 + N(0, tol/3)), tol is the 3 sigma bound
+#   ('normal', sigma)           nominal + N(0, sigma)
+#   ('uniform', low, high)      U(low, high), independent of the nominal value
+#   ('uniform_offset', delta)   nominal + U(-delta, delta), e.g. supply ripple
+#   ('lognormal', sigma)        nominal * exp(N(0, sigma))
+# Parameters without a distribution stay at their nominal value.
+DISTRIBUTIONS = ['uniform_tolerance', 'normal_tolerance', 'normal', 'uniform', 'uniform_offset', 'lognormal']
+
+def draw_samples(rng, n, nominal, distributions):
+    samples = {}
+    for (name, value) in nominal.items():
+        if name not in distributions or value is None:
+            samples[name] = value
+            continue
+
+        (kind, *spread) = distributions[name]
+        if kind == 'uniform_tolerance':
+            samples[name] = value * (1 + rng.uniform(-spread[0], spread[0], n))
+        elif kind == 'normal_tolerance':
+            samples[name] = value * (1 + rng.normal(0, spread[0]/3, n))
+        elif kind == 'normal':
+            samples[name] = value + rng.normal(0, spread[0], n)
+        elif kind == 'uniform':
+            samples[name] = rng.uniform(spread[0], spread[1], n)
+        elif kind == 'uniform_offset':
+            samples[name] = value + rng.uniform(-spread[0], spread[0], n)
+        elif kind == 'lognormal':
+            samples[name] = value * np.exp(rng.normal(0, spread[0], n))
+        else:
+            raise ValueError("Unknown distribution " + str(kind) + " for " + name +
+                             ". Expected one of: " + ", ".join(DISTRIBUTIONS))
+
+    return samples
+
+class CurrentAccumulator:
+    # Streaming statistics of the simulated emitter currents. Quantiles are
+    # interpolated from a histogram with n_bins bins between low and high;
+    # values outside that range are still counted and bound the quantiles
+    # by the exact minimum and maximum.
+
+    def __init__(self, I_min, I_max, low, high, n_bins=4096):
+        self.I_min = I_min
+        self.I_max = I_max
+        self.edges = np.linspace(low, high, n_bins + 1)
+        self.counts = np.zeros(n_bins, dtype=np.int64)
+        self.below = 0
+        self.above = 0
+        self.n = 0
+        self.passed = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def empty_copy(self):
+        return CurrentAccumulator(self.I_min, self.I_max, self.edges[0], self.edges[-1], len(self.counts))
+
+    def add(self, I):
+        I = np.ravel(I)
+        self.n += len(I)
+        self.passed += int(np.count_nonzero((I >= self.I_min) & (I <= self.I_max)))
+        self.total += float(np.sum(I))
+        self.total_sq += float(np.dot(I, I))
+        self.min = min(self.min, float(np.min(I)))
+        self.max = max(self.max, float(np.max(I)))
+
+        self.below += int(np.count_nonzero(I < self.edges[0]))
+        self.above += int(np.count_nonzero(I > self.edges[-1]))
+        self.counts += np.histogram(I, bins=self.edges)[0]
+
+    def merge(self, other):
+        self.n += other.n
+        self.passed += other.passed
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.below += other.below
+        self.above += other.above
+        self.counts += other.counts
+
+    @property
+    def yield_fraction(self):
+        return self.passed / self.n
+
+    @property
+    def mean(self):
+        return self.total / self.n
+
+    @property
+    def std(self):
+        return np.sqrt(max(self.total_sq / self.n - self.mean**2, 0))
+
+    def quantile(self, q):
+        # cumulative counts at the exact minimum, every bin edge and the exact
+        # maximum, interpolated linearly in between
+        cumulative = np.concatenate([[0], self.below + np.cumsum(np.append(0, self.counts)), [self.n]])
+        values = np.concatenate([[self.min], self.edges, [self.max]])
+
+        positions = np.asarray(q) * self.n
+        return np.clip(np.interp(positions, cumulative, values), self.min, self.max)
+
+def _run_chunk(task):
+    (useCascode, nominal, distributions, seed, n, accumulator) = task
+
+    rng = np.random.default_rng(seed)
+    samples = draw_samples(rng, n, nominal, distributions)
+    I = BiasCalculations.get_I_E(useCascode, **samples)
+
+    chunk_accumulator = accumulator.empty_copy()
+    chunk_accumulator.add(np.broadcast_to(I, (n,)))
+    return chunk_accumulator
+
+def run_monte_carlo(useCascode, nominal, distributions, I_min, I_max, n_samples,
+                    chunk_size=2**18, seed=0, workers=1, n_bins=4096):
+    # nominal maps every argument of BiasCalculations.get_I_E (Vbe, beta, Vcc,
+    # R1, R2, R3, RE) to its nominal value. Returns a CurrentAccumulator
+    # holding the fraction of boards with I_min <= I_E <= I_max, the moments
+    # and the quantiles of I_E.
+    # The histogram covers twice the I_E window around its centre.
+    if n_samples < 1 or chunk_size < 1:
+        raise ValueError("n_samples and chunk_size must be at least 1, got " + str(n_samples) + " and " +
+                         str(chunk_size))
+    centre = (I_min + I_max) / 2
+    span = max(I_max - I_min, abs(centre) * 1e-3)
+    accumulator = CurrentAccumulator(I_min, I_max, centre - span, centre + span, n_bins)
+
+    sizes = [chunk_size] * (n_samples // chunk_size)
+    if n_samples % chunk_size:
+        sizes.append(n_samples % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    tasks = [(useCascode, nominal, distributions, chunk_seed, size, accumulator)
+             for (chunk_seed, size) in zip(seeds, sizes)]
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            partials = pool.map(_run_chunk, tasks)
+            # merged in chunk order so the result doesn't depend on scheduling
+            for partial in partials:
+                accumulator.merge(partial)
+    else:
+        for task in tasks:
+            accumulator.merge(_run_chunk(task))
+
+    return accumulator
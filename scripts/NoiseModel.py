@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+# Noise of the single stage common-emitter and cascode amplifiers, from the
+# same hybrid-pi intermediates (g_m, r_pi, z_mu, g_1, z_2, z_3) that
+# SmallSignalModel computes the gain and input impedance from, so noise
+# figure comes out of the same vectorized evaluation as gain.
+#
+# Every source is described by its power spectral density and referred to
+# the input node (the base, where R1||R2 and the source connect) as a
+# series voltage generator v_n or a shunt current generator i_n:
+#   - base resistance r_b, thermal:    v_n^2 = 4kT r_b
+#   - collector shot noise of Q1:      v_n^2 = 2q I_C / |g_1|^2
+#   - collector shot noise of Q2:      v_n^2 = 2q I_C / |z_2 g_1 g_m|^2  (cascode)
+#   - RC, thermal, at the output:      v_n^2 = 4kT/RC / |g_t|^2
+#   - base shot noise of Q1:           i_n^2 = 2q I_B
+#   - R1||R2, thermal:                 i_n^2 = 4kT / R_parallel
+# where g_t is the transconductance from the input node to the output,
+# g_1 for the common emitter and g_1 g_m / g_2 for the cascode. Output
+# currents divide over z_3 exactly like the signal does, so only g_t is
+# needed to refer them. RE is bypassed and the base of Q2 is decoupled in
+# the circuits the model describes, so their noise (and R3's) is shorted.
+# Correlation between the generators is neglected.
+#
+# With a source impedance Z_s the input referred noise in V^2/Hz is
+#   4kT0 Re(Z_s) + sum(v_n^2) |1 + Z_s/R_parallel|^2 + sum(i_n^2) |Z_s|^2
+# and the noise figure is its ratio to the source's own noise at T0 = 290 K.
+# Devices and resistors are at the temperature of the model's v_t.
+
+import numpy as np
+
+BOLTZMANN = 1.380649e-23
+ELECTRON_CHARGE = 1.602176634e-19
+
+# reference temperature of the noise figure (K)
+T0 = 290
+
+def noise(model, f, z_source=50, r_b=0, results=None):
+    # Noise of model (a HybridPiModel) over f with a source impedance z_source
+    # and base resistance r_b, both broadcast like the model parameters.
+    # results are the intermediates of model.evaluate(f) if they are at hand,
+    # otherwise they are computed. Returns a dict of arrays of shape
+    # param_shape + f.shape:
+    #   'sources': name -> input referred noise of every source (V^2/Hz)
+    #   'input_noise': total input referred noise including the source (V^2/Hz)
+    #   'noise_factor' and 'noise_figure' (dB)
+    if results is None:
+        results = model.evaluate(f)
+
+    f = np.asarray(f, dtype=float)
+    beta = model._expand(model.beta, f)
+    I_E = model._expand(model.I_E, f)
+    R_parallel = model._expand(model.R_parallel, f)
+    RC = model._expand(model.RC, f)
+    kT = ELECTRON_CHARGE * model._expand(model.v_t, f)
+    z_source = model._expand(np.asarray(z_source, dtype=complex), f)
+    r_b = model._expand(np.asarray(r_b, dtype=float), f)
+
+    I_C = I_E * beta / (beta + 1)
+    I_B = I_E / (beta + 1)
+    g_1 = results['g_1']
+    if model.useCascode:
+        g_t = g_1 * results['g_m'] / (results['g_m'] + 1/results['z_2'])
+    else:
+        g_t = g_1
+
+    # series voltage and shunt current generators at the input node
+    voltage = {
+        'r_b': 4*kT*r_b,
+        'collector_shot': 2*ELECTRON_CHARGE*I_C / np.abs(g_1)**2,
+        'RC': 4*kT/RC / np.abs(g_t)**2,
+    }
+    if model.useCascode:
+        voltage['cascode_shot'] = 2*ELECTRON_CHARGE*I_C / np.abs(results['z_2'] * g_1 * results['g_m'])**2
+    current = {
+        'base_shot': 2*ELECTRON_CHARGE*I_B,
+        'R_parallel': 4*kT/R_parallel,
+    }
+
+    # referred to the source emf
+    voltage_transfer = np.abs(1 + z_source/R_parallel)**2
+    current_transfer = np.abs(z_source)**2
+    sources = {name: value * voltage_transfer for (name, value) in voltage.items()}
+    sources.update({name: value * current_transfer for (name, value) in current.items()})
+
+    source_noise = 4*BOLTZMANN*T0*z_source.real
+    added = sum(sources.values())
+    noise_factor = 1 + added / source_noise
+    shape = np.shape(g_1)
+
+    return {
+        'sources': {name: np.broadcast_to(value, shape) for (name, value) in sources.items()},
+        'input_noise': np.broadcast_to(source_noise + added, shape),
+        'noise_factor': np.broadcast_to(noise_factor, shape),
+        'noise_figure': 10*np.log10(np.broadcast_to(noise_factor, shape)),
+    }
+
+def evaluate(model, f, z_source=50, r_b=0, cache=None):
+    # model.evaluate(f) with the noise of the design added, for scoring gain,
+    # match and noise figure of a batch of designs in one pass
+    results = model.evaluate(f, cache)
+    results.update(noise(model, f, z_source=z_source, r_b=r_b, results=results))
+    return results
+
+def noise_temperature(noise_factor):
+    return T0 * (noise_factor - 1)
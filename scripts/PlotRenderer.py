@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+
+# Headless figure rendering for batches of designs.
+#
+# Figures are drawn with the Agg canvas directly instead of pyplot, so
+# nothing depends on a display or on pyplot's global figure state. Each
+# worker process keeps one template figure per kind of plot and only swaps
+# the data of its artists between jobs, which is much cheaper than building
+# the axes, ticks and labels again. A job is skipped when the digest of its
+# parameters and input files matches the one recorded for the existing
+# output, so re-running a manifest only redraws what changed.
+#
+# Manifest (json):
+#   {"output": "figures", "format": "png", "dpi": 150,
+#    "defaults": {"beta": 330, ...},
+#    "designs": [{"name": "ce_5mA", "kinds": ["gain", "phase", "zin", "sensitivity"], "I_E": 5e-3},
+#                {"name": "ce_sim", "kinds": ["spice"], "file": "../LTspice/CE.raw"}]}
+# Design parameters are the HybridPiModel arguments (useCascode, I_E, beta,
+# c_pi, c_mu, RC, R_parallel), the bias network (Vcc, R1, R2, R3, RE) and
+# fStart, fStop, numPoints. Relative file paths are relative to the manifest.
+
+import os
+import json
+import hashlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import CalculationUtils
+import BiasCalculations
+import SmallSignalModel
+import SpiceReader
+
+KINDS = ['gain', 'phase', 'zin', 'sensitivity', 'spice']
+
+# bump to re-render everything after changing how figures look
+RENDER_VERSION = 1
+
+INDEX_FILE = '.render_index.json'
+
+DEFAULT_PARAMETERS = {
+    'useCascode': False, 'I_E': 5e-3, 'beta': 330, 'c_pi': 0.595e-12, 'c_mu': 0.147e-12,
+    'RC': 50, 'R_parallel': 50, 'Vcc': 3.3, 'R1': 60.4, 'R2': 357, 'R3': 13, 'RE': 412,
+    'fStart': SmallSignalModel.F_MIN, 'fStop': SmallSignalModel.F_MAX, 'numPoints': 1000,
+    'trace': 'V(vout)/V(vin)', 'resolution': 100,
+}
+
+def load_manifest(path):
+    # Expands a manifest into a list of jobs, one per figure
+    with open(path) as file:
+        manifest = json.load(file)
+
+    base = os.path.dirname(os.path.abspath(path))
+    output = os.path.join(base, manifest.get('output', 'figures'))
+    fmt = manifest.get('format', 'png')
+    dpi = manifest.get('dpi', 150)
+    defaults = dict(DEFAULT_PARAMETERS, **manifest.get('defaults', {}))
+
+    jobs = []
+    for design in manifest['designs']:
+        params = dict(defaults, **design)
+        name = params.pop('name')
+        kinds = params.pop('kinds', ['gain', 'phase', 'zin'])
+        if 'file' in params:
+            params['file'] = os.path.join(base, params['file'])
+
+        for kind in kinds:
+            if kind not in KINDS:
+                raise ValueError("Unknown figure kind " + str(kind) + " for design " + name +
+                                 ". Expected one of: " + ", ".join(KINDS))
+            jobs.append({'kind': kind, 'params': params, 'dpi': dpi,
+                         'path': os.path.join(output, name + '_' + kind + '.' + fmt)})
+
+    return jobs
+
+def job_digest(job):
+    # Everything the rendered figure depends on, including the input file state
+    params = dict(job['params'])
+    if job['kind'] == 'spice':
+        try:
+            stat = os.stat(params['file'])
+            params['file_state'] = [stat.st_mtime_ns, stat.st_size]
+        except OSError:
+            # rendering reports the missing file
+            params['file_state'] = None
+
+    description = json.dumps([RENDER_VERSION, job['kind'], job['dpi'], params], sort_keys=True)
+    return hashlib.sha256(description.encode()).hexdigest()
+
+### Templates ###
+
+def _new_figure(figsize=(7, 5)):
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+def _line_template(xlabel, ylabel, semilogx=False):
+    fig = _new_figure()
+    ax = fig.add_subplot()
+    (line,) = ax.plot([], [])
+    if semilogx:
+        ax.set_xscale('log')
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    return {'fig': fig, 'axes': [ax], 'lines': [line]}
+
+def _twin_template(xlabel, left_label, right_label, semilogx=False):
+    fig = _new_figure(figsize=(8, 5))
+    ax1 = fig.add_subplot()
+    ax2 = ax1.twinx()
+    (line1,) = ax1.plot([], [], color='tab:red')
+    (line2,) = ax2.plot([], [], color='tab:blue')
+    if semilogx:
+        ax1.set_xscale('log')
+    ax1.set_xlabel(xlabel)
+    ax1.set_ylabel(left_label, color='tab:red')
+    ax2.set_ylabel(right_label, color='tab:blue')
+    ax1.tick_params(axis='y', labelcolor='tab:red')
+    ax2.tick_params(axis='y', labelcolor='tab:blue')
+    return {'fig': fig, 'axes': [ax1, ax2], 'lines': [line1, line2]}
+
+def _sensitivity_template():
+    fig = _new_figure(figsize=(7, 6))
+    ax = fig.add_subplot()
+    ax.set_yscale('log')
+    ax.set_xlabel("Base-Emitter Voltage (V)")
+    ax.set_ylabel("BJT Current Amplification Factor (" + r'$\beta$' + ")")
+    return {'fig': fig, 'axes': [ax], 'mesh': None, 'colorbar': None}
+
+TEMPLATES = {
+    'gain': lambda: _line_template("Frequency (MHz)", "Gain Magnitude (dB)", semilogx=True),
+    'phase': lambda: _line_template("Frequency (MHz)", "Gain Phase (Degrees)"),
+    'zin': lambda: _twin_template("Frequency (MHz)", "Input Impedance Magnitude (" + r'$\Omega$' + ")",
+                                  "Input Impedance Phase (Degrees)"),
+    'sensitivity': _sensitivity_template,
+    'spice': lambda: _twin_template("Frequency (MHz)", "Gain Magnitude (dB)", "Gain Phase (degrees)",
+                                    semilogx=True),
+}
+
+# templates of the current process, created on first use
+_templates = {}
+
+def _template(kind):
+    if kind not in _templates:
+        _templates[kind] = TEMPLATES[kind]()
+    return _templates[kind]
+
+def _set_lines(template, curves):
+    for (ax, line, (x, y)) in zip(template['axes'], template['lines'], curves):
+        line.set_data(x, y)
+        ax.relim()
+        ax.autoscale_view()
+
+### Figures ###
+
+def _model(params):
+    return SmallSignalModel.HybridPiModel(useCascode=params['useCascode'], I_E=params['I_E'],
+            beta=params['beta'], c_pi=params['c_pi'], c_mu=params['c_mu'], RC=params['RC'],
+            R_parallel=params['R_parallel'])
+
+def _frequencies(params):
+    return np.linspace(params['fStart'], params['fStop'], params['numPoints'])
+
+def draw(kind, params):
+    # Updates the template of kind with the data of one design, returns the figure
+    template = _template(kind)
+    ax = template['axes'][0]
+
+    if kind in ('gain', 'phase'):
+        model = _model(params)
+        f = _frequencies(params)
+        gain = model.gain(f)
+        if kind == 'gain':
+            _set_lines(template, [(f*1e-6, 20*np.log10(CalculationUtils.magnitude(gain)))])
+            ax.set_title(model.amp_type + " Gain Bode Plot")
+        else:
+            _set_lines(template, [(f*1e-6, np.rad2deg(CalculationUtils.phase(gain)))])
+            ax.set_title(model.amp_type + " Gain Phase Plot")
+
+    elif kind == 'zin':
+        model = _model(params)
+        f = _frequencies(params)
+        z_in = model.input_impedance(f)
+        _set_lines(template, [(f*1e-6, CalculationUtils.magnitude(z_in)),
+                              (f*1e-6, np.rad2deg(CalculationUtils.phase(z_in)))])
+        ax.set_title(model.amp_type + " Input Impedance")
+
+    elif kind == 'spice':
+        traces = SpiceReader.load_traces(params['file'])
+        if isinstance(traces, SpiceReader.SteppedRawFile):
+            traces = traces.step(0)
+        gain = traces[params['trace']]
+        deg = np.rad2deg(CalculationUtils.phase(gain))
+        _set_lines(template, [(traces.axis/1e6, 20*np.log10(CalculationUtils.magnitude(gain))),
+                              (traces.axis/1e6, np.where(deg < 0, deg, deg - 360))])
+        ax.set_title("Simulated Amplifier Open Circuit Gain")
+
+    elif kind == 'sensitivity':
+        Vbe = np.linspace(0.5, 1.25, params['resolution'])
+        beta = np.logspace(0, 2.7, params['resolution'])
+        error = BiasCalculations.sensitivity_grid(useCascode=params['useCascode'], I_target=params['I_E'],
+                axes={'Vbe': Vbe, 'beta': beta},
+                fixed={name: params[name] for name in ('Vcc', 'R1', 'R2', 'R3', 'RE')})
+
+        # the grid size can change between designs, so only the mesh is replaced
+        if template['mesh'] is not None:
+            template['mesh'].remove()
+        template['mesh'] = ax.pcolormesh(Vbe, beta, error.T, shading='auto')
+        if template['colorbar'] is None:
+            template['colorbar'] = template['fig'].colorbar(template['mesh'], ax=ax)
+            template['colorbar'].set_label("% Error in Collector Current")
+        else:
+            template['colorbar'].update_normal(template['mesh'])
+        ax.set_title("% Error in Collector Current Due to BJT Characteristics")
+
+    template['fig'].tight_layout()
+    return template['fig']
+
+def render(job):
+    # Worker entry point. Returns (path, error message or None)
+    try:
+        fig = draw(job['kind'], job['params'])
+        os.makedirs(os.path.dirname(job['path']), exist_ok=True)
+        fig.savefig(job['path'], dpi=job['dpi'])
+        return (job['path'], None)
+    except Exception as error:
+        return (job['path'], type(error).__name__ + ': ' + str(error))
+
+def render_all(jobs, workers=1, force=False, chunk_size=8):
+    # Renders every job whose inputs changed since it was last rendered.
+    # Returns (rendered, skipped, failed) where failed is a list of
+    # (path, error message)
+    indexes = {}
+    pending = []
+    skipped = 0
+    for job in jobs:
+        directory = os.path.dirname(job['path'])
+        if directory not in indexes:
+            try:
+                with open(os.path.join(directory, INDEX_FILE)) as file:
+                    indexes[directory] = json.load(file)
+            except (OSError, ValueError):
+                indexes[directory] = {}
+
+        job['digest'] = job_digest(job)
+        name = os.path.basename(job['path'])
+        if not force and indexes[directory].get(name) == job['digest'] and os.path.exists(job['path']):
+            skipped += 1
+        else:
+            pending.append(job)
+
+    # jobs of the same kind next to each other so chunks reuse the same template
+    pending.sort(key=lambda job: job['kind'])
+
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(render, pending, chunksize=chunk_size))
+    else:
+        results = [render(job) for job in pending]
+
+    failed = []
+    for (job, (path, error)) in zip(pending, results):
+        directory = os.path.dirname(path)
+        if error is None:
+            indexes[directory][os.path.basename(path)] = job['digest']
+        else:
+            indexes[directory].pop(os.path.basename(path), None)
+            failed.append((path, error))
+
+    for (directory, index) in indexes.items():
+        if os.path.isdir(directory):
+            with open(os.path.join(directory, INDEX_FILE), 'w') as file:
+                json.dump(index, file, indent=1, sort_keys=True)
+
+    return (len(pending) - len(failed), skipped, failed)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+
+# Content addressed cache for arrays computed from design parameters.
+#
+# A key is the sha256 of a namespace (e.g. the amplifier topology) and every
+# parameter, arrays included, so the same design on the same frequency grid
+# always maps to the same entry. Results live in two tiers: a small LRU dict
+# in memory and one .npz file per key on disk. The disk tier is bounded by
+# max_bytes and evicts the least recently used files, using the file mtime
+# (touched on every hit) as the access time.
+#
+# Cached arrays are shared by every caller that gets them, so they are read
+# only: put takes ownership of the arrays it is given and marks them read
+# only, and get hands out those same arrays.
+
+import os
+import hashlib
+import tempfile
+from collections import OrderedDict
+import numpy as np
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'nmr_preamp')
+
+# part of every key, bump it when the layout of the stored entries changes so
+# old files on disk are never read back as current results
+FORMAT_VERSION = 1
+
+def make_key(namespace, **params):
+    # Parameters are hashed by name, dtype, shape and raw bytes so that
+    # 5e-3 and np.array(5e-3) give the same key but float32 and float64 don't
+    digest = hashlib.sha256(('v' + str(FORMAT_VERSION) + ':' + str(namespace)).encode())
+    for name in sorted(params):
+        value = params[name]
+        digest.update(name.encode())
+        if value is None:
+            digest.update(b'None')
+            continue
+
+        value = np.ascontiguousarray(value)
+        digest.update(str(value.dtype).encode() + str(value.shape).encode())
+        digest.update(value.tobytes())
+
+    return digest.hexdigest()
+
+class ResultCache:
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_bytes=256*2**20, memory_items=64):
+        # directory=None keeps the cache in memory only
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.memory = OrderedDict()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def _remember(self, key, arrays):
+        for value in arrays.values():
+            value.setflags(write=False)
+        self.memory[key] = arrays
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def get(self, key):
+        # dict of arrays stored under key, or None if it isn't cached
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.stats['memory_hits'] += 1
+            return self.memory[key]
+
+        if self.directory is not None:
+            path = self._path(key)
+            try:
+                with np.load(path) as data:
+                    arrays = {name: data[name] for name in data.files}
+                os.utime(path)
+            except (OSError, ValueError):
+                # missing, or a partial file from a crashed run
+                arrays = None
+
+            if arrays is not None:
+                self.stats['disk_hits'] += 1
+                self._remember(key, arrays)
+                return arrays
+
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, key, arrays):
+        arrays = {name: np.asarray(value) for (name, value) in arrays.items()}
+        self._remember(key, arrays)
+
+        if self.directory is not None:
+            # write to a temporary file first so readers never see half an entry
+            (handle, temporary) = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(handle, 'wb') as file:
+                np.savez(file, **arrays)
+            os.replace(temporary, self._path(key))
+            self.evict()
+
+    def memoize(self, key, compute):
+        # cached result of compute() under key, computing and storing it on a miss
+        arrays = self.get(key)
+        if arrays is None:
+            arrays = compute()
+            self.put(key, arrays)
+        return arrays
+
+    def entries(self):
+        # (mtime, size, path) of every file on disk, least recently used first
+        if self.directory is None:
+            return []
+
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.npz'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(entries)
+
+    def size(self):
+        return sum(size for (_, size, _) in self.entries())
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for (_, size, _) in entries)
+        for (_, size, path) in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.stats['evictions'] += 1
+
+    def clear(self):
+        self.memory.clear()
+        for (_, _, path) in self.entries():
+            os.remove(path)
+
+    def report(self):
+        lookups = self.stats['memory_hits'] + self.stats['disk_hits'] + self.stats['misses']
+        hits = lookups - self.stats['misses']
+        rate = hits / lookups * 100 if lookups else 0
+
+        return ('Cache: ' + str(hits) + '/' + str(lookups) + ' hits (' + str(round(rate, 1)) + ' %), ' +
+                str(self.stats['memory_hits']) + ' from memory, ' + str(self.stats['disk_hits']) +
+                ' from disk, ' + str(self.stats['evictions']) + ' evictions, ' +
+                str(round(self.size() / 2**20, 2)) + ' MB on disk')
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+
+# Columnar store for sweep results, so large sweeps can be kept and queried
+# instead of printed.
+#
+# A store is a directory holding one subdirectory per appended chunk with one
+# .npy file per column, plus store.json listing the columns, their dtypes and
+# every chunk with its row count and the min/max and NaN count of each
+# numeric column:
+#
+#     sweep/
+#         store.json
+#         chunk_000000/I_E.npy, chunk_000000/R1.npy, ...
+#         chunk_000001/...
+#
+# Columns are read memory mapped. A query first skips every chunk whose
+# min/max show it can't match, then loads only the columns the predicates
+# name, and only reads the requested columns for the rows that match, so a
+# query touches a small part of a large store. Predicates are
+# (column, op, value) tuples combined with AND, for example the feasible
+# cascode designs within 2 Ohm of 50 Ohm at the band centre:
+#
+#     store.query([('useCascode', '==', True), ('feasible', '==', True), ('z_in_error', '<', 2)])
+#
+# Chunks are written completely before store.json is replaced, so readers
+# never see a partial chunk.
+
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+
+METADATA = 'store.json'
+
+OPERATORS = {
+    '==': np.equal, '!=': np.not_equal,
+    '<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal,
+    'between': lambda column, bounds: (column >= bounds[0]) & (column <= bounds[1]),
+    'in': lambda column, values: np.isin(column, values),
+}
+
+def _might_match(op, value, low, high, nans=None):
+    # False if no value in [low, high] can satisfy the predicate. low and
+    # high are None for a chunk without any non-nan value. nans is the
+    # number of NaNs in the chunk, None for stores written before it was
+    # recorded. NaN != value holds, so only a chunk without NaNs whose values
+    # all equal value can be skipped for '!='
+    if low is None:
+        return op == '!='
+    if op == '==':
+        return low <= value <= high
+    if op == '!=':
+        return nans != 0 or not (low == high == value)
+    if op == '<':
+        return low < value
+    if op == '<=':
+        return low <= value
+    if op == '>':
+        return high > value
+    if op == '>=':
+        return high >= value
+    if op == 'between':
+        return high >= value[0] and low <= value[1]
+    if op == 'in':
+        return any(low <= item <= high for item in value)
+    return True
+
+def _statistics(column):
+    # (min, max, NaN count) of a numeric column, min and max ignoring nan,
+    # for pruning chunks
+    if column.dtype.kind not in 'biuf' or column.size == 0:
+        return None
+    nans = 0
+    if column.dtype.kind == 'f':
+        finite = column[~np.isnan(column)]
+        nans = column.size - finite.size
+        if finite.size == 0:
+            return [None, None, nans]
+        column = finite
+    return [column.min().item(), column.max().item(), nans]
+
+class ResultsStore:
+
+    def __init__(self, directory):
+        # opens the store in directory, creating an empty one if it doesn't exist
+        self.directory = directory
+        self.metadata_path = os.path.join(directory, METADATA)
+
+        if os.path.exists(self.metadata_path):
+            with open(self.metadata_path, 'r') as metadata_file:
+                self.metadata = json.load(metadata_file)
+        else:
+            os.makedirs(directory, exist_ok=True)
+            self.metadata = {'columns': {}, 'chunks': []}
+
+    @property
+    def columns(self):
+        return list(self.metadata['columns'])
+
+    @property
+    def chunks(self):
+        return self.metadata['chunks']
+
+    def __len__(self):
+        return sum(chunk['rows'] for chunk in self.chunks)
+
+    def _save_metadata(self):
+        (handle, temporary) = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(handle, 'w') as metadata_file:
+            json.dump(self.metadata, metadata_file, separators=(',', ':'))
+        os.replace(temporary, self.metadata_path)
+
+    def _check_columns(self, columns):
+        if not self.metadata['columns']:
+            return {name: np.asarray(value) for (name, value) in columns.items()}
+
+        missing = set(self.metadata['columns']) ^ set(columns)
+        if missing:
+            raise ValueError("Columns don't match the store, differing: " + ", ".join(sorted(missing)))
+
+        checked = {}
+        for (name, value) in columns.items():
+            value = np.asarray(value)
+            dtype = np.dtype(self.metadata['columns'][name])
+            if dtype.kind == 'U' and value.dtype.kind == 'U':
+                checked[name] = value
+            elif np.can_cast(value.dtype, dtype, 'same_kind'):
+                checked[name] = value.astype(dtype, copy=False)
+            else:
+                raise ValueError("Column " + name + " is " + str(dtype) + " in the store, got " + str(value.dtype))
+        return checked
+
+    def append(self, columns, chunk_rows=None):
+        # Appends a dict of column name -> 1-D array (scalars are broadcast)
+        # as one chunk, or as chunks of chunk_rows rows. The first append sets
+        # the columns of the store, later ones must give the same columns
+        shape = np.broadcast_shapes(*[np.shape(value) for value in columns.values()])
+        if len(shape) != 1:
+            raise ValueError("Columns must broadcast to a single dimension, got shape " + str(shape))
+        columns = self._check_columns({name: np.broadcast_to(value, shape) for (name, value) in columns.items()})
+
+        if not self.metadata['columns']:
+            self.metadata['columns'] = {name: value.dtype.str for (name, value) in columns.items()}
+
+        n_rows = shape[0]
+        chunk_rows = chunk_rows or max(n_rows, 1)
+        for start in range(0, n_rows, chunk_rows):
+            self._write_chunk({name: value[start:start + chunk_rows] for (name, value) in columns.items()})
+        self._save_metadata()
+
+    def _write_chunk(self, columns):
+        index = len(self.chunks)
+        name = 'chunk_' + str(index).zfill(6)
+        path = os.path.join(self.directory, name)
+
+        # left over from an append that crashed before store.json was written
+        if os.path.exists(path):
+            shutil.rmtree(path)
+
+        temporary = tempfile.mkdtemp(dir=self.directory, suffix='.tmp')
+        for (column, value) in columns.items():
+            np.save(os.path.join(temporary, column + '.npy'), np.ascontiguousarray(value))
+        os.replace(temporary, path)
+
+        rows = len(next(iter(columns.values())))
+        self.chunks.append({'name': name, 'rows': rows,
+                            'stats': {column: _statistics(value) for (column, value) in columns.items()}})
+
+    def read_chunk(self, chunk, column):
+        # memory mapped column of one chunk (an entry of self.chunks)
+        return np.load(os.path.join(self.directory, chunk['name'], column + '.npy'), mmap_mode='r')
+
+    def column(self, name):
+        # the whole column, read into memory
+        self._check_names([name])
+        if not self.chunks:
+            return np.empty(0, dtype=np.dtype(self.metadata['columns'][name]))
+        return np.concatenate([self.read_chunk(chunk, name) for chunk in self.chunks])
+
+    def _check_names(self, names):
+        unknown = [name for name in names if name not in self.metadata['columns']]
+        if unknown:
+            raise ValueError("Unknown columns: " + ", ".join(unknown) + "\nThe store has: " + ", ".join(self.columns))
+
+    def _check_predicates(self, where):
+        for predicate in where:
+            if len(predicate) != 3 or predicate[1] not in OPERATORS:
+                raise ValueError("Predicates are (column, op, value) with op one of " + ", ".join(OPERATORS) +
+                                 ", got " + str(predicate))
+        self._check_names([column for (column, _, _) in where])
+
+    def scan(self, where=(), columns=None):
+        # Yields a dict of the requested columns (all by default) of the
+        # matching rows of every chunk, with 'row' holding their row numbers
+        where = list(where)
+        self._check_predicates(where)
+        columns = self.columns if columns is None else list(columns)
+        self._check_names(columns)
+
+        offset = 0
+        for chunk in self.chunks:
+            start = offset
+            offset += chunk['rows']
+
+            # pushdown: skip chunks the statistics rule out, then narrow down
+            # the rows column by column and stop as soon as none are left
+            if not all(chunk['stats'].get(column) is None or _might_match(op, value, *chunk['stats'][column])
+                       for (column, op, value) in where):
+                continue
+
+            mask = None
+            for (column, op, value) in where:
+                data = self.read_chunk(chunk, column)
+                selected = OPERATORS[op](data, value) if mask is None else mask.copy()
+                if mask is not None:
+                    selected[mask] = OPERATORS[op](data[mask], value)
+                mask = selected
+                if not mask.any():
+                    break
+
+            if mask is None:
+                rows = np.arange(chunk['rows'])
+            else:
+                rows = np.flatnonzero(mask)
+            if rows.size == 0:
+                continue
+
+            result = {name: np.asarray(self.read_chunk(chunk, name)[rows]) for name in columns}
+            result['row'] = rows + start
+            yield result
+
+    def query(self, where=(), columns=None, limit=None):
+        # matching rows of the whole store as a dict of column name -> array
+        columns = self.columns if columns is None else list(columns)
+        parts = []
+        found = 0
+        for part in self.scan(where, columns):
+            parts.append(part)
+            found += len(part['row'])
+            if limit is not None and found >= limit:
+                break
+
+        if not parts:
+            result = {name: np.empty(0, dtype=np.dtype(self.metadata['columns'][name])) for name in columns}
+            result['row'] = np.empty(0, dtype=int)
+            return result
+
+        return {name: np.concatenate([part[name] for part in parts])[:limit] for name in columns + ['row']}
+
+    def count(self, where=()):
+        return sum(len(part['row']) for part in self.scan(where, columns=[]))
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+# Hybrid-pi small signal model of the single stage common-emitter and
+# cascode amplifiers. Gain and input impedance are computed together from
+# the same intermediates (r_e, r_pi, z_pi, z_mu, ...) instead of being
+# re-derived in every script.
+#
+# Every transistor/design parameter can be a scalar or an array. Parameters
+# are broadcast against each other and the frequency grid is appended as the
+# last axis, so n candidate designs evaluated on m frequencies give (n, m)
+# arrays in one vectorized call.
+
+import numpy as np
+import CalculationUtils
+import ResultCache
+import TwoPort
+
+# thermal voltage
+V_T = 27e-3
+
+# part of the cache key of evaluate, bump it whenever a change to the model
+# changes its results so cached ones from before aren't returned
+MODEL_VERSION = 1
+
+# frequency band of the NMR preamplifier
+F_MIN = 125e6
+F_MAX = 500e6
+
+def nmr_band(n_points=1000):
+    return np.linspace(F_MIN, F_MAX, n_points)
+
+class HybridPiModel:
+
+    def __init__(self, useCascode=False, I_E=5e-3, beta=330, c_pi=0.595e-12, c_mu=0.147e-12,
+                 RC=50, R_parallel=50, v_t=V_T):
+        self.useCascode = useCascode
+        self.amp_type = "Cascode" if useCascode else "Common-Emitter"
+
+        self.I_E = np.asarray(I_E, dtype=float)
+        self.beta = np.asarray(beta, dtype=float)
+        self.c_pi = np.asarray(c_pi, dtype=float)
+        self.c_mu = np.asarray(c_mu, dtype=float)
+        self.RC = np.asarray(RC, dtype=float)
+        self.R_parallel = np.asarray(R_parallel, dtype=float)
+        self.v_t = np.asarray(v_t, dtype=float)
+
+    def _expand(self, param, f):
+        # trailing axes so that a parameter broadcasts against the frequency grid
+        return np.reshape(param, np.shape(param) + (1,)*np.ndim(f))
+
+    def cache_key(self, f):
+        return ResultCache.make_key(self.amp_type + ':v' + str(MODEL_VERSION), I_E=self.I_E, beta=self.beta, c_pi=self.c_pi,
+                                    c_mu=self.c_mu, RC=self.RC, R_parallel=self.R_parallel,
+                                    v_t=self.v_t, f=np.asarray(f, dtype=float))
+
+    def evaluate(self, f, cache=None):
+        # Returns a dict with the gain, the input impedance and every
+        # intermediate used to compute them, each of shape param_shape + f.shape.
+        # With a ResultCache, a design evaluated before is loaded instead
+        if cache is None:
+            return self._evaluate(f)
+
+        results = cache.memoize(self.cache_key(f),
+                lambda: {name: value for (name, value) in self._evaluate(f).items() if value is not None})
+        # z_2 only exists for the cascode and can't be stored as None
+        return dict(results, z_2=results.get('z_2'))
+
+    def _evaluate(self, f):
+        omega = 2*np.pi*np.asarray(f, dtype=float)
+        I_E = self._expand(self.I_E, omega)
+        beta = self._expand(self.beta, omega)
+        c_pi = self._expand(self.c_pi, omega)
+        c_mu = self._expand(self.c_mu, omega)
+        RC = self._expand(self.RC, omega)
+        R_parallel = self._expand(self.R_parallel, omega)
+        v_t = self._expand(self.v_t, omega)
+
+        g_m = I_E / v_t
+        r_e = 1 / g_m
+        r_pi = beta * r_e
+        z_pi = -1j/(omega*c_pi)
+        z_mu = -1j/(omega*c_mu)
+
+        # Gain
+        g_1 = g_m - 1/z_mu
+        z_3 = CalculationUtils.parallel(RC, z_mu)
+
+        if self.useCascode:
+            z_2 = CalculationUtils.parallel(z_mu, z_pi, r_pi)
+            g_2 = g_m + 1/z_2
+            gain = z_3 * g_1 * g_m / g_2
+        else:
+            z_2 = None
+            gain = z_3 * g_1
+
+        # Gain for Miller Capacitance depending on amplifier type
+        if self.useCascode:
+            miller_gain = (CalculationUtils.parallel(r_e, z_mu, z_pi) /
+                           CalculationUtils.parallel(r_e, z_mu))
+        else:
+            miller_gain = RC * g_m
+
+        # Miller impedance and the non-feedback contribution from the BJT
+        c_miller = c_mu * (1 + miller_gain)
+        z_miller = -1j/(omega*c_miller)
+        z_bjt = CalculationUtils.parallel(z_pi, r_pi)
+
+        z_in = CalculationUtils.parallel(R_parallel, z_bjt, z_miller)
+
+        return {
+            'gain': gain, 'z_in': z_in,
+            'g_m': g_m, 'r_e': r_e, 'r_pi': r_pi,
+            'z_pi': z_pi, 'z_mu': z_mu, 'g_1': g_1, 'z_2': z_2, 'z_3': z_3,
+            'miller_gain': miller_gain, 'z_miller': z_miller, 'z_bjt': z_bjt,
+        }
+
+    def gain(self, f, cache=None):
+        return self.evaluate(f, cache)['gain']
+
+    def input_impedance(self, f, cache=None):
+        return self.evaluate(f, cache)['z_in']
+
+    def two_port(self, f):
+        # ABCD matrix of the whole stage, shape param_shape + f.shape + (2, 2):
+        # R_parallel across the input, the transistor(s) and RC across the
+        # output. Unlike evaluate, C_mu stays a feedback element instead of
+        # its Miller approximation, so the input impedance depends on
+        # whatever loads the stage (see TwoPort). The gain has the opposite
+        # sign convention: evaluate()['gain'] leaves out the inversion of the
+        # stage (about +g_m RC at low frequency), while TwoPort.voltage_gain
+        # of this matrix is V_out/V_in including it. Unloaded, the two are
+        # exactly -1 times each other
+        omega = 2*np.pi*np.asarray(f, dtype=float)
+        g_m = self._expand(self.I_E / self.v_t, omega)
+        y_pi = self._expand(self.I_E / (self.v_t * self.beta), omega) + 1j*omega*self._expand(self.c_pi, omega)
+        y_mu = 1j*omega*self._expand(self.c_mu, omega)
+
+        # common-emitter transistor, and for the cascode a common-base one on top
+        transistor = TwoPort.from_y(y_pi + y_mu, -y_mu, g_m - y_mu, y_mu)
+        if self.useCascode:
+            transistor = TwoPort.cascade(transistor, TwoPort.from_y(y_pi + g_m, 0, -g_m, y_mu))
+
+        return TwoPort.cascade(TwoPort.shunt(1 / self._expand(self.R_parallel, omega)), transistor,
+                               TwoPort.shunt(1 / self._expand(self.RC, omega)))
+
+    def external_impedance(self, f, z_target):
+        # Impedance the divider network (R1||R2) needs so that the input
+        # impedance of the amplifier becomes z_target
+        results = self.evaluate(f)
+        return CalculationUtils.parallel(z_target, -results['z_bjt'], -results['z_miller'])
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+
+# Harvests the operating point results of LTspice runs (.log files and the
+# .raw files of .op analyses) below a directory into one table, so bias points of many archived
+# runs can be compared without opening them by hand.
+#
+# Every result becomes a row (circuit, kind, name, quantity, step, value):
+#   circuit   path of the run relative to the root without its extension,
+#             e.g. Cascode/cascode, shared by the .log and the .op.raw
+#   kind      'run' for the solver statistics of a log (totiter, matrix_size,
+#             elapsed_time, ...), 'device' for the semiconductor operating
+#             points a log lists, 'node' for V(...) and 'current' for
+#             I(...)/Ix(...) of an operating point .raw
+#   name      device or node name in lower case, 'run' for statistics
+#   quantity  Ic, Vbe, V, I, totiter, ...
+#   step      index of the operating point within the file (.step runs)
+#
+# The table is kept as one .npz sorted by (circuit, name, quantity, step),
+# so lookups are nested binary searches rather than scans. It also records
+# the size, mtime and hash of every harvested file. A scan only re-reads
+# files whose size or mtime changed, and of those only re-parses the ones
+# whose hash changed as well, in a process pool. A .raw file is harvested if
+# its Plotname is "Operating Point", whatever it is named; the .raw files of
+# other analyses are indexed without rows. Files that fail to parse are
+# indexed with their error and no rows, and are reported but not retried
+# until they change.
+
+import os
+import re
+import hashlib
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import SpiceReader
+
+# longest first, circuit_name strips the first that matches
+EXTENSIONS = ('.op.raw', '.raw', '.log')
+
+OPERATING_POINT = 'operating point'
+
+ROW_COLUMNS = ('circuit', 'kind', 'name', 'quantity', 'model', 'source')
+
+# "matrix size = 61", "Total elapsed time: 0.236 seconds."
+STATISTIC = re.compile(r'^([a-z][a-z ]*?)\s*=\s*(\S+)\s*$', re.IGNORECASE)
+ELAPSED = re.compile(r'^Total elapsed time:\s*(\S+)', re.IGNORECASE)
+TRACE = re.compile(r'^(V|I|Ix|Ib|Ic|Ie)\((.+)\)$', re.IGNORECASE)
+
+def file_hash(path, block_size=2**20):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def circuit_name(relative_path):
+    for extension in EXTENSIONS:
+        if relative_path.lower().endswith(extension):
+            return relative_path[:-len(extension)].replace(os.sep, '/')
+    return relative_path.replace(os.sep, '/')
+
+def parse_log(path):
+    # rows (kind, name, quantity, model, step, value) of a LTspice log: the
+    # solver statistics, whether the operating point converged, the number of
+    # warnings and every semiconductor operating point table
+    rows = []
+    warnings = 0
+    step = -1
+    header = None
+
+    with open(path, 'r', encoding='latin-1') as log_file:
+        lines = [line.rstrip() for line in log_file]
+
+    for line in lines:
+        if line.startswith('WARNING'):
+            warnings += 1
+        elif 'iteration for .op point' in line or line.startswith('Gmin stepping') or line.startswith('Source stepping'):
+            rows.append(('run', 'run', 'op_succeeded', '', 0, float('succeeded' in line)))
+        elif line.startswith('Semiconductor Device Operating Points'):
+            step += 1
+        elif step >= 0 and line.strip().startswith('Name:'):
+            header = {'names': line.split()[1:], 'models': [''] * len(line.split()[1:])}
+        elif header is not None and line.strip():
+            (quantity, _, values) = line.strip().partition(':')
+            if quantity == 'Model':
+                header['models'] = values.split()
+                continue
+            for (name, model, value) in zip(header['names'], header['models'], values.split()):
+                try:
+                    rows.append(('device', name.lower(), quantity, model.lower(), step, float(value)))
+                except ValueError:
+                    pass
+        elif header is not None:
+            header = None
+        else:
+            match = ELAPSED.match(line) or STATISTIC.match(line)
+            if match is None:
+                continue
+            quantity = 'elapsed_time' if match.re is ELAPSED else match.group(1).strip().replace(' ', '_')
+            try:
+                rows.append(('run', 'run', quantity, '', 0, float(match.groups()[-1])))
+            except ValueError:
+                # method = trap, solver = Normal
+                pass
+
+    rows.append(('run', 'run', 'warnings', '', 0, float(warnings)))
+    return rows
+
+def parse_op_raw(path):
+    # rows of every node voltage and branch current of an operating point
+    # .raw file, one step per point. No rows for the .raw of other analyses
+    rows = []
+    if SpiceReader.read_raw_header(path).get('Plotname', '').lower() != OPERATING_POINT:
+        return rows
+    for (name, trace) in SpiceReader.RawFile(path).read().items():
+        match = TRACE.match(name)
+        if match is None:
+            continue
+        (quantity, element) = match.groups()
+        kind = 'node' if quantity.upper() == 'V' else 'current'
+        for (step, value) in enumerate(trace.astype(float).tolist()):
+            rows.append((kind, element.lower(), quantity, '', step, value))
+    return rows
+
+def harvest_file(task):
+    # Worker of scan. task is (path, hash known from the last scan or None).
+    # Returns (hash, rows or None if the hash is unchanged, error or None).
+    # The hash is '' if the file couldn't be read
+    (path, known_hash) = task
+    digest = ''
+    try:
+        digest = file_hash(path)
+        if digest == known_hash:
+            return (digest, None, None)
+        rows = parse_op_raw(path) if path.lower().endswith('.raw') else parse_log(path)
+        return (digest, rows, None)
+    except Exception as error:
+        return (digest, None, type(error).__name__ + ': ' + str(error))
+
+def _empty_table():
+    table = {name: np.array([], dtype=str) for name in ROW_COLUMNS + ('path', 'hash', 'error')}
+    table.update({'step': np.array([], dtype=np.int32), 'value': np.array([], dtype=float),
+                  'size': np.array([], dtype=np.int64), 'mtime_ns': np.array([], dtype=np.int64)})
+    return table
+
+class HarvestIndex:
+    # The harvested table of a directory tree, stored at index_path
+
+    def __init__(self, root, index_path=None):
+        self.root = root
+        self.index_path = index_path or os.path.join(root, '.spice_harvest.npz')
+        self.table = self._load()
+
+    def _load(self):
+        try:
+            with np.load(self.index_path) as index:
+                table = {name: index[name] for name in index.files}
+        except (OSError, KeyError, ValueError):
+            return _empty_table()
+        # indexes written before failures were recorded only list parsed files
+        table.setdefault('error', np.full(len(table['path']), '', dtype=str))
+        return table
+
+    def _save(self):
+        # to a temporary file first so an interrupted scan leaves the old index
+        (handle, temporary) = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.index_path)), suffix='.tmp')
+        with os.fdopen(handle, 'wb') as file:
+            np.savez(file, **self.table)
+        os.replace(temporary, self.index_path)
+
+    def __len__(self):
+        return len(self.table['value'])
+
+    def find_files(self):
+        # relative paths of every .log and .raw below the root
+        found = []
+        for (directory, _, names) in os.walk(self.root):
+            for name in names:
+                if name.lower().endswith(EXTENSIONS):
+                    found.append(os.path.relpath(os.path.join(directory, name), self.root))
+        return sorted(found)
+
+    def scan(self, workers=1, chunk_size=16, force=False):
+        # Brings the table up to date with the files below the root. Returns
+        # a dict with the counts of parsed, unchanged (same size and mtime),
+        # rehashed (changed mtime, same content) and removed files and a list
+        # of (path, error) for the files that failed to parse, including those
+        # that failed before and didn't change since
+        table = self.table
+        known = {str(path): k for (k, path) in enumerate(table['path'])}
+        files = self.find_files()
+
+        pending = []
+        stamps = {}
+        unchanged = 0
+        failed = []
+        for path in files:
+            stat = os.stat(os.path.join(self.root, path))
+            stamps[path] = (stat.st_size, stat.st_mtime_ns)
+            k = known.get(path)
+            if not force and k is not None and (table['size'][k], table['mtime_ns'][k]) == stamps[path]:
+                unchanged += 1
+                if table['error'][k]:
+                    failed.append((path, str(table['error'][k])))
+            else:
+                pending.append(path)
+
+        removed = set(known) - set(files)
+        if not pending and not removed:
+            return {'parsed': 0, 'unchanged': unchanged, 'rehashed': 0, 'removed': 0, 'failed': failed}
+
+        # a file that failed before is parsed again even if only its mtime
+        # changed, its hash alone doesn't say the error is still current
+        tasks = [(os.path.join(self.root, path),
+                  None if force or path not in known or table['error'][known[path]] else str(table['hash'][known[path]]))
+                 for path in pending]
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(harvest_file, tasks, chunksize=chunk_size))
+        else:
+            results = [harvest_file(task) for task in tasks]
+
+        # rows of removed, reparsed and failed files are replaced
+        hashes = {path: str(table['hash'][k]) for (path, k) in known.items() if path not in removed}
+        errors = {path: str(table['error'][k]) for (path, k) in known.items() if path not in removed}
+        replaced = set(removed)
+        new_rows = []
+        new_failures = 0
+        rehashed = 0
+        for (path, (digest, rows, error)) in zip(pending, results):
+            hashes[path] = digest
+            errors[path] = error or ''
+            if error is not None:
+                failed.append((path, error))
+                new_failures += 1
+                replaced.add(path)
+                continue
+            if rows is None:
+                rehashed += 1
+                continue
+            replaced.add(path)
+            circuit = circuit_name(path)
+            new_rows.extend((circuit, kind, name, quantity, model, path, step, value)
+                            for (kind, name, quantity, model, step, value) in rows)
+
+        keep = ~np.isin(table['source'], list(replaced))
+        rows = {name: table[name][keep] for name in ROW_COLUMNS + ('step', 'value')}
+        if new_rows:
+            columns = list(zip(*new_rows))
+            for (k, name) in enumerate(ROW_COLUMNS):
+                rows[name] = np.concatenate([rows[name].astype(str), np.array(columns[k], dtype=str)])
+            rows['step'] = np.concatenate([rows['step'], np.array(columns[6], dtype=np.int32)])
+            rows['value'] = np.concatenate([rows['value'], np.array(columns[7], dtype=float)])
+
+        # sorted for the binary searches of select
+        order = np.lexsort((rows['step'], rows['quantity'], rows['name'], rows['circuit']))
+        self.table = {name: value[order] for (name, value) in rows.items()}
+
+        harvested = sorted(hashes)
+        self.table.update({
+            'path': np.array(harvested, dtype=str),
+            'size': np.array([stamps[path][0] for path in harvested], dtype=np.int64),
+            'mtime_ns': np.array([stamps[path][1] for path in harvested], dtype=np.int64),
+            'hash': np.array([hashes[path] for path in harvested], dtype=str),
+            'error': np.array([errors[path] for path in harvested], dtype=str),
+        })
+        self._save()
+
+        return {'parsed': len(pending) - rehashed - new_failures, 'unchanged': unchanged, 'rehashed': rehashed,
+                'removed': len(removed), 'failed': failed}
+
+    def select(self, circuit=None, name=None, quantity=None, kind=None):
+        # dict of the row columns for the rows matching every given value.
+        # circuit, then name, then quantity narrow the range by binary search
+        # as long as the ones before are given; the rest filter the range
+        (low, high) = (0, len(self))
+        filters = []
+        narrowing = True
+        for (column, value) in (('circuit', circuit), ('name', name), ('quantity', quantity)):
+            if value is None:
+                narrowing = False
+            elif narrowing:
+                values = self.table[column][low:high]
+                (low, high) = (low + np.searchsorted(values, value, 'left'),
+                               low + np.searchsorted(values, value, 'right'))
+            else:
+                filters.append((column, value))
+        if kind is not None:
+            filters.append(('kind', kind))
+
+        rows = {column: self.table[column][low:high] for column in ROW_COLUMNS + ('step', 'value')}
+        if filters:
+            mask = np.ones(high - low, dtype=bool)
+            for (column, value) in filters:
+                mask &= rows[column] == value
+            rows = {column: values[mask] for (column, values) in rows.items()}
+        return rows
+
+    def circuits(self):
+        return sorted(set(self.table['circuit'].tolist()))
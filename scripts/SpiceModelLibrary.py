@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+
+# Gummel-Poon model cards from a SPICE library, and the hybrid-pi
+# parameters they give at a bias point.
+#
+# The library is parsed once into a table of every .MODEL card (one row per
+# card, one column per parameter, nan where a card doesn't set it) which is
+# cached next to the library as <name>.lib.index.npz, like the step index of
+# SpiceReader. Cards inside a .SUBCKT belong to that subcircuit, so NPN
+# transistors are looked up by part name (e.g. BFP842ESD) rather than by
+# their model name.
+#
+# operating_point evaluates the forward active Gummel-Poon equations for all
+# parts at once. Early effect and the series resistances are neglected, as in
+# the hybrid-pi model the other scripts use, so the numbers are meant for
+# screening parts rather than replacing a simulation.
+
+import os
+import re
+import numpy as np
+import SpiceReader
+import SmallSignalModel
+
+DEFAULT_LIBRARY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'LTspice', 'lib',
+                               'Infineon-RFTransistor-SPICE.lib-SM-v02_10-EN.lib')
+
+# SPICE defaults of the Gummel-Poon parameters used below
+NPN_DEFAULTS = {
+    'IS': 1e-16, 'BF': 100, 'NF': 1, 'ISE': 0, 'NE': 1.5, 'IKF': np.inf,
+    'TF': 0, 'XTF': 0, 'VTF': np.inf, 'ITF': 0, 'RB': 0,
+    'CJE': 0, 'VJE': 0.75, 'MJE': 0.33, 'CJC': 0, 'VJC': 0.75, 'MJC': 0.33, 'FC': 0.5,
+    'TNOM': 27,
+}
+
+BOLTZMANN = 1.380649e-23
+ELECTRON_CHARGE = 1.602176634e-19
+
+MODEL_CARD = re.compile(r'^\.model\s+(\S+)\s+([a-z]+)\s*\(?(.*)$', re.IGNORECASE)
+ASSIGNMENT = re.compile(r'([a-z_]\w*)\s*=\s*([^\s=()]+)', re.IGNORECASE)
+
+def _logical_lines(path):
+    # lines with their + continuations joined and comments dropped
+    line = None
+    with open(path, 'r', encoding='latin-1') as lib_file:
+        for raw in lib_file:
+            raw = raw.rstrip()
+            if raw.startswith('+'):
+                if line is not None:
+                    line += ' ' + raw[1:]
+                continue
+
+            if line is not None:
+                yield line
+            line = None if (not raw or raw.startswith('*')) else raw
+
+    if line is not None:
+        yield line
+
+def parse_library(path):
+    # Returns a list of model cards as dicts with the model name, its type
+    # (NPN, D, ...), the subcircuit it is defined in ('' at the top level) and
+    # its parameters
+    cards = []
+    subckt = ''
+    for line in _logical_lines(path):
+        keyword = line.split(None, 1)[0].lower()
+        if keyword == '.subckt':
+            subckt = line.split()[1]
+        elif keyword == '.ends':
+            subckt = ''
+        elif keyword == '.model':
+            match = MODEL_CARD.match(line)
+            if match is None:
+                raise ValueError("Can't parse model card in " + str(path) + ": " + line)
+
+            (name, kind, body) = match.groups()
+            params = {key.upper(): SpiceReader.parse_spice_value(value)
+                      for (key, value) in ASSIGNMENT.findall(body)}
+            cards.append({'name': name, 'type': kind.upper(), 'subckt': subckt, 'parameters': params})
+
+    return cards
+
+class ModelLibrary:
+
+    def __init__(self, path=DEFAULT_LIBRARY, use_cache=True):
+        self.path = path
+        self.index_path = str(path) + '.index.npz'
+        self.index = self._load_index() if use_cache else None
+
+        if self.index is None:
+            self.index = self._build_index()
+            if use_cache:
+                np.savez(self.index_path, **self.index)
+
+        self.names = [str(name) for name in self.index['names']]
+        self.types = [str(kind) for kind in self.index['types']]
+        self.subckts = [str(subckt) for subckt in self.index['subckts']]
+        self.parameter_names = [str(name) for name in self.index['parameter_names']]
+        self.parameters = self.index['parameters']
+
+        # NPN parts by the name used to instantiate them in a netlist
+        self.npn_rows = [i for (i, kind) in enumerate(self.types) if kind == 'NPN']
+        self.parts = [self.subckts[i] or self.names[i] for i in self.npn_rows]
+
+    def _source_stamp(self):
+        stat = os.stat(self.path)
+        return np.array([stat.st_size, stat.st_mtime_ns])
+
+    def _load_index(self):
+        try:
+            with np.load(self.index_path) as index:
+                if np.array_equal(index['source'], self._source_stamp()):
+                    return dict(index)
+        except (OSError, KeyError, ValueError):
+            pass
+
+        return None
+
+    def _build_index(self):
+        cards = parse_library(self.path)
+        parameter_names = sorted(set(name for card in cards for name in card['parameters']))
+        column = {name: j for (j, name) in enumerate(parameter_names)}
+
+        parameters = np.full((len(cards), len(parameter_names)), np.nan)
+        for (i, card) in enumerate(cards):
+            for (name, value) in card['parameters'].items():
+                parameters[i, column[name]] = value
+
+        return {
+            'source': self._source_stamp(),
+            'names': np.array([card['name'] for card in cards], dtype=str),
+            'types': np.array([card['type'] for card in cards], dtype=str),
+            'subckts': np.array([card['subckt'] for card in cards], dtype=str),
+            'parameter_names': np.array(parameter_names, dtype=str),
+            'parameters': parameters,
+        }
+
+    def _rows(self, parts):
+        if parts is None:
+            return self.npn_rows
+
+        # parts can be named by subcircuit (BFP842ESD) or by model (M_BFP842ESD)
+        rows = []
+        lookup = {self.names[row].lower(): row for row in self.npn_rows}
+        lookup.update({part.lower(): row for (part, row) in zip(self.parts, self.npn_rows)})
+        for part in parts:
+            if part.lower() not in lookup:
+                raise ValueError("No NPN model for " + part + " in " + str(self.path))
+            rows.append(lookup[part.lower()])
+        return rows
+
+    def npn_parameters(self, parts=None):
+        # dict of parameter name -> (n_parts,) array, with the SPICE default
+        # wherever a card doesn't set the parameter
+        rows = self._rows(parts)
+        params = {}
+        for (name, default) in NPN_DEFAULTS.items():
+            if name in self.parameter_names:
+                values = self.parameters[rows, self.parameter_names.index(name)]
+                params[name] = np.where(np.isnan(values), default, values)
+            else:
+                params[name] = np.full(len(rows), float(default))
+        return params
+
+    def operating_point(self, I_E, Vce=1.0, parts=None, iterations=20):
+        # Hybrid-pi parameters of every part (or the listed parts) at emitter
+        # current I_E. I_E and Vce may be arrays; the results have shape
+        # (n_parts,) + broadcast shape of I_E and Vce.
+        p = self.npn_parameters(parts)
+        extra = np.broadcast_shapes(np.shape(I_E), np.shape(Vce))
+        p = {name: value.reshape((-1,) + (1,)*len(extra)) for (name, value) in p.items()}
+        I_E = np.asarray(I_E, dtype=float)
+        Vce = np.asarray(Vce, dtype=float)
+
+        v_t = BOLTZMANN * (p['TNOM'] + 273.15) / ELECTRON_CHARGE
+
+        # I_C = I_E * beta / (beta + 1) and beta depends on I_C, so iterate
+        # from the ideal forward beta. Converges in a handful of iterations
+        beta = p['BF']
+        for _ in range(iterations):
+            I_C = I_E * beta / (beta + 1)
+
+            # with high injection I_C = I_xf / q_b, q_b = (1 + sqrt(1 + 4 I_xf/IKF)) / 2,
+            # which solves to I_xf = I_C (1 + I_C/IKF)
+            I_xf = I_C * (1 + I_C / p['IKF'])
+            Vbe = p['NF'] * v_t * np.log(I_xf / p['IS'])
+            I_B = I_xf / p['BF'] + p['ISE'] * np.expm1(Vbe / (p['NE'] * v_t))
+            beta = I_C / I_B
+
+        # g_m = dI_C/dVbe through I_xf
+        s = np.sqrt(1 + 4 * I_xf / p['IKF'])
+        dI_C = (2 * (1 + s) - 4 * I_xf / (p['IKF'] * s)) / (1 + s)**2
+        g_m = dI_C * I_xf / (p['NF'] * v_t)
+
+        # bias dependent transit time and the diffusion capacitance it gives
+        Vbc = Vbe - Vce
+        share = I_xf / (I_xf + p['ITF'])
+        tf = p['TF'] * (1 + p['XTF'] * share**2 * np.exp(Vbc / (1.44 * p['VTF'])))
+        c_diffusion = tf * g_m
+
+        c_pi = c_diffusion + _junction_capacitance(Vbe, p['CJE'], p['VJE'], p['MJE'], p['FC'])
+        c_mu = _junction_capacitance(Vbc, p['CJC'], p['VJC'], p['MJC'], p['FC'])
+
+        return {
+            'I_C': I_C, 'Vbe': Vbe, 'beta': beta, 'g_m': g_m,
+            'c_pi': c_pi, 'c_mu': c_mu, 'v_t': v_t,
+        }
+
+    def part_parameters(self, part, I_E, Vce=1.0):
+        # beta, C_pi, C_mu and g_m of a single part as plain floats, with the
+        # v_t that makes HybridPiModel reproduce g_m at I_E
+        op = self.operating_point(I_E, Vce=Vce, parts=[part])
+        params = {name: float(op[name][0]) for name in ('beta', 'c_pi', 'c_mu', 'g_m')}
+        params['v_t'] = I_E / params['g_m']
+        return params
+
+    def hybrid_pi(self, useCascode=False, I_E=5e-3, Vce=1.0, parts=None, RC=50, R_parallel=50):
+        # HybridPiModel with one entry per part along the first axis, ready to
+        # evaluate every transistor against the same design in one call. The
+        # model computes g_m as I_E / v_t, so v_t is set per part to reproduce
+        # the Gummel-Poon transconductance
+        op = self.operating_point(I_E, Vce=Vce, parts=parts)
+        I_E = I_E * np.ones_like(op['g_m'])
+        return SmallSignalModel.HybridPiModel(useCascode=useCascode, I_E=I_E, beta=op['beta'],
+                c_pi=op['c_pi'], c_mu=op['c_mu'], RC=RC, R_parallel=R_parallel, v_t=I_E / op['g_m'])
+
+def _junction_capacitance(V, CJ, VJ, MJ, FC):
+    # depletion capacitance, linearized above FC*VJ as in SPICE
+    forward = V >= FC * VJ
+    V_reverse = np.where(forward, 0, V)
+    reverse = CJ / (1 - V_reverse / VJ)**MJ
+    linear = CJ / (1 - FC)**(1 + MJ) * (1 - FC * (1 + MJ) + MJ * V / VJ)
+    return np.where(forward, linear, reverse)
@@ -0,0 +1,389 @@
+#!/usr/bin/env python
+
+# Readers for LTspice simulation outputs.
+#
+# Binary .raw files are memory-mapped, so traces are zero-copy numpy views
+# into the file and only the pages that are actually touched get read. This
+# keeps multi-hundred-MB stepped or Monte Carlo runs cheap to open.
+# Text exports (File > Export data as text) are parsed in fixed size chunks
+# straight into numpy arrays instead of growing python lists.
+
+import os
+import re
+import numpy as np
+
+# numbers in LTspice text exports, e.g. 1.74005422026801e+001
+NUMBER = re.compile(rb'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+def _decode_header(path, block_size=65536):
+    # The header is plain text terminated by "Binary:" or "Values:". LTspice XVII
+    # writes it as UTF-16LE, older versions and ngspice as ASCII.
+    with open(path, 'rb') as raw_file:
+        data = b''
+        while True:
+            block = raw_file.read(block_size)
+            data += block
+            encoding = 'utf-16-le' if len(data) > 1 and data[1] == 0 else 'latin-1'
+
+            for marker in ('Binary:\n', 'Values:\n'):
+                end = data.find(marker.encode(encoding))
+                if end >= 0:
+                    data_offset = end + len(marker.encode(encoding))
+                    return (data[:end].decode(encoding), marker[:-2], data_offset)
+
+            if not block:
+                raise ValueError("No Binary: or Values: section found in " + str(path))
+
+def read_raw_header(path):
+    # Returns a dict describing the raw file: the header fields, the list of
+    # (name, type) variables and the byte offset of the data section
+    (text, data_format, data_offset) = _decode_header(path)
+
+    header = {'variables': [], 'format': data_format, 'data_offset': data_offset}
+    lines = iter(text.splitlines())
+    for line in lines:
+        if line.startswith('Variables:'):
+            break
+        (key, _, value) = line.partition(':')
+        header[key.strip()] = value.strip()
+
+    for line in lines:
+        fields = line.split()
+        if len(fields) >= 3:
+            header['variables'].append((fields[1], fields[2]))
+
+    header['flags'] = header.get('Flags', '').lower().split()
+    header['n_variables'] = int(header['No. Variables'])
+    header['n_points'] = int(header['No. Points'])
+
+    return header
+
+def _variable_dtypes(flags, n_variables):
+    if 'complex' in flags:
+        return [np.dtype('<c16')] * n_variables
+    if 'double' in flags:
+        return [np.dtype('<f8')] * n_variables
+
+    # real data stores the independent variable as a double, everything else as float
+    return [np.dtype('<f8')] + [np.dtype('<f4')] * (n_variables - 1)
+
+class RawFile:
+    # Memory-mapped LTspice binary .raw file.
+    # raw['V(vout)'] returns a read-only view of that trace without copying,
+    # raw['V(vout)/V(vin)'] divides two traces. Names are case-insensitive.
+
+    def __init__(self, path):
+        self.path = path
+        self.header = read_raw_header(path)
+
+        if self.header['format'] != 'Binary':
+            raise ValueError("Only binary raw files can be memory-mapped: " + str(path))
+
+        self.names = [name for (name, _) in self.header['variables']]
+        self._index = {name.lower(): i for (i, name) in enumerate(self.names)}
+        self.dtypes = _variable_dtypes(self.header['flags'], self.header['n_variables'])
+        self.point_size = sum(dtype.itemsize for dtype in self.dtypes)
+
+        # A run that is still in progress or was aborted holds fewer points
+        # than the header announces, so trust the file size instead
+        data = np.memmap(path, dtype=np.uint8, mode='r', offset=self.header['data_offset'])
+        self.n_points = min(self.header['n_points'], len(data) // self.point_size)
+        self._data = data[:self.n_points * self.point_size]
+
+        if 'fastaccess' in self.header['flags']:
+            # stored one whole variable after the other
+            self._traces = []
+            start = 0
+            for dtype in self.dtypes:
+                stop = start + self.n_points * dtype.itemsize
+                self._traces.append(self._data[start:stop].view(dtype))
+                start = stop
+        else:
+            # stored one point (all variables) after the other
+            record = np.dtype({'names': ['v' + str(i) for i in range(len(self.dtypes))],
+                               'formats': self.dtypes})
+            points = self._data.view(record)
+            self._traces = [points['v' + str(i)] for i in range(len(self.dtypes))]
+
+    def __contains__(self, name):
+        return name.lower() in self._index or self._ratio_names(name) is not None
+
+    def __getitem__(self, name):
+        return self.trace(name)
+
+    def trace(self, name, start=0, stop=None):
+        # Points start:stop of a trace. Slicing the memory map only touches
+        # the pages of that range
+        if name.lower() in self._index:
+            return self._traces[self._index[name.lower()]][start:stop]
+
+        ratio = self._ratio_names(name)
+        if ratio is None:
+            raise KeyError("No trace " + name + " in " + str(self.path) +
+                           ". Available traces: " + ", ".join(self.names))
+
+        return self.trace(ratio[0], start, stop) / self.trace(ratio[1], start, stop)
+
+    def _ratio_names(self, name):
+        parts = name.split('/')
+        if len(parts) == 2 and all(part.strip().lower() in self._index for part in parts):
+            return (parts[0].strip(), parts[1].strip())
+
+        return None
+
+    def keys(self):
+        return list(self.names)
+
+    def read(self):
+        # every trace as an in-memory array, read in one go. For small files
+        # like .op.raw, where slicing the memory map per trace costs more
+        # than reading the whole file
+        data = np.array(self._data)
+        if 'fastaccess' in self.header['flags']:
+            traces = []
+            start = 0
+            for dtype in self.dtypes:
+                stop = start + self.n_points * dtype.itemsize
+                traces.append(data[start:stop].view(dtype))
+                start = stop
+        else:
+            record = np.dtype({'names': ['v' + str(i) for i in range(len(self.dtypes))], 'formats': self.dtypes})
+            points = data.view(record)
+            traces = [points['v' + str(i)] for i in range(len(self.dtypes))]
+        return dict(zip(self.names, traces))
+
+    @property
+    def axis(self):
+        # the independent variable (time, frequency, ...) as real values.
+        # AC analyses store frequency as a complex number with zero imaginary part
+        return self._traces[0].real
+
+# SPICE scale suffixes. "meg" has to be checked before "m"
+SPICE_SUFFIXES = [('meg', 1e6), ('mil', 25.4e-6), ('t', 1e12), ('g', 1e9), ('k', 1e3),
+                  ('m', 1e-3), ('u', 1e-6), ('\u00b5', 1e-6), ('n', 1e-9), ('p', 1e-12), ('f', 1e-15)]
+SPICE_NUMBER = re.compile(r'^([-+]?(?:\d+\.?\d*|\.\d+)(?:e[-+]?\d+)?)([a-z\u00b5]*)')
+
+def parse_spice_value(text):
+    # Converts a SPICE number such as 22n, 1.5k, 10Meg or 3.3V to a float.
+    # Trailing units after the scale suffix are ignored, like SPICE does
+    match = SPICE_NUMBER.match(text.strip().lower())
+    if match is None:
+        raise ValueError("Not a SPICE number: " + text)
+
+    (number, suffix) = match.groups()
+    for (name, scale) in SPICE_SUFFIXES:
+        if suffix.startswith(name):
+            return float(number) * scale
+
+    return float(number)
+
+def read_step_parameters(log_path):
+    # LTspice lists every run of a .step or Monte Carlo simulation in the log
+    # as ".step r1=59 r2=415". Returns the parameter names and an
+    # (n_steps, n_parameters) array of their values.
+    names = []
+    values = []
+    with open(log_path, 'r', encoding='latin-1') as log_file:
+        for line in log_file:
+            if not line.lower().startswith('.step'):
+                continue
+
+            pairs = [field.split('=', 1) for field in line.split()[1:] if '=' in field]
+            if not names:
+                names = [name for (name, _) in pairs]
+            values.append([parse_spice_value(value) for (_, value) in pairs])
+
+    return (names, np.array(values, dtype=float).reshape(len(values), len(names)))
+
+def _find_step_starts(axis, n_steps=0, chunk_points=2**20):
+    # Every run of a stepped simulation restarts the sweep at the same value
+    # (time 0, the start frequency, ...). When the log tells us the number of
+    # steps and they split the file evenly, only those boundaries are checked.
+    # Otherwise the axis is scanned chunk by chunk for restarts.
+    n_points = len(axis)
+    first = axis[0]
+
+    if n_steps > 0 and n_points % n_steps == 0:
+        starts = np.arange(0, n_points, n_points // n_steps)
+        if np.all(axis[starts] == first):
+            return starts
+
+    starts = []
+    for chunk_start in range(0, n_points, chunk_points):
+        chunk = axis[chunk_start:chunk_start + chunk_points]
+        starts.append(chunk_start + np.flatnonzero(chunk == first))
+
+    return np.concatenate(starts)
+
+class SteppedRawFile(RawFile):
+    # RawFile for .step / Monte Carlo runs, where all runs are concatenated
+    # in one file. The step boundaries are found once and cached next to the
+    # raw file as <name>.raw.steps.npz, so opening the file again only reads
+    # the header. raw.step(i) gives lazy access to a single run.
+
+    def __init__(self, path, log_path=None, use_cache=True):
+        RawFile.__init__(self, path)
+
+        if log_path is None:
+            log_path = re.sub(r'(\.op)?\.raw$', '', str(path), flags=re.IGNORECASE) + '.log'
+
+        self.index_path = str(path) + '.steps.npz'
+        self.index = self._load_index() if use_cache else None
+
+        if self.index is None:
+            self.index = self._build_index(log_path)
+            if use_cache:
+                np.savez(self.index_path, **self.index)
+
+        self.starts = self.index['starts']
+        self.stops = np.append(self.starts[1:], self.n_points)
+        self.parameter_names = [str(name) for name in self.index['parameter_names']]
+        self.parameters = self.index['parameters']
+
+    def _source_stamp(self):
+        stat = os.stat(self.path)
+        return np.array([stat.st_size, stat.st_mtime_ns])
+
+    def _load_index(self):
+        try:
+            with np.load(self.index_path) as index:
+                if np.array_equal(index['source'], self._source_stamp()):
+                    return dict(index)
+        except (OSError, KeyError, ValueError):
+            pass
+
+        return None
+
+    def _build_index(self, log_path):
+        if os.path.exists(log_path):
+            (names, parameters) = read_step_parameters(log_path)
+        else:
+            (names, parameters) = ([], np.empty((0, 0)))
+
+        starts = _find_step_starts(self.axis, n_steps=len(parameters))
+
+        # the log can't be matched to the data if the step counts differ
+        if len(parameters) != len(starts):
+            (names, parameters) = ([], np.empty((len(starts), 0)))
+
+        return {
+            'source': self._source_stamp(),
+            'starts': starts,
+            'byte_offsets': self.header['data_offset'] + starts * (
+                self.dtypes[0].itemsize if 'fastaccess' in self.header['flags'] else self.point_size),
+            'parameter_names': np.array(names, dtype=str),
+            'parameters': parameters,
+        }
+
+    @property
+    def n_steps(self):
+        return len(self.starts)
+
+    def step(self, i):
+        return RawStep(self, i)
+
+    def steps(self, indices=None):
+        if indices is None:
+            indices = range(self.n_steps)
+
+        for i in indices:
+            yield self.step(i)
+
+class RawStep:
+    # One run of a SteppedRawFile. Traces are views into the parent's memory
+    # map, so nothing outside this run is read
+
+    def __init__(self, raw, i):
+        self.raw = raw
+        self.number = i
+        self.start = int(raw.starts[i])
+        self.stop = int(raw.stops[i])
+        self.parameters = dict(zip(raw.parameter_names, raw.parameters[i].tolist()))
+
+    def __getitem__(self, name):
+        return self.raw.trace(name, self.start, self.stop)
+
+    def __contains__(self, name):
+        return name in self.raw
+
+    def keys(self):
+        return self.raw.keys()
+
+    @property
+    def axis(self):
+        return self.raw.axis[self.start:self.stop]
+
+def _parse_numbers(block):
+    return np.array(NUMBER.findall(block), dtype=float)
+
+def _column_layout(line):
+    # Every trace in a text export is either a real value, a (dB,deg) pair in
+    # Bode format, or a re,im pair in cartesian format
+    if b'dB' in line:
+        return 'bode'
+    if b',' in line.split(b'\t', 1)[-1]:
+        return 'cartesian'
+
+    return 'real'
+
+def _to_traces(values, names, layout):
+    if layout == 'real':
+        values = values.reshape(-1, len(names))
+        return [values[:, i] for i in range(len(names))]
+
+    values = values.reshape(-1, 2*len(names) - 1)
+    traces = [values[:, 0]]
+    for i in range(1, len(names)):
+        (first, second) = (values[:, 2*i - 1], values[:, 2*i])
+        if layout == 'bode':
+            traces.append(10**(first/20) * np.exp(1j*np.deg2rad(second)))
+        else:
+            traces.append(first + 1j*second)
+
+    return traces
+
+def iter_text_export(path, chunk_size=2**22):
+    # Streams an LTspice text export. Yields dicts mapping each column name
+    # to the values of roughly chunk_size bytes worth of rows. Complex traces,
+    # whether exported in Bode or cartesian format, come back as complex arrays.
+    with open(path, 'rb') as text_file:
+        names = text_file.readline().decode('latin-1').strip().split('\t')
+        layout = None
+
+        while True:
+            lines = text_file.readlines(chunk_size)
+            if not lines:
+                break
+
+            if layout is None:
+                layout = _column_layout(lines[0])
+
+            values = _parse_numbers(b''.join(lines))
+            yield dict(zip(names, _to_traces(values, names, layout)))
+
+class TextExport(dict):
+    # Column name -> array mapping of a text export. The first column is the
+    # independent variable, matching RawFile.axis
+
+    @property
+    def axis(self):
+        return next(iter(self.values())).real
+
+def read_text_export(path, chunk_size=2**22):
+    # Reads a whole text export into one array per column
+    chunks = list(iter_text_export(path, chunk_size))
+    if not chunks:
+        raise ValueError("No data found in " + str(path))
+
+    return TextExport((name, np.concatenate([chunk[name] for chunk in chunks])) for name in chunks[0])
+
+def load_traces(path):
+    # Opens any supported simulation output based on its extension
+    if str(path).lower().endswith('.raw'):
+        raw = RawFile(path)
+        if 'stepped' in raw.header['flags']:
+            return SteppedRawFile(path)
+
+        return raw
+
+    return read_text_export(path)
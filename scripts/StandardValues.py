@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+# Snapping of ideal resistor values to purchasable E-series parts.
+#
+# Each series is expanded once into a sorted table covering 1 Ohm - 10 MOhm,
+# so finding the nearest parts is a binary search (np.searchsorted) for a
+# whole batch of values at once. snap_designs enumerates every combination
+# of neighbouring standard values for a design, re-evaluates the emitter
+# current and the bias checks from BiasCalculations for all of them and
+# ranks the combinations.
+
+import numpy as np
+import BiasCalculations
+import CalculationUtils
+
+# values per decade, normalized to 100 <= value < 1000
+E96 = [100, 102, 105, 107, 110, 113, 115, 118, 121, 124, 127, 130, 133, 137, 140, 143,
+       147, 150, 154, 158, 162, 165, 169, 174, 178, 182, 187, 191, 196, 200, 205, 210,
+       215, 221, 226, 232, 237, 243, 249, 255, 261, 267, 274, 280, 287, 294, 301, 309,
+       316, 324, 332, 340, 348, 357, 365, 374, 383, 392, 402, 412, 422, 432, 442, 453,
+       464, 475, 487, 499, 511, 523, 536, 549, 562, 576, 590, 604, 619, 634, 649, 665,
+       681, 698, 715, 732, 750, 768, 787, 806, 825, 845, 866, 887, 909, 931, 953, 976]
+E48 = E96[::2]
+E24 = [100, 110, 120, 130, 150, 160, 180, 200, 220, 240, 270, 300,
+       330, 360, 390, 430, 470, 510, 560, 620, 680, 750, 820, 910]
+E12 = E24[::2]
+
+SERIES = {'E12': E12, 'E24': E24, 'E48': E48, 'E96': E96}
+
+# decades covered by the lookup tables, 1 Ohm up to 10 MOhm
+DECADES = range(-2, 5)
+
+_tables = {}
+
+def value_table(series):
+    # sorted array of every value of the series in the covered decades
+    if series not in _tables:
+        if series not in SERIES:
+            raise ValueError("Unknown resistor series " + str(series) +
+                             ". Expected one of: " + ", ".join(SERIES))
+
+        base = np.array(SERIES[series], dtype=float)
+        table = np.concatenate([base * 10.0**decade for decade in DECADES] + [[10.0**(DECADES[-1] + 3)]])
+        # round away the floating point noise of the scaling, e.g. 60.400000000000006
+        _tables[series] = np.round(table, 3)
+
+    return _tables[series]
+
+def neighbours(values, series='E96', k=1):
+    # The k standard values below and the k at or above each value, as an
+    # array of shape values.shape + (2k,). Clipped at the ends of the table.
+    table = value_table(series)
+    index = np.searchsorted(table, np.asarray(values, dtype=float))
+    offsets = np.arange(-k, k)
+    return table[np.clip(index[..., np.newaxis] + offsets, 0, len(table) - 1)]
+
+def snap(values, series='E96'):
+    # nearest standard value, measured as a ratio since tolerances are relative
+    candidates = neighbours(values, series, k=1)
+    ratio = np.abs(np.log(candidates / np.asarray(values, dtype=float)[..., np.newaxis]))
+    return np.take_along_axis(candidates, np.argmin(ratio, axis=-1)[..., np.newaxis], axis=-1)[..., 0]
+
+def snap_designs(useCascode, R1, R2, RE, Vcc, Vbe, I_E, RC, R3=None, beta=330,
+                 series='E96', k=1, n_best=3):
+    # Finds the best standard part sets for a batch of ideal designs.
+    # Every resistor is replaced by each of its 2k neighbouring standard values
+    # and all combinations are evaluated at once: the emitter current with the
+    # given beta, the resulting collector-emitter voltages and the same
+    # feasibility checks calculate_R_values.py applies to the ideal design.
+    # Feasible combinations are ranked by the relative error of I_E plus the
+    # relative error of R1||R2; infeasible ones are ranked last.
+    # Returns a dict of (n_designs, n_best) arrays.
+    names = ['R1', 'R2', 'RE'] + (['R3'] if useCascode else [])
+    ideal = dict(zip(names, np.broadcast_arrays(*[np.atleast_1d(np.asarray(value, dtype=float))
+                                                    for value in [R1, R2, RE] + ([R3] if useCascode else [])])))
+    n_designs = len(ideal['R1'])
+    n_resistors = len(names)
+
+    # one axis of 2k candidates per resistor, after the design axis
+    parts = {}
+    for (i, name) in enumerate(names):
+        shape = [n_designs] + [1]*n_resistors
+        shape[i + 1] = 2*k
+        parts[name] = neighbours(ideal[name], series, k).reshape(shape)
+
+    # design parameters broadcast along the design axis
+    (Vcc, Vbe, I_target, RC, beta) = [np.reshape(np.broadcast_to(value, (n_designs,)), [n_designs] + [1]*n_resistors)
+                                      for value in (Vcc, Vbe, I_E, RC, beta)]
+
+    I = BiasCalculations.get_I_E(useCascode, Vbe=Vbe, beta=beta, Vcc=Vcc, R1=parts['R1'], R2=parts['R2'],
+                                 RE=parts['RE'], R3=parts.get('R3'))
+    R_parallel = CalculationUtils.parallel(parts['R1'], parts['R2'])
+    R_parallel_ideal = CalculationUtils.parallel(ideal['R1'], ideal['R2']).reshape(Vcc.shape)
+
+    # collector-emitter voltages at the current the standard parts give
+    if useCascode:
+        V1 = Vcc * (parts['R1'] + parts['R2']) / (parts['R1'] + parts['R2'] + parts['R3'])
+        Vce2 = V1 - Vbe - I*parts['RE']
+        Vce1 = Vcc - I*RC - (V1 - Vbe)
+        checks = BiasCalculations.check_cascode(I_E=I, RE=parts['RE'], RC=RC, Vbe=Vbe, Vce1=Vce1, Vce2=Vce2,
+                                                R1=parts['R1'], R2=parts['R2'], R3=parts['R3'])
+    else:
+        Vce1 = Vcc - I*RC - I*parts['RE']
+        checks = BiasCalculations.check_common_emitter(I_E=I, RE=parts['RE'], RC=RC, Vbe=Vbe, Vce1=Vce1,
+                                                       R_parallel=R_parallel)
+    feasible = checks[0] & checks[1] & checks[2]
+
+    current_error = I / I_target - 1
+    score = np.abs(current_error) + np.abs(R_parallel / R_parallel_ideal - 1)
+    score = np.where(feasible, score, np.inf)
+
+    # flatten the combinations and keep the n_best of each design
+    combos = (n_designs, -1)
+    full = score.shape
+    score = score.reshape(combos)
+    n_best = min(n_best, score.shape[1])
+    best = np.argsort(score, axis=1, kind='stable')[:, :n_best]
+
+    def pick(values):
+        return np.take_along_axis(np.broadcast_to(values, full).reshape(combos), best, axis=1)
+
+    results = {name: pick(parts[name]) for name in names}
+    if not useCascode:
+        results['R3'] = np.full((n_designs, n_best), np.nan)
+    results['I_E'] = pick(I)
+    results['I_E_error'] = pick(current_error)
+    results['R_parallel'] = pick(R_parallel)
+    results['score'] = np.take_along_axis(score, best, axis=1)
+    results['feasible'] = pick(feasible)
+
+    return results
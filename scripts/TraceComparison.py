@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+# Comparison of frequency responses sampled on different grids, e.g. a 10k
+# point LTspice export against the 1k point analytic model.
+#
+# Traces are compared as magnitude (dB) and unwrapped phase (degrees), which
+# interpolate much better than real and imaginary parts. Traces that share a
+# frequency grid are stacked and interpolated onto the common grid together:
+# the interval and weight of every output point are found once with
+# np.searchsorted and applied to all rows. Errors are reported per band as
+# max and RMS of the magnitude and phase differences.
+
+import os
+import numpy as np
+import CalculationUtils
+import SmallSignalModel
+import SpiceReader
+
+# bands errors are reported for, (name, f_low, f_high)
+DEFAULT_BANDS = [
+    ('125-250 MHz', 125e6, 250e6),
+    ('250-375 MHz', 250e6, 375e6),
+    ('375-500 MHz', 375e6, 500e6),
+    ('full band', SmallSignalModel.F_MIN, SmallSignalModel.F_MAX),
+]
+
+SIMULATION_EXTENSIONS = ('.raw', '.txt')
+
+def to_polar(trace):
+    # magnitude in dB and unwrapped phase in degrees along the last axis
+    magnitude = 20*np.log10(CalculationUtils.magnitude(trace))
+    phase = np.rad2deg(np.unwrap(CalculationUtils.phase(trace), axis=-1))
+    return (magnitude, phase)
+
+def interpolate(x, xp, fp):
+    # np.interp for every row of fp (shape (..., len(xp))) at once. Points
+    # outside xp are nan instead of being clamped to the end values
+    x = np.asarray(x, dtype=float)
+    index = np.clip(np.searchsorted(xp, x) - 1, 0, len(xp) - 2)
+    weight = (x - xp[index]) / (xp[index + 1] - xp[index])
+
+    result = fp[..., index] * (1 - weight) + fp[..., index + 1] * weight
+    outside = (x < xp[0]) | (x > xp[-1])
+    return np.where(outside, np.nan, result)
+
+def common_grid(axes, n_points=None):
+    # linear grid over the frequencies every axis covers, as fine as the
+    # finest axis unless n_points is given
+    low = max(np.min(axis) for axis in axes)
+    high = min(np.max(axis) for axis in axes)
+    if low >= high:
+        raise ValueError("The traces don't share a frequency range")
+
+    if n_points is None:
+        n_points = max(len(axis) for axis in axes)
+    return np.linspace(low, high, n_points)
+
+def align(traces, grid):
+    # Interpolates a dict of name -> (f, complex trace) onto grid. Returns
+    # (names, magnitude, phase) with magnitude and phase of shape
+    # (n_traces, len(grid)), rows in the order of names
+    groups = {}
+    for (name, (f, trace)) in traces.items():
+        f = np.asarray(f, dtype=float)
+        key = (len(f), f[0], f[-1], hash(f.tobytes()))
+        groups.setdefault(key, (f, []))[1].append((name, np.asarray(trace)))
+
+    names = []
+    magnitudes = []
+    phases = []
+    for (f, members) in groups.values():
+        # traces on the same grid are interpolated as one block
+        order = np.argsort(f, kind='stable')
+        stack = np.stack([trace for (_, trace) in members])[..., order]
+        (magnitude, phase) = to_polar(stack)
+
+        names += [name for (name, _) in members]
+        magnitudes.append(interpolate(grid, f[order], magnitude))
+        phases.append(interpolate(grid, f[order], phase))
+
+    return (names, np.concatenate(magnitudes), np.concatenate(phases))
+
+def wrap_degrees(angle):
+    # phase differences in (-180, 180], so a full turn isn't counted as error
+    return 180 - np.mod(180 - angle, 360)
+
+def band_errors(grid, magnitude_error, phase_error, bands=DEFAULT_BANDS):
+    # Max and RMS of the errors (shape (..., len(grid))) in every band.
+    # Returns a dict of band name -> dict of (...) shaped arrays
+    results = {}
+    for (name, low, high) in bands:
+        mask = (grid >= low) & (grid <= high)
+        if not np.any(mask):
+            continue
+
+        magnitude = np.abs(magnitude_error[..., mask])
+        phase = np.abs(phase_error[..., mask])
+        results[name] = {
+            'max_db': np.nanmax(magnitude, axis=-1),
+            'rms_db': np.sqrt(np.nanmean(magnitude**2, axis=-1)),
+            'max_deg': np.nanmax(phase, axis=-1),
+            'rms_deg': np.sqrt(np.nanmean(phase**2, axis=-1)),
+        }
+
+    return results
+
+def compare(references, candidates, grid=None, bands=DEFAULT_BANDS):
+    # Every candidate against every reference. Both are dicts of
+    # name -> (f, complex trace). Returns (reference names, candidate names,
+    # band errors) with errors of shape (n_references, n_candidates)
+    if grid is None:
+        grid = common_grid([f for (f, _) in list(references.values()) + list(candidates.values())])
+
+    (reference_names, reference_magnitude, reference_phase) = align(references, grid)
+    (candidate_names, candidate_magnitude, candidate_phase) = align(candidates, grid)
+
+    magnitude_error = candidate_magnitude[np.newaxis] - reference_magnitude[:, np.newaxis]
+    phase_error = wrap_degrees(candidate_phase[np.newaxis] - reference_phase[:, np.newaxis])
+
+    return (reference_names, candidate_names, band_errors(grid, magnitude_error, phase_error, bands))
+
+def find_simulations(paths):
+    # simulation outputs in the given files and directories (searched recursively)
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for (root, _, files) in sorted(os.walk(path)):
+                found += [os.path.join(root, name) for name in sorted(files)
+                          if name.lower().endswith(SIMULATION_EXTENSIONS) and not name.lower().endswith('.op.raw')]
+        else:
+            found.append(path)
+    return found
+
+def load_simulation(path, trace):
+    # (f, trace) of an AC simulation output. Falls back to the only trace of
+    # the file if it doesn't contain the requested one. Returns None for
+    # outputs without a usable trace (operating points, transients, ...)
+    try:
+        traces = SpiceReader.load_traces(path)
+    except (ValueError, OSError):
+        return None
+
+    if isinstance(traces, SpiceReader.SteppedRawFile):
+        traces = traces.step(0)
+
+    if trace not in traces:
+        names = list(traces.keys())[1:]
+        if len(names) != 1:
+            return None
+        trace = names[0]
+
+    values = traces[trace]
+    if not np.iscomplexobj(values):
+        return None
+
+    return (np.asarray(traces.axis, dtype=float), np.asarray(values))
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+# Two-port (ABCD) description of amplifier stages so that multi-stage
+# designs, e.g. LTspice/DoubleCommonEmitter, include the loading of every
+# stage by the next.
+#
+# An ABCD array has shape (..., 2, 2) with the matrix in the last two axes
+# and any design/frequency axes in front, relating the port voltages and
+# currents as
+#     [V1]   [A  B] [ V2]
+#     [I1] = [C  D] [-I2]
+# so a chain of stages is the matrix product of their ABCD matrices. The
+# products are taken with one einsum over every leading axis at once, so N
+# stages over (designs x frequencies) cost N-1 vectorized passes.
+
+import numpy as np
+
+def _matrix(A, B, C, D):
+    (A, B, C, D) = np.broadcast_arrays(*[np.asarray(value, dtype=complex) for value in (A, B, C, D)])
+    return np.stack([np.stack([A, B], axis=-1), np.stack([C, D], axis=-1)], axis=-2)
+
+def series(z):
+    # series impedance between the ports
+    return _matrix(1, z, 0, 1)
+
+def shunt(y):
+    # shunt admittance across the ports
+    return _matrix(1, 0, y, 1)
+
+def from_y(y11, y12, y21, y22):
+    # ABCD of a two-port given by its admittance parameters
+    det = y11 * y22 - y12 * y21
+    return _matrix(-y22 / y21, -1 / y21, -det / y21, -y11 / y21)
+
+def cascade(*stages):
+    # ABCD of the stages connected output to input, in order. Leading axes
+    # broadcast, so stages evaluated for different designs combine freely
+    result = stages[0]
+    for stage in stages[1:]:
+        result = np.einsum('...ij,...jk->...ik', result, stage)
+    return result
+
+def voltage_gain(abcd, z_load=np.inf, z_source=0):
+    # V_out / V_source with the source impedance and load connected. z_load
+    # may mix open (inf) and finite loads, each element takes its own limit
+    (A, B, C, D) = (abcd[..., 0, 0], abcd[..., 0, 1], abcd[..., 1, 0], abcd[..., 1, 1])
+    open_load = np.isinf(z_load)
+    with np.errstate(invalid='ignore'):
+        loaded = z_load / (A * z_load + B + (C * z_load + D) * z_source)
+    return np.where(open_load, 1 / (A + C * z_source), loaded)
+
+def input_impedance(abcd, z_load=np.inf):
+    (A, B, C, D) = (abcd[..., 0, 0], abcd[..., 0, 1], abcd[..., 1, 0], abcd[..., 1, 1])
+    open_load = np.isinf(z_load)
+    with np.errstate(invalid='ignore'):
+        loaded = (A * z_load + B) / (C * z_load + D)
+    return np.where(open_load, A / C, loaded)
+
+def output_impedance(abcd, z_source=0):
+    (A, B, C, D) = (abcd[..., 0, 0], abcd[..., 0, 1], abcd[..., 1, 0], abcd[..., 1, 1])
+    return (D * z_source + B) / (C * z_source + A)
+
+def to_s(abcd, z0=50):
+    # S-parameters (same shape) for a real reference impedance z0
+    (A, B, C, D) = (abcd[..., 0, 0], abcd[..., 0, 1], abcd[..., 1, 0], abcd[..., 1, 1])
+    denominator = A + B / z0 + C * z0 + D
+    return np.stack([
+        np.stack([(A + B / z0 - C * z0 - D) / denominator, 2 * (A * D - B * C) / denominator], axis=-1),
+        np.stack([2 / denominator, (-A + B / z0 - C * z0 + D) / denominator], axis=-1),
+    ], axis=-2)
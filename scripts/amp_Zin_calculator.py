@@ -1,97 +1,146 @@
 #!/usr/bin/env python
 
-import matplotlib.pyplot as plt
 import numpy as np
 import argparse
+import json
 import CalculationUtils
+import SmallSignalModel
+import amp_gain_calculator
+import ResultCache
+import SpiceModelLibrary
+import os
 
-parser = argparse.ArgumentParser(
-        description = "Calculates the input impedance of a single stage amplifier design")
-
-parser.add_argument('-d', '--useCascode', action = 'store_true',
-        help = "Flag to indicate which amplifier to use: Cascode if called, Common-Emitter otherwise")
-parser.add_argument('-v', '--Vcc', default = 3.3, type = float,
-        help = "The power supply voltage of the circuit.")
-parser.add_argument('-i', '--emitterCurrent',  default = 5e-3, type = float,
-        help = "Target current flow in the emitter branch.")
-parser.add_argument('-b', '--beta', default = 330, type = float,
-        help = "Current amplification factor of the transistor")
-parser.add_argument('--Cpi', default = 0.595e-12, type = float,
-        help = "C_pi of the chosen transistor in the Hybrid Pi Model")
-parser.add_argument('--Cmu', default = 0.147e-12, type = float,
-	help = "C_mu of the chosen transistor in the Hybrid Pi Model")
-parser.add_argument('-r', '--rParallel', default = 50, type = float,
-        help = "The parallel combination of the input resistors (R1 || R2)")
-parser.add_argument('--RC', default = 50, type = float,
-        help = "Collector resistor value")
-parser.add_argument('-z', '--targetImpedanceMagnitude', default = 50, type = float,
-        help = "The impedance magnitude you wish to match to. Used as Bode Plot reference.")
-args = parser.parse_args()
-
-#### Design Parameters ###
-v_t = 27e-3
-z_target = args.targetImpedanceMagnitude
-V_CC = args.Vcc
-I_E = args.emitterCurrent
-c_pi = args.Cpi
-c_mu = args.Cmu
-f = np.linspace(125e6,500e6, 1000)
-omega = 2*np.pi*f
-beta = args.beta
-RC = args.RC
-r_e = v_t / I_E
-r_pi = beta * r_e
-z_pi = -1j/(omega*c_pi)
-z_mu = -1j/(omega*c_mu)
-R_in_eq = args.rParallel
-
-# Calculate gain for Miller Capacitance depending on amplifier type
-if args.useCascode:
-	miller_gain = CalculationUtils.parallel(r_e, z_mu, z_pi) / CalculationUtils.parallel(r_e, z_mu)
-	amp_type = "Cascode"
-else:
-	miller_gain = RC * I_E/v_t
-	amp_type = "Common-Emitter"
-
-# Calculate Miller impedance 
-c_miller = c_mu * (1 + miller_gain)
-z_miller = -1j/(omega*c_miller)
-
-# find non-feedback contribution from BJT
-z_bjt = CalculationUtils.parallel(z_pi, r_pi)
-
-z_in = CalculationUtils.parallel(R_in_eq, z_bjt, z_miller)
-
-z_in_mag = CalculationUtils.magnitude(z_in)
-z_in_phase = CalculationUtils.phase(z_in)
-
-print("Calculating for amplifier type: " + str(amp_type))
-
-plt.figure()
-plt.plot(f*1e-6, z_in_mag)
-plt.xlabel("Frequency (Hz)")
-plt.ylabel("Input Impedance Magnitude (" + r'$\Omega$' + ")")
-plt.title("Amplifier Input Impedance Magnitude")
-
-# plt.figure()
-# plt.semilogx(f*1e-6, 20*np.log10(z_in_mag/z_target) )
-# plt.xlabel("Frequency (Hz)")
-# plt.ylabel("Input Impedance Magnitude (dB)")
-# plt.title("Impedance Bode Plot (Reference of " + str(round(z_target, 1)) + r'$\Omega$' + ")" )
-
-plt.figure()
-plt.plot(f*1e-6, z_in_phase*180/(2*np.pi))
-plt.xlabel("Frequency (Hz)")
-plt.ylabel("Input Impedance Phase (Degrees)")
-plt.title("Amplifier Input Impedance Phase")
-
-# plt.figure()
-# plt.plot([c.real for c in z_in], [c.imag for c in z_in])
-# plt.xlabel("Re(" + r'$Z_{in}$' + ")")
-# plt.ylabel("Im(" + r'$Z_{in}$' + ")")
-# plt.xlim(-100, 100)
-# plt.ylim(-100, 100)
-# plt.title("Input Impedance in the Complex Plane")
-# plt.grid()
-
-plt.show()
\ No newline at end of file
+# matplotlib is only imported in plot_input_impedance, so importing this
+# module and running with --noPlot or --json doesn't pay for it
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+            description = "Calculates the input impedance of a single stage amplifier design")
+
+    parser.add_argument('-d', '--useCascode', action = 'store_true',
+            help = "Flag to indicate which amplifier to use: Cascode if called, Common-Emitter otherwise")
+    parser.add_argument('-v', '--Vcc', default = 3.3, type = float,
+            help = "The power supply voltage of the circuit.")
+    parser.add_argument('-i', '--emitterCurrent',  default = 5e-3, type = float,
+            help = "Target current flow in the emitter branch.")
+    parser.add_argument('-b', '--beta', default = 330, type = float,
+            help = "Current amplification factor of the transistor")
+    parser.add_argument('--Cpi', default = 0.595e-12, type = float,
+            help = "C_pi of the chosen transistor in the Hybrid Pi Model")
+    parser.add_argument('--Cmu', default = 0.147e-12, type = float,
+            help = "C_mu of the chosen transistor in the Hybrid Pi Model")
+    parser.add_argument('-r', '--rParallel', default = 50, type = float,
+            help = "The parallel combination of the input resistors (R1 || R2)")
+    parser.add_argument('--RC', default = 50, type = float,
+            help = "Collector resistor value")
+    parser.add_argument('-p', '--part', default = None,
+            help = "Transistor in the SPICE library to derive beta, C_pi, C_mu and g_m from at the emitter current. " +
+            "Overrides --beta, --Cpi and --Cmu")
+    parser.add_argument('--lib', default = SpiceModelLibrary.DEFAULT_LIBRARY,
+            help = "SPICE model library used with --part")
+    parser.add_argument('-z', '--targetImpedanceMagnitude', default = 50, type = float,
+            help = "The impedance magnitude you wish to match to. Used as Bode Plot reference.")
+    parser.add_argument('--fStart', default = SmallSignalModel.F_MIN, type = float,
+            help = "First frequency of the sweep (Hz)")
+    parser.add_argument('--fStop', default = SmallSignalModel.F_MAX, type = float,
+            help = "Last frequency of the sweep (Hz)")
+    parser.add_argument('-n', '--numPoints', default = 1000, type = int,
+            help = "Number of frequency points in the sweep")
+    parser.add_argument('--cacheDir', default = os.environ.get('NMR_CACHE_DIR'),
+            help = "Directory of the on-disk result cache. Defaults to $NMR_CACHE_DIR, no caching if neither is set")
+    parser.add_argument('--cacheSize', default = 256, type = float,
+            help = "Size limit of the on-disk result cache in MB")
+    parser.add_argument('--cacheStats', action = 'store_true',
+            help = "Print cache hit/miss statistics")
+    parser.add_argument('--noPlot', '--no-plot', action = 'store_true',
+            help = "Only print the results, don't plot them")
+    parser.add_argument('--json', action = 'store_true',
+            help = "Print the design and the input impedance as json instead of text. Implies --noPlot")
+    return parser
+
+def calculate_input_impedance(useCascode=False, I_E=5e-3, beta=330, c_pi=0.595e-12, c_mu=0.147e-12, RC=50,
+                              R_parallel=50, f=None, part=None, lib=SpiceModelLibrary.DEFAULT_LIBRARY, cache=None):
+    # Input impedance of the design over f (the NMR band by default). With
+    # part, the transistor parameters come from its model card at I_E instead.
+    # Returns a dict with the frequencies, the complex impedance and the
+    # transistor parameters used
+    if f is None:
+        f = np.linspace(SmallSignalModel.F_MIN, SmallSignalModel.F_MAX, 1000)
+
+    (model, transistor) = amp_gain_calculator.design_model(useCascode=useCascode, I_E=I_E, beta=beta,
+            c_pi=c_pi, c_mu=c_mu, RC=RC, R_parallel=R_parallel, part=part, lib=lib)
+
+    return {'amp_type': model.amp_type, 'part': part, 'transistor': transistor, 'f': f,
+            'z_in': model.input_impedance(f, cache)}
+
+def print_input_impedance(result):
+    amp_gain_calculator.print_transistor(result)
+
+    print("Calculating for amplifier type: " + str(result['amp_type']))
+
+def plot_input_impedance(result, z_target=50):
+    import matplotlib.pyplot as plt
+
+    f = result['f']
+    z_in_mag = CalculationUtils.magnitude(result['z_in'])
+    z_in_phase = CalculationUtils.phase(result['z_in'])
+
+    plt.figure()
+    plt.plot(f*1e-6, z_in_mag)
+    plt.xlabel("Frequency (Hz)")
+    plt.ylabel("Input Impedance Magnitude (" + r'$\Omega$' + ")")
+    plt.title("Amplifier Input Impedance Magnitude")
+
+    # plt.figure()
+    # plt.semilogx(f*1e-6, 20*np.log10(z_in_mag/z_target) )
+    # plt.xlabel("Frequency (Hz)")
+    # plt.ylabel("Input Impedance Magnitude (dB)")
+    # plt.title("Impedance Bode Plot (Reference of " + str(round(z_target, 1)) + r'$\Omega$' + ")" )
+
+    plt.figure()
+    plt.plot(f*1e-6, z_in_phase*180/(2*np.pi))
+    plt.xlabel("Frequency (Hz)")
+    plt.ylabel("Input Impedance Phase (Degrees)")
+    plt.title("Amplifier Input Impedance Phase")
+
+    # plt.figure()
+    # plt.plot([c.real for c in z_in], [c.imag for c in z_in])
+    # plt.xlabel("Re(" + r'$Z_{in}$' + ")")
+    # plt.ylabel("Im(" + r'$Z_{in}$' + ")")
+    # plt.xlim(-100, 100)
+    # plt.ylim(-100, 100)
+    # plt.title("Input Impedance in the Complex Plane")
+    # plt.grid()
+
+    plt.show()
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    #### Design Parameters ###
+    f = np.linspace(args.fStart, args.fStop, args.numPoints)
+    cache = ResultCache.ResultCache(args.cacheDir, max_bytes=args.cacheSize*2**20) if args.cacheDir else None
+
+    result = calculate_input_impedance(useCascode=args.useCascode, I_E=args.emitterCurrent, beta=args.beta,
+            c_pi=args.Cpi, c_mu=args.Cmu, RC=args.RC, R_parallel=args.rParallel, f=f, part=args.part,
+            lib=args.lib, cache=cache)
+
+    if args.json:
+        print(json.dumps(CalculationUtils.to_json({
+            'amp_type': result['amp_type'], 'part': result['part'], 'transistor': result['transistor'],
+            'f': result['f'], 'z_in': result['z_in'],
+            'cache': cache.stats if cache is not None else None}), allow_nan=False))
+        return result
+
+    print_input_impedance(result)
+
+    if cache is not None and args.cacheStats:
+        print(cache.report())
+
+    if not args.noPlot:
+        plot_input_impedance(result, args.targetImpedanceMagnitude)
+
+    return result
+
+if __name__ == '__main__':
+    main()
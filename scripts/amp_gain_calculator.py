@@ -1,83 +1,187 @@
 #!/usr/bin/env python
 
-import matplotlib.pyplot as plt
 import numpy as np
 import argparse
+import json
+import AdaptiveSampling
 import CalculationUtils
+import SmallSignalModel
+import ResultCache
+import SpiceModelLibrary
+import os
+import sys
 
-parser = argparse.ArgumentParser(
-        description = "Calculates the gain of a single stage amplifier design")
-
-parser.add_argument('-d', '--useCascode', action = 'store_true',
-        help = "Flag to indicate which amplifier to use: Cascode if called, Common-Emitter otherwise")
-parser.add_argument('-v', '--Vcc', default = 3.3, type = float,
-        help = "The power supply voltage of the circuit.")
-parser.add_argument('--Vbe', default = 0.76, type = float,
-        help = "The base emitter voltage of the BJT")
-parser.add_argument('-i', '--emitterCurrent',  default = 5e-3, type = float,
-        help = "Target current flow in the emitter branch.")
-parser.add_argument('-b', '--beta', default = 330, type = float,
-        help = "Current amplification factor of the transistor")
-parser.add_argument('--Cpi', default = 0.595e-12, type = float,
-        help = "C_pi of the chosen transistor in the Hybrid Pi Model")
-parser.add_argument('--Cmu', default = 0.147e-12, type = float,
-	help = "C_mu of the chosen transistor in the Hybrid Pi Model")
-parser.add_argument('--RC', default = 50, type = float,
-        help = "Collector resistor value")
-args = parser.parse_args()
-
-#### Design Parameters ###
-v_t = 27e-3
-V_BE = args.Vbe
-V_CC = args.Vcc
-I_E = args.emitterCurrent
-c_pi = args.Cpi
-c_mu = args.Cmu
-f = np.linspace(125e6,500e6, 1000)
-omega = 2*np.pi*f
-beta = args.beta
-RC = args.RC
-g_m = I_E / v_t
-r_e = 1 / g_m
-z_pi = -1j/(omega*c_pi)
-z_mu = -1j/(omega*c_mu)
-
-g_1 = g_m - 1 / z_mu
-z_3 = CalculationUtils.parallel(RC, z_mu)
-
-if args.useCascode:
-    z_2 = CalculationUtils.parallel(z_mu, z_pi, beta*r_e)
-    g_2 = g_m + 1/z_2
-    gain = z_3 * g_1 * g_m / g_2
-    amp_type = "Cascode"
-    print(z_3[0], z_2[0], g_1[0], g_m)
-else:
-    gain = z_3 * g_1
-    amp_type = "Common-Emitter"
-
-gain_mag = CalculationUtils.magnitude(gain)
-gain_phase = CalculationUtils.phase(gain)
-print(gain_mag[0])
-
-plt.figure()
-plt.semilogx(f*1e-6, 20*np.log10(gain_mag) )
-plt.xlabel("Frequency (Hz)")
-plt.ylabel("Gain Magnitude (dB)")
-plt.title("Gain Bode Plot" )
-
-plt.figure()
-plt.plot(f*1e-6, gain_phase*180/(2*np.pi))
-plt.xlabel("Frequency (Hz)")
-plt.ylabel("Gain Phase (Degrees)")
-plt.title("Gain Phase Plot")
-
-# plt.figure()
-# plt.plot([c.real for c in gain], [c.imag for c in gain])
-# plt.xlabel("Re(" + r'$Z_{in}$' + ")")
-# plt.ylabel("Im(" + r'$Z_{in}$' + ")")
-# plt.xlim(-100, 100)
-# plt.ylim(-100, 100)
-# plt.title("Gain in the Complex Plane")
-# plt.grid()
-
-plt.show()
\ No newline at end of file
+# matplotlib is only imported in plot_gain, so importing this module and
+# running with --noPlot or --json doesn't pay for it
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+            description = "Calculates the gain of a single stage amplifier design")
+
+    parser.add_argument('-d', '--useCascode', action = 'store_true',
+            help = "Flag to indicate which amplifier to use: Cascode if called, Common-Emitter otherwise")
+    parser.add_argument('-v', '--Vcc', default = 3.3, type = float,
+            help = "The power supply voltage of the circuit.")
+    parser.add_argument('--Vbe', default = 0.76, type = float,
+            help = "The base emitter voltage of the BJT")
+    parser.add_argument('-i', '--emitterCurrent',  default = 5e-3, type = float,
+            help = "Target current flow in the emitter branch.")
+    parser.add_argument('-b', '--beta', default = 330, type = float,
+            help = "Current amplification factor of the transistor")
+    parser.add_argument('--Cpi', default = 0.595e-12, type = float,
+            help = "C_pi of the chosen transistor in the Hybrid Pi Model")
+    parser.add_argument('--Cmu', default = 0.147e-12, type = float,
+            help = "C_mu of the chosen transistor in the Hybrid Pi Model")
+    parser.add_argument('--RC', default = 50, type = float,
+            help = "Collector resistor value")
+    parser.add_argument('-p', '--part', default = None,
+            help = "Transistor in the SPICE library to derive beta, C_pi, C_mu and g_m from at the emitter current. " +
+            "Overrides --beta, --Cpi and --Cmu")
+    parser.add_argument('--lib', default = SpiceModelLibrary.DEFAULT_LIBRARY,
+            help = "SPICE model library used with --part")
+    parser.add_argument('--fStart', default = SmallSignalModel.F_MIN, type = float,
+            help = "First frequency of the sweep (Hz)")
+    parser.add_argument('--fStop', default = SmallSignalModel.F_MAX, type = float,
+            help = "Last frequency of the sweep (Hz)")
+    parser.add_argument('-n', '--numPoints', default = 1000, type = int,
+            help = "Number of frequency points in the sweep")
+    parser.add_argument('--adaptive', action = 'store_true',
+            help = "Place the frequency points adaptively, refining only where the response curves, instead of " +
+            "--numPoints evenly spaced ones")
+    parser.add_argument('--toleranceDb', default = 0.01, type = float,
+            help = "Largest magnitude error (dB) of interpolating between adaptive points")
+    parser.add_argument('--toleranceDeg', default = 0.1, type = float,
+            help = "Largest phase error (degrees) of interpolating between adaptive points")
+    parser.add_argument('--cacheDir', default = os.environ.get('NMR_CACHE_DIR'),
+            help = "Directory of the on-disk result cache. Defaults to $NMR_CACHE_DIR, no caching if neither is set")
+    parser.add_argument('--cacheSize', default = 256, type = float,
+            help = "Size limit of the on-disk result cache in MB")
+    parser.add_argument('--cacheStats', action = 'store_true',
+            help = "Print cache hit/miss statistics")
+    parser.add_argument('--noPlot', '--no-plot', action = 'store_true',
+            help = "Only print the results, don't plot them")
+    parser.add_argument('--json', action = 'store_true',
+            help = "Print the design and the frequency response as json instead of text. Implies --noPlot")
+    return parser
+
+def design_model(useCascode=False, I_E=5e-3, beta=330, c_pi=0.595e-12, c_mu=0.147e-12, RC=50,
+                 R_parallel=50, part=None, lib=SpiceModelLibrary.DEFAULT_LIBRARY):
+    # (HybridPiModel of the design, transistor parameters used). With part,
+    # the transistor parameters come from its model card at I_E instead
+    if part is not None:
+        transistor = SpiceModelLibrary.ModelLibrary(lib).part_parameters(part, I_E)
+    else:
+        transistor = {'beta': beta, 'c_pi': c_pi, 'c_mu': c_mu, 'v_t': SmallSignalModel.V_T}
+
+    model = SmallSignalModel.HybridPiModel(useCascode=useCascode, I_E=I_E, beta=transistor['beta'],
+            c_pi=transistor['c_pi'], c_mu=transistor['c_mu'], v_t=transistor['v_t'], RC=RC, R_parallel=R_parallel)
+    return (model, transistor)
+
+def calculate_gain(useCascode=False, I_E=5e-3, beta=330, c_pi=0.595e-12, c_mu=0.147e-12, RC=50,
+                   f=None, part=None, lib=SpiceModelLibrary.DEFAULT_LIBRARY, cache=None):
+    # Gain of the design over f (the NMR band by default). Returns a dict
+    # with the frequencies, the complex gain, the transistor parameters used
+    # and the intermediate results of the model
+    if f is None:
+        f = np.linspace(SmallSignalModel.F_MIN, SmallSignalModel.F_MAX, 1000)
+
+    (model, transistor) = design_model(useCascode=useCascode, I_E=I_E, beta=beta, c_pi=c_pi, c_mu=c_mu, RC=RC,
+            part=part, lib=lib)
+    results = model.evaluate(f, cache)
+
+    return {'amp_type': model.amp_type, 'part': part, 'transistor': transistor, 'f': f,
+            'gain': results['gain'], 'model': results}
+
+def print_transistor(result):
+    # Parameters derived from the model card, if the design used --part
+    if result['part'] is not None:
+        transistor = result['transistor']
+        print(result['part'] + ": beta = " + str(round(transistor['beta'], 1)) + ", C_pi = " +
+              str(round(transistor['c_pi']*1e12, 4)) + " pF, C_mu = " + str(round(transistor['c_mu']*1e12, 4)) +
+              " pF, g_m = " + str(round(transistor['g_m']*1e3, 2)) + " mS")
+
+def print_gain(useCascode, result):
+    print_transistor(result)
+
+    model = result['model']
+    if useCascode:
+        print(model['z_3'][0], model['z_2'][0], model['g_1'][0], model['g_m'].item())
+
+    print(CalculationUtils.magnitude(result['gain'])[0])
+
+def plot_gain(result):
+    import matplotlib.pyplot as plt
+
+    f = result['f']
+    gain_mag = CalculationUtils.magnitude(result['gain'])
+    gain_phase = CalculationUtils.phase(result['gain'])
+
+    plt.figure()
+    plt.semilogx(f*1e-6, 20*np.log10(gain_mag) )
+    plt.xlabel("Frequency (Hz)")
+    plt.ylabel("Gain Magnitude (dB)")
+    plt.title("Gain Bode Plot" )
+
+    plt.figure()
+    plt.plot(f*1e-6, gain_phase*180/(2*np.pi))
+    plt.xlabel("Frequency (Hz)")
+    plt.ylabel("Gain Phase (Degrees)")
+    plt.title("Gain Phase Plot")
+
+    # plt.figure()
+    # plt.plot([c.real for c in gain], [c.imag for c in gain])
+    # plt.xlabel("Re(" + r'$Z_{in}$' + ")")
+    # plt.ylabel("Im(" + r'$Z_{in}$' + ")")
+    # plt.xlim(-100, 100)
+    # plt.ylim(-100, 100)
+    # plt.title("Gain in the Complex Plane")
+    # plt.grid()
+
+    plt.show()
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    #### Design Parameters ###
+    f = np.linspace(args.fStart, args.fStop, args.numPoints)
+    cache = ResultCache.ResultCache(args.cacheDir, max_bytes=args.cacheSize*2**20) if args.cacheDir else None
+
+    (model, transistor) = design_model(useCascode=args.useCascode, I_E=args.emitterCurrent, beta=args.beta,
+            c_pi=args.Cpi, c_mu=args.Cmu, RC=args.RC, part=args.part, lib=args.lib)
+
+    if args.adaptive:
+        # the model is built once, every refinement level only evaluates it
+        sampled = AdaptiveSampling.sample(model.gain, args.fStart, args.fStop, tolerance_db=args.toleranceDb,
+                tolerance_deg=args.toleranceDeg)
+        f = sampled['f']
+        if not sampled['converged']:
+            # stderr, so --json output stays parseable
+            print("WARNING: the adaptive grid didn't reach the tolerance within " +
+                  str(AdaptiveSampling.DEFAULT_MAX_DEPTH) + " refinements, " + str(len(f)) +
+                  " points may miss part of the response", file=sys.stderr)
+
+    # one more evaluation on the final grid for the intermediates of the
+    # printout, the adaptive gain is the one already sampled
+    results = model.evaluate(f, cache)
+    result = {'amp_type': model.amp_type, 'part': args.part, 'transistor': transistor, 'f': f,
+              'gain': sampled['values'] if args.adaptive else results['gain'], 'model': results}
+
+    if args.json:
+        print(json.dumps(CalculationUtils.to_json({
+            'amp_type': result['amp_type'], 'part': result['part'], 'transistor': result['transistor'],
+            'f': result['f'], 'gain': result['gain'],
+            'cache': cache.stats if cache is not None else None}), allow_nan=False))
+        return result
+
+    print_gain(args.useCascode, result)
+
+    if cache is not None and args.cacheStats:
+        print(cache.report())
+
+    if not args.noPlot:
+        plot_gain(result)
+
+    return result
+
+if __name__ == '__main__':
+    main()
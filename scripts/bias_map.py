@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+import numpy as np
+import argparse
+import sys
+import time
+import BiasCalculations
+import DCOperatingPoint
+import SpiceModelLibrary
+
+parser = argparse.ArgumentParser(
+        description = "Maps the emitter current of a bias network over temperature and beta by solving the DC " +
+        "operating point with an exponential base-emitter junction, rather than a fixed Vbe")
+
+parser.add_argument('-d', '--useCascode', action = 'store_true',
+        help = "Flag to indicate which amplifier to use: Cascode if called, Common-Emitter otherwise")
+parser.add_argument('-v', '--Vcc', default = 3.3, type = float,
+        help = "The power supply voltage of the circuit.")
+parser.add_argument('-i', '--i_target',  default = 5e-3, type = float,
+        help = "Target current flow in the emitter branch.")
+parser.add_argument('--R1', default = 60.4, type = float,
+        help = "Top resistor in the divider network for common-emitter, middle resistor for cascode")
+parser.add_argument('--R2', default = 357, type = float,
+        help = "Bottom resistor in the divider at the input")
+parser.add_argument('--R3', default = 13, type = float,
+        help = "Top resistor in the divider at the input of a cascode")
+parser.add_argument('--RE', default = 412, type = float,
+        help = "Emitter resistor value")
+parser.add_argument('--RC', default = 50, type = float,
+        help = "Collector resistor value, used for the collector-emitter voltages")
+parser.add_argument('--IS', nargs = '+', default = [1e-16], type = float,
+        help = "Saturation current(s) of the transistor at TNOM. One map is computed per value")
+parser.add_argument('--NF', default = 1.0, type = float,
+        help = "Forward emission coefficient")
+parser.add_argument('--TNOM', default = 27, type = float,
+        help = "Temperature the model parameters are given at (C)")
+parser.add_argument('-p', '--part', default = None,
+        help = "Take IS, NF and TNOM from this transistor in the SPICE library instead")
+parser.add_argument('--lib', default = SpiceModelLibrary.DEFAULT_LIBRARY,
+        help = "SPICE model library used with --part")
+parser.add_argument('-t', '--temperature', nargs = 3, default = [-40, 125, 166], type = float,
+        metavar = ('START', 'STOP', 'N'), help = "Temperatures mapped (C)")
+parser.add_argument('-b', '--beta', nargs = 3, default = [50, 800, 151], type = float,
+        metavar = ('START', 'STOP', 'N'), help = "Current amplification factors mapped")
+parser.add_argument('--Vbe', default = 0.76, type = float,
+        help = "Fixed Vbe of the simple bias equations, printed for comparison")
+parser.add_argument('--maxIterations', default = 100, type = int,
+        help = "Newton iterations before a case is reported as not converged")
+parser.add_argument('--noPlot', '--no-plot', action = 'store_true',
+        help = "Only print the summary")
+args = parser.parse_args()
+
+### Transistor ###
+I_S = np.array(args.IS)
+(NF, TNOM) = (args.NF, args.TNOM)
+if args.part is not None:
+    params = SpiceModelLibrary.ModelLibrary(args.lib).npn_parameters([args.part])
+    (I_S, NF, TNOM) = (params['IS'], params['NF'][0], params['TNOM'][0])
+
+temperature = np.linspace(args.temperature[0], args.temperature[1], int(args.temperature[2]))
+beta = np.linspace(args.beta[0], args.beta[1], int(args.beta[2]))
+R3 = args.R3 if args.useCascode else None
+
+# (I_S, temperature, beta)
+start = time.perf_counter()
+op = DCOperatingPoint.operating_point(args.useCascode, args.Vcc, args.R1, args.R2, args.RE, RC=args.RC, R3=R3,
+        beta=beta, I_S=I_S[:, np.newaxis, np.newaxis], NF=NF, temperature=temperature[:, np.newaxis], TNOM=TNOM,
+        max_iterations=args.maxIterations)
+elapsed = time.perf_counter() - start
+
+error = (op['I_E'] - args.i_target) / args.i_target * 100
+I_fixed = BiasCalculations.get_I_E(args.useCascode, Vbe=args.Vbe, beta=beta, Vcc=args.Vcc, R1=args.R1,
+        R2=args.R2, RE=args.RE, R3=R3)
+
+print('\n')
+print('************************************************************\n')
+print('Solved ' + str(op['I_E'].size) + ' operating points in ' + str(round(elapsed*1e3, 1)) + ' ms')
+counts = np.bincount(op['iterations'].ravel())
+print('Newton iterations: ' + ', '.join(str(n) + ' x ' + str(count) for (n, count) in enumerate(counts) if count))
+if not op['converged'].all():
+    print('WARNING: ' + str(np.count_nonzero(~op['converged'])) + ' cases did not converge in ' +
+          str(args.maxIterations) + ' iterations')
+
+for (k, value) in enumerate(I_S):
+    print('\nI_S = ' + str(value) + ' A at ' + str(TNOM) + ' C:')
+    print('I_E = ' + str(round(op['I_E'][k].min()*1e3, 3)) + ' - ' + str(round(op['I_E'][k].max()*1e3, 3)) +
+          ' mA, error ' + str(round(error[k].min(), 2)) + ' to ' + str(round(error[k].max(), 2)) + ' %')
+    print('Vbe = ' + str(round(op['Vbe'][k].min(), 3)) + ' - ' + str(round(op['Vbe'][k].max(), 3)) + ' V')
+    saturated = np.count_nonzero(op['saturated'][k])
+    if saturated:
+        print('NOTE: ' + str(saturated) + ' of ' + str(op['saturated'][k].size) + ' cases are saturated')
+
+print('\nFixed Vbe = ' + str(args.Vbe) + ' V gives I_E = ' + str(round(I_fixed.min()*1e3, 3)) + ' - ' +
+      str(round(I_fixed.max()*1e3, 3)) + ' mA over the same betas')
+print('\n************************************************************\n')
+
+if args.noPlot:
+    sys.exit(0)
+
+import matplotlib.pyplot as plt
+
+for (k, value) in enumerate(I_S):
+    plt.figure()
+    c = plt.pcolormesh(beta, temperature, error[k], shading='auto', cmap='RdBu_r')
+    plt.colorbar(c, label = "Emitter Current Error (%)")
+    plt.contour(beta, temperature, error[k], levels=[-10, -5, 0, 5, 10], colors='k', linewidths=0.5)
+    plt.xlabel(r'$\beta$')
+    plt.ylabel("Temperature (C)")
+    plt.title("Emitter Current Error, " + r'$I_S$' + " = " + str(value) + " A")
+
+plt.show()
@@ -1,174 +1,269 @@
 #!/usr/bin/env python
 
-import matplotlib.pyplot as plt
 import numpy as np
 import argparse
+import json
+import sys
 import CalculationUtils
+import BiasCalculations
+import StandardValues
+import ResultsStore
 
-parser = argparse.ArgumentParser(
-        description = "Calculates the resistor values for a single stage amplifier design given a set of parameters")
-
-parser.add_argument('-d', '--useCascode', action = 'store_true',
-        help = "Flag to indicate which amplifier to use: Cascode if called, Common-Emitter otherwise")
-parser.add_argument( '-v', '--Vcc', default = 3.3, type = float,
-        help = "The power supply voltage of the circuit.")
-parser.add_argument( '--Vbe', default = 0.76, type = float,
-        help = "The base emitter voltage of the BJT")
-parser.add_argument('--Vce1', default = 1, type = float,
-        help = "The desired collector-emitter voltage of the BJT. V_CE for Q1 if cascode. Ignored if RE provided")
-parser.add_argument('--Vce2', default = 0.4, type = float,
-		help = "The desiered collector-emitter voltage for Q2 in a cascode amplifier. Ignored if RE provided or common-emitter")
-parser.add_argument( '-i', '--emitterCurrent',  default = 5e-3, type = float,
-        help = "Target current flow in the emitter branch.")
-parser.add_argument('--RE', default = argparse.SUPPRESS, type = float,
-        help = "Emitter resistor value. Typically supressed. If value provided, Vce and Rc arguments ignored.")
-parser.add_argument('--RC', default = 50, type = float,
-        help = "Collector resistor value. Ignored if RE provided")
-parser.add_argument('-r', '--rParallel', default = 50, type = float,
-        help = "The parallel combination of the input resistors (R1 || R2)")
-parser.add_argument('-m', '--maximum_input_impedance', action = 'store_true',
-        help = "If this option is specified, ignores r_parallel and tries to maximize the resistor combination." )
-args = parser.parse_args()
-
-### CONSTANTS ###
-I_E = args.emitterCurrent
-Vcc = args.Vcc
-RC = args.RC
-Vce1 = args.Vce1
-Vce2 = args.Vce2
-Vbe = args.Vbe
-
-def find_R_vals_common_emitter(I_E, RE, Vbe, Vcc, R_parallel):
-	# rearranged from I_E = (Vdiv - Vbe) / RE
-	# Vdiv = Vcc * R2 / (R1 + R2)
-	# rearranging this gives R2 = ( Vdiv / (Vcc - Vdiv) )*R1 = a*R1
-	Vdiv = I_E * RE + Vbe
-	a = Vdiv / (Vcc - Vdiv)
-
-	# R_parallel = R1 * R2 / (R1 + R2)
-	# Plugging in R2 = a*R1 -> R1 = ( (a + 1) / a ) * R_parallel = b * R_parallel
-	b = (a + 1) / a
-	R1 = b * R_parallel
-	R2 = a * R1
-
-	return (R1, R2)
-
-def find_R_vals_cascode(I_E, RE, Vbe, Vcc, Vce2, R_parallel):
-	# Assuming that the effects of beta are negligible:
-	# Current through all three resistors is identical so
-	# V_R3/R3 = V_R2/R2 = V_R1/R1
-	# let a = V_R1/V_R3 = (V1-V2) / (Vcc - V1)
-	# let b = V_R2/V_R3 = V2 / (Vcc - V1)
-	# Then R1 = aR3, R2 = bR3
-
-	V1 = I_E*RE + Vce2 + Vbe
-	V2 = I_E*RE + Vbe
-
-	a = (V1 - V2) / (Vcc - V1)
-	b = V2 / (Vcc - V1)
-
-	if args.maximum_input_impedance:
-		# Plugging equations above into RE = (R2 * (2R3 + R1)) / (R1 + R2 + R3)
-		# Rearranging for R3
-		R3 = (a + b + 1) / (2*b + a*b) * RE
+GRID_COLUMNS = ['Vcc', 'Vbe', 'Vce1', 'Vce2', 'I_E', 'RC', 'R_parallel', 'RE']
+RESULT_COLUMNS = ['R1', 'R2', 'R3', 'RE', 'R_parallel', 'beta_insensitive', 'linear', 'not_saturated', 'feasible']
+STANDARD_COLUMNS = ['R1', 'R2', 'R3', 'RE', 'I_E', 'I_E_error', 'feasible']
+
+def build_parser():
+	parser = argparse.ArgumentParser(
+			description = "Calculates the resistor values for a single stage amplifier design given a set of parameters")
+
+	parser.add_argument('-d', '--useCascode', action = 'store_true',
+			help = "Flag to indicate which amplifier to use: Cascode if called, Common-Emitter otherwise")
+	parser.add_argument( '-v', '--Vcc', default = 3.3, type = float,
+			help = "The power supply voltage of the circuit.")
+	parser.add_argument( '--Vbe', default = 0.76, type = float,
+			help = "The base emitter voltage of the BJT")
+	parser.add_argument('--Vce1', default = 1, type = float,
+			help = "The desired collector-emitter voltage of the BJT. V_CE for Q1 if cascode. Ignored if RE provided")
+	parser.add_argument('--Vce2', default = 0.4, type = float,
+			help = "The desiered collector-emitter voltage for Q2 in a cascode amplifier. Ignored if RE provided or common-emitter")
+	parser.add_argument( '-i', '--emitterCurrent',  default = 5e-3, type = float,
+			help = "Target current flow in the emitter branch.")
+	parser.add_argument('--RE', default = argparse.SUPPRESS, type = float,
+			help = "Emitter resistor value. Typically supressed. If value provided, Vce and Rc arguments ignored.")
+	parser.add_argument('--RC', default = 50, type = float,
+			help = "Collector resistor value. Ignored if RE provided")
+	parser.add_argument('-r', '--rParallel', default = 50, type = float,
+			help = "The parallel combination of the input resistors (R1 || R2)")
+	parser.add_argument('-m', '--maximum_input_impedance', action = 'store_true',
+			help = "If this option is specified, ignores r_parallel and tries to maximize the resistor combination." )
+	parser.add_argument('-g', '--grid', default = None, type = str,
+			help = "CSV file of design points to solve in one pass. The header names any of the columns " +
+			"Vcc, Vbe, Vce1, Vce2, I_E, RC, R_parallel, RE. Missing columns take the values of the other arguments.")
+	parser.add_argument('-o', '--output', default = None, type = str,
+			help = "CSV file the grid results are written to. Printed to stdout if not provided. Only used with --grid")
+	parser.add_argument('--store', default = None, type = str,
+			help = "Also append the grid results to this results store directory (see query_results.py). Only used with --grid")
+	parser.add_argument('-s', '--series', default = None, choices = list(StandardValues.SERIES),
+			help = "Also find the best sets of standard resistor values from this E-series")
+	parser.add_argument('-b', '--beta', default = 330, type = float,
+			help = "Current amplification factor used to re-check I_E with standard resistor values. Only used with --series")
+	parser.add_argument('-k', '--neighbours', default = 1, type = int,
+			help = "Number of standard values tried on each side of every ideal resistor value. Only used with --series")
+	parser.add_argument('--json', action = 'store_true',
+			help = "Print the design as json instead of text. Ignored with --grid")
+	return parser
+
+def solve_grid(grid_file, output_file=None, useCascode=False, defaults=None, maximize_input_impedance=False,
+			series=None, beta=330, k=1, store=None):
+	# Solves every design point of the csv grid file. Columns missing from
+	# the grid take their value from defaults (a dict over GRID_COLUMNS).
+	# With store (a directory), the table is also appended to a ResultsStore
+	grid = np.genfromtxt(grid_file, delimiter=',', names=True, ndmin=1)
+
+	unknown = [name for name in grid.dtype.names if name not in GRID_COLUMNS]
+	if unknown:
+		raise ValueError("Unknown grid columns: " + ", ".join(unknown) +
+						"\nExpected any of: " + ", ".join(GRID_COLUMNS))
+
+	defaults = dict({'Vcc': 3.3, 'Vbe': 0.76, 'Vce1': 1, 'Vce2': 0.4, 'I_E': 5e-3, 'RC': 50,
+				'R_parallel': 50, 'RE': None}, **(defaults or {}))
+	params = {name: (grid[name] if name in grid.dtype.names else value) for (name, value) in defaults.items()}
+
+	results = BiasCalculations.solve_R_values(useCascode=useCascode, Vcc=params['Vcc'], Vbe=params['Vbe'],
+			Vce1=params['Vce1'], Vce2=params['Vce2'], I_E=params['I_E'], RC=params['RC'],
+			R_parallel=params['R_parallel'], RE=params['RE'],
+			maximize_input_impedance=maximize_input_impedance)
+
+	# input parameters first, then everything that was solved for.
+	# RE and R1||R2 are part of the results since either may have been derived
+	inputs = [name for name in GRID_COLUMNS if name not in RESULT_COLUMNS]
+	columns = [np.broadcast_to(params[name], len(grid)) for name in inputs]
+	columns += [results[name] for name in RESULT_COLUMNS]
+	header = inputs + RESULT_COLUMNS
+
+	# best standard part set of every design
+	if series is not None:
+		parts = StandardValues.snap_designs(useCascode=useCascode, R1=results['R1'], R2=results['R2'],
+				RE=results['RE'], R3=results['R3'], Vcc=params['Vcc'], Vbe=params['Vbe'], I_E=params['I_E'],
+				RC=params['RC'], beta=beta, series=series, k=k, n_best=1)
+		columns += [parts[name][:, 0] for name in STANDARD_COLUMNS]
+		header += [name + '_std' for name in STANDARD_COLUMNS]
+
+	if store is not None:
+		# parameters as floats, so a later grid giving a column as a float still fits
+		table = {name: (column if column.dtype == bool else column.astype(float)) for (name, column) in zip(header, columns)}
+		table['useCascode'] = useCascode
+		ResultsStore.ResultsStore(store).append(table)
+
+	np.savetxt(output_file if output_file is not None else sys.stdout, np.column_stack(columns),
+			delimiter=',', header=','.join(header), comments='', fmt='%.6g')
+
+	print(str(np.count_nonzero(results['feasible'])) + ' of ' + str(len(grid)) + ' designs are feasible',
+			file=sys.stderr)
+
+	return results
+
+def calculate_R_values(useCascode=False, Vcc=3.3, Vbe=0.76, Vce1=1, Vce2=0.4, I_E=5e-3, RC=50, R_parallel=50,
+			RE=None, maximize_input_impedance=False):
+	# Resistor values of a single design. Raises ValueError if the design
+	# isn't valid. Returns a dict of the resistors (R3 is None for the
+	# common-emitter amplifier) and the R1||R2 they were solved for
+
+	# determine R_E based on either provided value or from R_C and V_CE
+	RE_given = RE is not None
+	if not RE_given:
+		if useCascode:
+			RE = BiasCalculations.find_RE(I_E=I_E, RC=RC, Vcc=Vcc, Vce1=Vce1, Vce2=Vce2)
+		else:
+			RE = BiasCalculations.find_RE(I_E=I_E, RC=RC, Vcc=Vcc, Vce1=Vce1)
+
+	# determine whether to maximize impedance or not
+	if maximize_input_impedance:
+		R_parallel = RE
+
+	# find R values
+	R3 = None
+	if useCascode:
+		(R1, R2, R3) = BiasCalculations.find_R_vals_cascode(I_E=I_E, RE=RE, Vbe=Vbe, Vcc=Vcc, Vce2=Vce2,
+				R_parallel=R_parallel, maximize_input_impedance=maximize_input_impedance)
+		# the R1||R2 the maximized cascode divider actually gives, below RE
+		if maximize_input_impedance:
+			R_parallel = CalculationUtils.parallel(R1, R2)
 	else:
-		# Plugging the equations above into R_parallel = R1||R2
-		# Rearranging for R3
-		R3 = (a + b) / (a * b) * R_parallel
-		
-	R1 = a * R3
-	R2 = b * R3
-	
-	return (R1,R2,R3)
-
-# determine R_E based on either provided value or from R_C and V_CE
-if hasattr(args, 'RE'):
-    RE = args.RE
-    RE_given = True
-else:
-	RC = args.RC
-	if args.useCascode:
-		Vce1 = args.Vce1
-		Vce2 = args.Vce2
-		RE = (Vcc - I_E*RC - Vce1 - Vce2)/I_E
+		(R1, R2) = BiasCalculations.find_R_vals_common_emitter(I_E=I_E, RE=RE, Vbe=Vbe, Vcc=Vcc, R_parallel=R_parallel)
+
+	# Check design parameters are valid
+	# First check that condition to guarentee beta insensitivity is satisfied
+	# Then checks all resistors are in their linear active region
+	if useCascode:
+		(beta_insensitive, linear, not_saturated) = BiasCalculations.check_cascode(I_E=I_E, RE=RE, RC=RC,
+				Vbe=Vbe, Vce1=Vce1, Vce2=Vce2, R1=R1, R2=R2, R3=R3)
+	else:
+		(beta_insensitive, linear, not_saturated) = BiasCalculations.check_common_emitter(I_E=I_E, RE=RE, RC=RC,
+				Vbe=Vbe, Vce1=Vce1, R_parallel=R_parallel)
+
+	if useCascode:
+		if not beta_insensitive:
+			raise ValueError("Invalid parameters cascode: design violates inequality " +
+							"RE >= (R2 * (2*R3 + R1)) / (R1 + R2 + R3)\n" +
+							"RE = " + str(RE) + "\nR1||R2 = " + str(R_parallel))
+		elif not linear:
+			raise ValueError("Invalid parameters cascode: Q1 not in linear region " +
+							"Vbe1 > I_E*RC + Vce1\n" +
+							"Vbe = " + str(Vbe) + "\n" +
+							"R_C * I_E + Vce1 = " + str(I_E*RC + Vce1))
+		elif not not_saturated:
+			raise ValueError("collector emitter voltage below saturation value\n" +
+							"Vce1 = " + str(Vce1) + "\nVce2 = " + str(Vce2))
+	else:
+		if not beta_insensitive:
+			raise ValueError("Invalid parameters common-emitter: design violates inequality R1||R2 <= RE\n" +
+							"RE = " + str(RE) + "\nR1||R2 = " + str(R_parallel))
+		elif not linear:
+			raise ValueError("Invalid parameters common-emitter: Q1 not in linear region " +
+							"Vbe1 > I_E*RC + Vce1\n" +
+							"Vbe = " + str(Vbe) + "\n" +
+							"R_C * I_E + Vce1 = " + str(I_E*RC + Vce1))
+		elif not not_saturated:
+			raise ValueError("collector emitter voltage below saturation value\n" +
+							"Vce1 = " + str(Vce1))
+
+	return {'R1': R1, 'R2': R2, 'R3': R3, 'RE': RE, 'R_parallel': R_parallel, 'RE_given': RE_given}
+
+def standard_resistor_sets(useCascode, design, Vcc=3.3, Vbe=0.76, I_E=5e-3, RC=50, beta=330, series='E96', k=1):
+	# the best sets of purchasable resistors for a design from calculate_R_values
+	return StandardValues.snap_designs(useCascode=useCascode, R1=design['R1'], R2=design['R2'], RE=design['RE'],
+			R3=design['R3'], Vcc=Vcc, Vbe=Vbe, I_E=I_E, RC=RC, beta=beta, series=series, k=k)
+
+def print_R_values(useCascode, design, Vcc, Vbe, Vce1, Vce2, I_E, RC, maximize_input_impedance=False):
+	print('\n')
+	print('************************************************************\n')
+	print('The resistor values for the circuit were calculated to be:')
+	print('R1 = ' + str(round(design['R1'],2)) + ' Ohms')
+	print('R2 = ' + str(round(design['R2'],2)) + ' Ohms')
+
+	if useCascode:
+		print('R3 = ' + str(round(design['R3'],2)) + ' Ohms')
 
+	print('RE = ' + str(round(design['RE'],2)) + ' Ohms')
+	print('\nThe calculation was done given the following design parameters:')
+
+	if maximize_input_impedance:
+		print('R1||R2 = maximum value')
 	else:
-		Vce = args.Vce1
-		RE = (Vcc - I_E*RC - Vce1)/I_E
-		
-	RE_given = False
-
-# determine whether to maximize impedance or not
-if args.maximum_input_impedance:
-	R_parallel = RE
-else:
-	R_parallel = args.rParallel
-
-# find R values
-if args.useCascode:
-	(R1, R2, R3) = find_R_vals_cascode(I_E=I_E, RE=RE, Vbe=Vbe, Vcc=Vcc, Vce2=Vce2, R_parallel=R_parallel)
-else:
-	(R1, R2) = find_R_vals_common_emitter(I_E=I_E, RE=RE, Vbe=Vbe, Vcc=Vcc, R_parallel=R_parallel)
-
-# Check design parameters are valid
-# First check that condition to guarentee beta insensitivity is satisfied
-# Then checks all resistors are in their linear active region
-if args.useCascode:
-	if RE < (R2 * (2*R3 + R1)) / (R1 + R2 + R3):
-		raise ValueError("Invalid parameters cascode: design violates inequality " + 
-						"RE >= (R2 * (2*R3 + R1)) / (R1 + R2 + R3)\n" + 
-						"RE = " + str(RE) + "\nR1||R2 = " + str(R_parallel))
-	elif Vbe > I_E*RC + Vce1:
-		raise ValueError("Invalid parameters cascode: Q1 not in linear region " + 
-						"Vbe1 > I_E*RC + Vce1\n" + 
-						"Vbe = " + str(Vbe) + "\n" + 
-						"R_C * I_E + Vce1 = " + str(I_E*RC + Vce1))
-	elif Vce1 < 0.3 or Vce2 < 0.3:
-		raise ValueError("collector emitter voltage below saturation value\n" + 
-						"Vce1 = " + str(Vce1) + "\nVce2 = " + str(Vce2))
-else:
-	if R_parallel > RE:
-		raise ValueError("Invalid parameters common-emitter: design violates inequality R1||R2 <= RE\n" + 
-						"RE = " + str(RE) + "\nR1||R2 = " + str(R_parallel))
-	elif Vbe > I_E*RC + Vce1:
-		raise ValueError("Invalid parameters common-emitter: Q1 not in linear region " + 
-						"Vbe1 > I_E*RC + Vce1\n" + 
-						"Vbe = " + str(Vbe) + "\n" + 
-						"R_C * I_E + Vce1 = " + str(I_E*RC + Vce1))
-	elif Vce1 < 0.3:
-		raise ValueError("collector emitter voltage below saturation value\n" + 
-						"Vce1 = " + str(Vce1))
-
-# print all outputs
-print('\n')
-print('************************************************************\n')
-print('The resistor values for the circuit were calculated to be:')
-print('R1 = ' + str(round(R1,2)) + ' Ohms')
-print('R2 = ' + str(round(R2,2)) + ' Ohms')
-
-if args.useCascode:
-	print('R3 = ' + str(round(R3,2)) + ' Ohms')
-
-print('RE = ' + str(round(RE,2)) + ' Ohms')
-print('\nThe calculation was done given the following design parameters:')
-
-if args.maximum_input_impedance:
-	print('R1||R2 = maximum value')
-else:
-	print('R1||R2 = ' + str(round(R_parallel,2)) + ' Ohms')
-
-if RE_given:
-	print('R_E = ' + str(round(RE,2)) + ' Ohms')
-else: 
-	if args.useCascode:
-		print('R_C = ' + str(round(RC,2)) + ' Ohms')
-		print('V_ce1 = ' + str(round(Vce1,2)) + ' V')
-		print('V_ce2 = ' + str(round(Vce2,2)) + ' V')
+		print('R1||R2 = ' + str(round(design['R_parallel'],2)) + ' Ohms')
+
+	if design['RE_given']:
+		print('R_E = ' + str(round(design['RE'],2)) + ' Ohms')
 	else:
-		print('R_C = ' + str(round(RC,2)) + ' Ohms')
-		print('V_ce = ' + str(round(Vce1,2)) + ' V')
+		if useCascode:
+			print('R_C = ' + str(round(RC,2)) + ' Ohms')
+			print('V_ce1 = ' + str(round(Vce1,2)) + ' V')
+			print('V_ce2 = ' + str(round(Vce2,2)) + ' V')
+		else:
+			print('R_C = ' + str(round(RC,2)) + ' Ohms')
+			print('V_ce = ' + str(round(Vce1,2)) + ' V')
+
+	print('V_cc = ' + str(round(Vcc,2)) + ' V')
+	print('V_be = ' + str(round(Vbe,2)) + ' V')
+	print('I_E = ' + str(round(I_E*10**3,2)) + ' mA')
+	print('\n************************************************************\n')
+
+def print_standard_sets(useCascode, parts, series, beta):
+	print('Best ' + series + ' resistor sets (I_E re-evaluated with beta = ' + str(beta) + '):\n')
+	for i in range(parts['R1'].shape[1]):
+		resistors = ['R1 = ' + str(parts['R1'][0, i]), 'R2 = ' + str(parts['R2'][0, i])]
+		if useCascode:
+			resistors.append('R3 = ' + str(parts['R3'][0, i]))
+		resistors.append('RE = ' + str(parts['RE'][0, i]))
+
+		print(str(i + 1) + ') ' + ', '.join(resistors) + ' Ohms')
+		print('   I_E = ' + str(round(parts['I_E'][0, i]*1e3, 3)) + ' mA (' +
+				str(round(parts['I_E_error'][0, i]*100, 2)) + ' %), R1||R2 = ' +
+				str(round(parts['R_parallel'][0, i], 2)) + ' Ohms' +
+				('' if parts['feasible'][0, i] else ', INVALID DESIGN'))
+	print('\n************************************************************\n')
+
+def main(argv=None):
+	args = build_parser().parse_args(argv)
+
+	### CONSTANTS ###
+	I_E = args.emitterCurrent
+	Vcc = args.Vcc
+	RC = args.RC
+	Vce1 = args.Vce1
+	Vce2 = args.Vce2
+	Vbe = args.Vbe
+	RE = getattr(args, 'RE', None)
+
+	if args.grid is not None:
+		defaults = {'Vcc': Vcc, 'Vbe': Vbe, 'Vce1': Vce1, 'Vce2': Vce2, 'I_E': I_E,
+					'RC': RC, 'R_parallel': args.rParallel, 'RE': RE}
+		return solve_grid(args.grid, args.output, useCascode=args.useCascode, defaults=defaults,
+				maximize_input_impedance=args.maximum_input_impedance, series=args.series,
+				beta=args.beta, k=args.neighbours, store=args.store)
+
+	design = calculate_R_values(useCascode=args.useCascode, Vcc=Vcc, Vbe=Vbe, Vce1=Vce1, Vce2=Vce2, I_E=I_E,
+			RC=RC, R_parallel=args.rParallel, RE=RE, maximize_input_impedance=args.maximum_input_impedance)
+
+	if args.series is not None:
+		design['standard'] = standard_resistor_sets(args.useCascode, design, Vcc=Vcc, Vbe=Vbe, I_E=I_E, RC=RC,
+				beta=args.beta, series=args.series, k=args.neighbours)
+
+	if args.json:
+		print(json.dumps(CalculationUtils.to_json(design), allow_nan=False))
+		return design
+
+	# print all outputs
+	print_R_values(args.useCascode, design, Vcc, Vbe, Vce1, Vce2, I_E, RC,
+			maximize_input_impedance=args.maximum_input_impedance)
+
+	# print the best sets of purchasable resistors
+	if args.series is not None:
+		print_standard_sets(args.useCascode, design['standard'], args.series, args.beta)
+
+	return design
 
-print('V_cc = ' + str(round(Vcc,2)) + ' V')
-print('V_be = ' + str(round(Vbe,2)) + ' V')
-print('I_E = ' + str(round(I_E*10**3,2)) + ' mA')
-print('\n************************************************************\n')
+if __name__ == '__main__':
+	main()
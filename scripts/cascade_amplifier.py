@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+
+import numpy as np
+import argparse
+import sys
+import time
+import CalculationUtils
+import DesignOptimizer
+import SmallSignalModel
+import SpiceModelLibrary
+import TraceComparison
+import TwoPort
+
+parser = argparse.ArgumentParser(
+        description = "Calculates gain, input and output impedance of a chain of amplifier stages, including the " +
+        "loading of every stage by the next, e.g. the design in LTspice/DoubleCommonEmitter")
+
+parser.add_argument('-s', '--stages', nargs = '+', default = ['ce', 'ce'], choices = ['ce', 'cascode'],
+        help = "Stage types from input to output")
+parser.add_argument('-i', '--emitterCurrent', nargs = '+', default = [5e-3], type = float,
+        help = "Emitter current of every stage, or one value for all")
+parser.add_argument('--RC', nargs = '+', default = None, type = float,
+        help = "Collector resistor of every stage, or one value for all. Defaults to the DoubleCommonEmitter " +
+        "design for the default stages, 50 otherwise")
+parser.add_argument('-r', '--rParallel', nargs = '+', default = None, type = float,
+        help = "R1||R2 of every stage, or one value for all. Defaults to the DoubleCommonEmitter design for the " +
+        "default stages, 50 otherwise")
+parser.add_argument('-b', '--beta', nargs = '+', default = [330], type = float,
+        help = "Current amplification factor of every stage, or one value for all")
+parser.add_argument('--Cpi', nargs = '+', default = [0.595e-12], type = float,
+        help = "C_pi of every stage, or one value for all")
+parser.add_argument('--Cmu', nargs = '+', default = [0.147e-12], type = float,
+        help = "C_mu of every stage, or one value for all")
+parser.add_argument('-p', '--part', nargs = '+', default = None,
+        help = "Transistor(s) in the SPICE library to derive beta, C_pi, C_mu and g_m from. Overrides --beta, --Cpi and --Cmu")
+parser.add_argument('--lib', default = SpiceModelLibrary.DEFAULT_LIBRARY,
+        help = "SPICE model library used with --part")
+parser.add_argument('--couplingCap', default = 22e-9, type = float,
+        help = "Series coupling capacitor in front of every stage and at the output. 0 for none")
+parser.add_argument('--source', default = 0, type = float,
+        help = "Source impedance")
+parser.add_argument('--load', default = np.inf, type = float,
+        help = "Load impedance, open by default")
+parser.add_argument('-z', '--targetImpedance', default = 50, type = float,
+        help = "Impedance the input is matched to")
+parser.add_argument('-n', '--numPoints', default = 1000, type = int,
+        help = "Number of frequency points across the NMR band")
+parser.add_argument('--sweep', nargs = 5, action = 'append', default = [],
+        metavar = ('STAGE', 'NAME', 'START', 'STOP', 'N'),
+        help = "Sweep I_E, RC, R_parallel, beta, c_pi or c_mu of a stage (counting from 1). Every sweep adds an " +
+        "axis of candidates, all combinations are evaluated in one pass and the best are listed")
+parser.add_argument('--maxReflection', default = 0.3, type = float,
+        help = "Largest input reflection over the band a swept candidate may have")
+parser.add_argument('--top', default = 10, type = int,
+        help = "Number of swept candidates to list")
+parser.add_argument('-c', '--compare', default = None,
+        help = "LTspice export of V(vout)/V(vin) to compare the gain with")
+parser.add_argument('-t', '--trace', default = 'V(vout2)/V(vin)',
+        help = "Trace of --compare to use")
+parser.add_argument('--noPlot', '--no-plot', action = 'store_true',
+        help = "Only print the results")
+args = parser.parse_args()
+
+SWEEPABLE = ['I_E', 'RC', 'R_parallel', 'beta', 'c_pi', 'c_mu']
+
+# the parameters --part derives from the model card
+PART_PARAMETERS = ['beta', 'c_pi', 'c_mu']
+
+# RC and R1||R2 of the two stages of LTspice/DoubleCommonEmitter, the
+# default chain, and of a single stage as in the other scripts
+DOUBLE_CE = {'RC': [266, 57], 'rParallel': [59.7, 408.9]}
+SINGLE_STAGE = {'RC': [50], 'rParallel': [50]}
+
+for name in ('RC', 'rParallel'):
+    if getattr(args, name) is None:
+        setattr(args, name, (DOUBLE_CE if args.stages == parser.get_default('stages') else SINGLE_STAGE)[name])
+
+def per_stage(values, name):
+    if len(values) not in (1, len(args.stages)):
+        raise ValueError("--" + name + " needs 1 or " + str(len(args.stages)) + " values, got " + str(len(values)))
+    return values * len(args.stages) if len(values) == 1 else values
+
+### Stages ###
+n_stages = len(args.stages)
+stages = [{'I_E': I_E, 'RC': RC, 'R_parallel': R_parallel, 'beta': beta, 'c_pi': c_pi, 'c_mu': c_mu}
+          for (I_E, RC, R_parallel, beta, c_pi, c_mu) in zip(per_stage(args.emitterCurrent, 'emitterCurrent'),
+          per_stage(args.RC, 'RC'), per_stage(args.rParallel, 'rParallel'), per_stage(args.beta, 'beta'),
+          per_stage(args.Cpi, 'Cpi'), per_stage(args.Cmu, 'Cmu'))]
+
+# every sweep is an axis of the candidate grid, frequency comes last
+axes = []
+for (k, (stage, name, low, high, n)) in enumerate(args.sweep):
+    if name not in SWEEPABLE or not 1 <= int(stage) <= n_stages:
+        raise ValueError("Can't sweep " + name + " of stage " + stage + ". Sweepable: " + ", ".join(SWEEPABLE))
+    if args.part is not None and name in PART_PARAMETERS:
+        raise ValueError("Can't sweep " + name + " of stage " + stage + " with --part, which sets " +
+                         ", ".join(PART_PARAMETERS) + " from the model card")
+    values = np.linspace(float(low), float(high), int(n))
+    axes.append((int(stage), name, values))
+    stages[int(stage) - 1][name] = values.reshape([-1 if i == k else 1 for i in range(len(args.sweep))])
+
+parts = per_stage(args.part, 'part') if args.part is not None else [None] * n_stages
+library = SpiceModelLibrary.ModelLibrary(args.lib) if args.part is not None else None
+
+f = SmallSignalModel.nmr_band(args.numPoints)
+start = time.perf_counter()
+
+chain = []
+coupling = TwoPort.series(1 / (2j*np.pi*f*args.couplingCap)) if args.couplingCap > 0 else None
+for (kind, stage, part) in zip(args.stages, stages, parts):
+    v_t = SmallSignalModel.V_T
+    if part is not None:
+        # bias dependent parameters of the part, broadcast like I_E
+        op = library.operating_point(stage['I_E'], parts=[part])
+        (stage['beta'], stage['c_pi'], stage['c_mu']) = (op['beta'][0], op['c_pi'][0], op['c_mu'][0])
+        v_t = stage['I_E'] / op['g_m'][0]
+
+    model = SmallSignalModel.HybridPiModel(useCascode=(kind == 'cascode'), v_t=v_t, **stage)
+    if coupling is not None:
+        chain.append(coupling)
+    chain.append(model.two_port(f))
+if coupling is not None:
+    chain.append(coupling)
+
+abcd = TwoPort.cascade(*chain)
+gain = TwoPort.voltage_gain(abcd, z_load=args.load, z_source=args.source)
+z_in = TwoPort.input_impedance(abcd, z_load=args.load)
+z_out = TwoPort.output_impedance(abcd, z_source=args.source)
+elapsed = time.perf_counter() - start
+
+gain_db = 20*np.log10(CalculationUtils.magnitude(gain))
+reflection = np.abs(DesignOptimizer.reflection_coefficient(z_in, args.targetImpedance))
+
+print('\n')
+print('************************************************************\n')
+print('Evaluated ' + str(int(np.prod(gain.shape[:-1]))) + ' design(s) of ' + ' -> '.join(args.stages) + ' over ' +
+      str(len(f)) + ' frequencies in ' + str(round(elapsed*1e3, 1)) + ' ms\n')
+
+if axes:
+    # rank the candidates by their lowest gain in the band among those matched well enough
+    min_gain = gain_db.min(axis=-1).ravel()
+    max_reflection = reflection.max(axis=-1).ravel()
+    matched = np.flatnonzero(max_reflection <= args.maxReflection)
+    best = matched[np.argsort(-min_gain[matched], kind='stable')][:args.top]
+
+    print(str(len(matched)) + ' of ' + str(len(min_gain)) + ' candidates have |gamma| <= ' +
+          str(args.maxReflection) + ' over the band\n')
+    for (rank, index) in enumerate(best):
+        position = np.unravel_index(index, gain.shape[:-1])
+        values = ['stage ' + str(stage) + ' ' + name + ' = ' + str(round(values[position[k]], 6))
+                  for (k, (stage, name, values)) in enumerate(axes)]
+        print(str(rank + 1) + ') ' + ', '.join(values))
+        print('   gain >= ' + str(round(min_gain[index], 2)) + ' dB, max |gamma| = ' +
+              str(round(max_reflection[index], 3)))
+    print('\n************************************************************\n')
+    sys.exit(0)
+
+for k in [0, len(f)//2, -1]:
+    print('f = ' + str(round(f[k]/1e6, 1)) + ' MHz: gain = ' + str(round(gain_db[k], 2)) + ' dB, Z_in = ' +
+          str(np.round(z_in[k], 2)) + ' Ohms, Z_out = ' + str(np.round(z_out[k], 2)) + ' Ohms')
+print('\nMax input reflection against ' + str(args.targetImpedance) + ' Ohms: ' + str(round(reflection.max(), 3)))
+
+if args.compare is not None:
+    simulation = TraceComparison.load_simulation(args.compare, args.trace)
+    if simulation is None:
+        raise ValueError("No AC trace " + args.trace + " in " + args.compare)
+    (_, _, errors) = TraceComparison.compare({'simulation': simulation}, {'model': (f, gain)})
+    print('\nAgainst ' + args.compare + ':')
+    for (band, error) in errors.items():
+        print('  ' + band + ': max ' + str(round(float(error['max_db'][0, 0]), 2)) + ' dB, ' +
+              str(round(float(error['max_deg'][0, 0]), 1)) + ' deg')
+print('\n************************************************************\n')
+
+if args.noPlot:
+    sys.exit(0)
+
+import matplotlib.pyplot as plt
+
+plt.figure()
+plt.plot(f*1e-6, gain_db)
+plt.xlabel("Frequency (MHz)")
+plt.ylabel("Gain Magnitude (dB)")
+plt.title(str(n_stages) + " Stage Gain")
+
+plt.figure()
+plt.plot(f*1e-6, CalculationUtils.magnitude(z_in), label = r'$|Z_{in}|$')
+plt.plot(f*1e-6, CalculationUtils.magnitude(z_out), label = r'$|Z_{out}|$')
+plt.xlabel("Frequency (MHz)")
+plt.ylabel("Impedance (" + r'$\Omega$' + ")")
+plt.title(str(n_stages) + " Stage Input and Output Impedance")
+plt.legend()
+
+plt.show()
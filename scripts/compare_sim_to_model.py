@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+import numpy as np
+import argparse
+import os
+import SmallSignalModel
+import SpiceModelLibrary
+import TraceComparison
+
+parser = argparse.ArgumentParser(
+        description = "Compares LTspice simulation outputs with a batch of hybrid-pi model gains " +
+        "and reports the magnitude and phase errors per band")
+
+parser.add_argument('paths', nargs = '*', default = ['../LTspice'],
+        help = "Simulation outputs (.raw or .txt exports) or directories to search for them")
+parser.add_argument('-t', '--trace', default = 'V(vout)/V(vin)',
+        help = "Gain trace of the simulations. Files with a single trace use that one instead")
+parser.add_argument('-i', '--emitterCurrents', default = [5e-3], type = float, nargs = '+',
+        help = "Emitter currents to evaluate the model at")
+parser.add_argument('-b', '--beta', default = 330, type = float,
+        help = "Current amplification factor of the transistor")
+parser.add_argument('--Cpi', default = 0.595e-12, type = float,
+        help = "C_pi of the chosen transistor in the Hybrid Pi Model")
+parser.add_argument('--Cmu', default = 0.147e-12, type = float,
+        help = "C_mu of the chosen transistor in the Hybrid Pi Model")
+parser.add_argument('-p', '--part', default = None,
+        help = "Transistor in the SPICE library to derive beta, C_pi, C_mu and g_m from. Overrides --beta, --Cpi and --Cmu")
+parser.add_argument('--RC', default = 50, type = float,
+        help = "Collector resistor value")
+parser.add_argument('-n', '--numPoints', default = 1000, type = int,
+        help = "Number of frequency points of the model")
+parser.add_argument('--noInvert', action = 'store_true',
+        help = "Compare with the model gain as is. By default its sign is flipped, since the model leaves out " +
+        "the inversion of the amplifier")
+parser.add_argument('-o', '--output', default = None,
+        help = "Also write every error to this csv file")
+args = parser.parse_args()
+
+### Model evaluations, all currents of one amplifier type in one call ###
+f = SmallSignalModel.nmr_band(args.numPoints)
+I_E = np.array(args.emitterCurrents)
+if args.part is not None:
+    op = SpiceModelLibrary.ModelLibrary().operating_point(I_E, parts=[args.part])
+    (beta, c_pi, c_mu, v_t) = (op['beta'][0], op['c_pi'][0], op['c_mu'][0], I_E/op['g_m'][0])
+else:
+    (beta, c_pi, c_mu, v_t) = (args.beta, args.Cpi, args.Cmu, SmallSignalModel.V_T)
+
+models = {}
+for useCascode in (False, True):
+    model = SmallSignalModel.HybridPiModel(useCascode=useCascode, I_E=I_E, beta=beta, c_pi=c_pi, c_mu=c_mu,
+            RC=args.RC, v_t=v_t)
+    gains = model.gain(f) * (1 if args.noInvert else -1)
+    for (current, gain) in zip(I_E, gains):
+        models[model.amp_type + ' ' + str(round(current*1e3, 3)) + ' mA'] = (f, gain)
+
+### Simulations ###
+simulations = {}
+for path in TraceComparison.find_simulations(args.paths):
+    simulation = TraceComparison.load_simulation(path, args.trace)
+    if simulation is not None:
+        simulations[os.path.relpath(path)] = simulation
+
+if not simulations:
+    raise ValueError("No AC simulation outputs with a gain trace found in " + ", ".join(args.paths))
+
+(sim_names, model_names, errors) = TraceComparison.compare(simulations, models)
+full = errors['full band']
+
+print('\n')
+print('************************************************************\n')
+print('Compared ' + str(len(sim_names)) + ' simulations with ' + str(len(model_names)) + ' model evaluations\n')
+for (i, sim_name) in enumerate(sim_names):
+    # models ranked by their RMS magnitude error over the whole band
+    print(sim_name)
+    print('{:<28}{:>10}{:>10}{:>10}{:>10}'.format('  model', 'max dB', 'rms dB', 'max deg', 'rms deg'))
+    for j in np.argsort(full['rms_db'][i], kind='stable'):
+        print('{:<28}{:>10.3f}{:>10.3f}{:>10.2f}{:>10.2f}'.format('  ' + model_names[j], full['max_db'][i, j],
+                full['rms_db'][i, j], full['max_deg'][i, j], full['rms_deg'][i, j]))
+    print('')
+print('************************************************************\n')
+
+if args.output is not None:
+    with open(args.output, 'w') as output_file:
+        output_file.write('simulation,model,band,max_db,rms_db,max_deg,rms_deg\n')
+        for (band, band_errors) in errors.items():
+            for (i, sim_name) in enumerate(sim_names):
+                for (j, model_name) in enumerate(model_names):
+                    output_file.write(','.join([sim_name, model_name, band] +
+                            ['%.6g' % band_errors[name][i, j] for name in ('max_db', 'rms_db', 'max_deg', 'rms_deg')]) + '\n')
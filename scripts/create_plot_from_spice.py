@@ -1,32 +1,58 @@
 #!/usr/bin/env python
 
 import numpy as np
-import csv
+import argparse
 import matplotlib.pyplot as plt
+import CalculationUtils
+import SpiceReader
 
-f = open('bodePlot.csv')
-csv_f = csv.reader(f)
-f = []
-g = []
-phi = []
-for row in csv_f:
+parser = argparse.ArgumentParser(
+        description = "Plots the gain of an amplifier simulated in LTspice")
+
+parser.add_argument('file', nargs = '?', default = 'bodePlot.csv',
+        help = "Simulation output to plot. Either an LTspice .raw file, an LTspice text export (.txt) " +
+        "or a csv of frequency, gain (dB) and phase (degrees) columns")
+parser.add_argument('-t', '--trace', default = 'V(vout)/V(vin)',
+        help = "Name of the gain trace. Ignored for csv files")
+parser.add_argument('-s', '--steps', default = None, type = int, nargs = '+',
+        help = "Runs of a stepped .raw file to plot (starting at 0). All runs are plotted if not provided")
+args = parser.parse_args()
+
+def bode(f, gain):
+    g = 20*np.log10(CalculationUtils.magnitude(gain))
+    deg = np.rad2deg(CalculationUtils.phase(gain))
+    return (f/1e6, g, deg)
+
+# list of (label, frequency, gain, phase) to plot
+curves = []
+if args.file.lower().endswith('.csv'):
     try:
-        f.append(float(row[0])/1e6)
-        g.append(float(row[1]))
-        deg = float(row[2])
-        if deg < 0 :
-            phi.append(deg)
-        else:
-            phi.append(deg-360)
-    except:
+        data = np.loadtxt(args.file, delimiter = ',', usecols = (0, 1, 2), ndmin = 2)
+    except ValueError:
         raise ValueError("CSV file not formatted correctly RIP")
 
+    curves.append((None, data[:, 0]/1e6, data[:, 1], data[:, 2]))
+else:
+    traces = SpiceReader.load_traces(args.file)
+
+    if isinstance(traces, SpiceReader.SteppedRawFile):
+        for step in traces.steps(args.steps):
+            label = ', '.join(name + '=' + str(value) for (name, value) in step.parameters.items())
+            curves.append((label or 'run ' + str(step.number),) + bode(step.axis, step[args.trace]))
+    else:
+        curves.append((None,) + bode(traces.axis, traces[args.trace]))
+
+# colour by axis for a single curve, by run when several runs are overlaid
+# (phase is then drawn dashed)
+overlay = len(curves) > 1
+
 fig, ax1 = plt.subplots(figsize=(8,5))
 
 color = 'tab:red'
 ax1.set_xlabel('Frequency (MHz)')
 ax1.set_ylabel('Gain Magnitude (dB)', color=color)
-ax1.semilogx(f, g, color = color)
+for (label, f, g, deg) in curves:
+    ax1.semilogx(f, g, color = None if overlay else color, label = label)
 ax1.tick_params(axis='y', labelcolor = color)
 ax1.title.set_text("Simulated Amplifier Open Circuit Gain")
 
@@ -34,9 +60,14 @@ ax2 = ax1.twinx()  # instantiate a second axes that shares the same x-axis
 
 color = 'tab:blue'
 ax2.set_ylabel('Gain Phase (degrees)', color=color)  # we already handled the x-label with ax1
-ax2.semilogx(f, phi, color=color)
+for (label, f, g, deg) in curves:
+    phi = np.where(deg < 0, deg, deg - 360)
+    ax2.semilogx(f, phi, color = None if overlay else color, linestyle = '--' if overlay else '-')
 ax2.tick_params(axis='y', labelcolor=color)
 
+if overlay:
+    ax1.legend(loc='lower left')
+
 fig.tight_layout()  # otherwise the right y-label is slightly clipped
 
 # plt.savefig('LTspice_CE_sim.png', dpi=600)
@@ -1,72 +1,118 @@
 #!/usr/bin/env python
 
-import numpy as np
 import argparse
+import json
 import CalculationUtils
+import SmallSignalModel
+import DesignOptimizer
 
-parser = argparse.ArgumentParser(
-        description = "Provides a first estimate to for R1||R2 needed to achieve a certain input impedance")
-
-parser.add_argument('-d', '--useCascode', action = 'store_true',
-        help = "Flag to indicate which amplifier to use: Cascode if called, Common-Emitter otherwise")
-parser.add_argument('-v', '--Vcc', default = 3.3, type = float,
-        help = "The power supply voltage of the circuit.")
-parser.add_argument('-i', '--emitterCurrent',  default = 5e-3, type = float,
-        help = "Target current flow in the emitter branch.")
-parser.add_argument('-b', '--beta', default = 330, type = float,
-        help = "Current amplification factor of the transistor")
-parser.add_argument('--Cpi', default = 0.595e-12, type = float,
-        help = "C_pi of the chosen transistor in the Hybrid Pi Model")
-parser.add_argument('--Cmu', default = 0.147e-12, type = float,
-        help = "C_mu of the chosen transistor in the Hybrid Pi Model")
-parser.add_argument('--RC', default = 50, type = float,
-        help = "Collector resistor value")
-parser.add_argument('-z', '--targetImpedanceMagnitude', default = 50, type = float,
-        help = "The magnitude of the desired input impedance")
-args = parser.parse_args()
-
-# Design Parameters
-v_t = 27e-3
-z_target = args.targetImpedanceMagnitude
-V_CC = args.Vcc
-I_E = args.emitterCurrent
-c_pi = args.Cpi
-c_mu = args.Cmu
-f = (500e6+125e6)/2
-omega = 2*np.pi*f
-beta = args.beta
-RC = args.RC
-r_e = v_t / I_E
-r_pi = beta * r_e
-z_pi = -1j/(omega*c_pi)
-z_mu = -1j/(omega*c_mu)
-
-# Calculate gain for Miller Capacitance depending on amplifier type
-if args.useCascode:
-	miller_gain = CalculationUtils.parallel(r_e, z_mu, z_pi) / CalculationUtils.parallel(r_e, z_mu)
-	amp_type = "Cascode"
-else:
-	miller_gain = RC * I_E/v_t
-	amp_type = "Common-Emitter"
-
-# Calculate Miller impedance 
-c_miller = c_mu * (1 + miller_gain)
-z_miller = -1j/(omega*c_miller)
-
-# Calculate contributions from divider network and bjt
-z_bjt = CalculationUtils.parallel(z_pi, r_pi)
-
-z_ext = CalculationUtils.parallel(z_target, -z_bjt, -z_miller)
-
-R_parallel = CalculationUtils.magnitude(z_ext)
-
-print('\n')
-print('************************************************************\n')
-print("Calculating for amplifier type: " + str(amp_type))
-print('The following is a first guess to achieve Z_in = ' + str(z_target) + ':\n')
-print('R1||R2 = ' + str(R_parallel) + ' Ohms')
-print('\n************************************************************')
-print('\n')
-print('NOTE: This was a calculation for f = 312.5MHz')
-print('NOTE: The calculation yielded Z_ext = ' + str(round(z_ext.real, 2) + round(z_ext.imag, 2) * 1j))
-print()
\ No newline at end of file
+def build_parser():
+    parser = argparse.ArgumentParser(
+            description = "Provides a first estimate to for R1||R2 needed to achieve a certain input impedance")
+
+    parser.add_argument('-d', '--useCascode', action = 'store_true',
+            help = "Flag to indicate which amplifier to use: Cascode if called, Common-Emitter otherwise")
+    parser.add_argument('-v', '--Vcc', default = 3.3, type = float,
+            help = "The power supply voltage of the circuit.")
+    parser.add_argument('-i', '--emitterCurrent',  default = 5e-3, type = float,
+            help = "Target current flow in the emitter branch.")
+    parser.add_argument('-b', '--beta', default = 330, type = float,
+            help = "Current amplification factor of the transistor")
+    parser.add_argument('--Cpi', default = 0.595e-12, type = float,
+            help = "C_pi of the chosen transistor in the Hybrid Pi Model")
+    parser.add_argument('--Cmu', default = 0.147e-12, type = float,
+            help = "C_mu of the chosen transistor in the Hybrid Pi Model")
+    parser.add_argument('--RC', default = 50, type = float,
+            help = "Collector resistor value")
+    parser.add_argument('-z', '--targetImpedanceMagnitude', default = 50, type = float,
+            help = "The magnitude of the desired input impedance")
+    parser.add_argument('-o', '--optimize', action = 'store_true',
+            help = "Also search R1||R2, RC and I_E for the best input match over the whole band")
+    parser.add_argument('--fixCurrent', action = 'store_true',
+            help = "Hold I_E at the emitterCurrent value while optimizing")
+    parser.add_argument('--fixRC', action = 'store_true',
+            help = "Hold RC at the RC value while optimizing")
+    parser.add_argument('-g', '--minGain', default = 20, type = float,
+            help = "Lowest gain (dB) over the band an optimized design may have")
+    parser.add_argument('--json', action = 'store_true',
+            help = "Print the results as json instead of text")
+    return parser
+
+def estimate_R_parallel(useCascode=False, I_E=5e-3, beta=330, c_pi=0.595e-12, c_mu=0.147e-12, RC=50, z_target=50):
+    # First guess of R1||R2 from the external impedance needed at the centre
+    # of the band
+    f = (SmallSignalModel.F_MAX + SmallSignalModel.F_MIN)/2
+
+    model = SmallSignalModel.HybridPiModel(useCascode=useCascode, I_E=I_E,
+            beta=beta, c_pi=c_pi, c_mu=c_mu, RC=RC)
+
+    # Calculate contributions from divider network and bjt
+    z_ext = model.external_impedance(f, z_target)
+
+    return {'amp_type': model.amp_type, 'f': f, 'z_ext': z_ext, 'R_parallel': CalculationUtils.magnitude(z_ext)}
+
+def print_estimate(result, z_target):
+    z_ext = result['z_ext']
+
+    print('\n')
+    print('************************************************************\n')
+    print("Calculating for amplifier type: " + str(result['amp_type']))
+    print('The following is a first guess to achieve Z_in = ' + str(z_target) + ':\n')
+    print('R1||R2 = ' + str(result['R_parallel']) + ' Ohms')
+    print('\n************************************************************')
+    print('\n')
+    print('NOTE: This was a calculation for f = 312.5MHz')
+    print('NOTE: The calculation yielded Z_ext = ' + str(round(z_ext.real, 2) + round(z_ext.imag, 2) * 1j))
+    print()
+
+def print_optimized(result):
+    design = result['design']
+
+    print('************************************************************\n')
+    print('Optimized input match over ' + str(SmallSignalModel.F_MIN/1e6) + ' - ' +
+            str(SmallSignalModel.F_MAX/1e6) + ' MHz:\n')
+    print('R1||R2 = ' + str(round(design['R_parallel'], 2)) + ' Ohms')
+    print('R_C = ' + str(round(design['RC'], 2)) + ' Ohms')
+    print('I_E = ' + str(round(design['I_E']*1e3, 3)) + ' mA')
+    print('\nMean |gamma|^2 = ' + str(round(result['match_cost'], 6)))
+    print('Max |gamma| = ' + str(round(result['max_reflection'], 4)))
+    print('Min gain = ' + str(round(result['min_gain_db'], 2)) + ' dB')
+    print('Gain penalty = ' + str(round(result['gain_penalty'], 6)))
+    print('\n' + ('Converged in ' if result['converged'] else 'NOT converged, stopped after ') +
+            str(result['iterations']) + ' iterations, ' + str(result['evaluations']) +
+            ' impedance evaluations, ' + str(round(result['elapsed']*1e3, 1)) + ' ms')
+    if result['at_bounds']:
+        print('NOTE: ' + ', '.join(result['at_bounds']) + ' ended on the edge of the search range')
+    print('\n************************************************************')
+    print()
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    # Design Parameters
+    z_target = args.targetImpedanceMagnitude
+
+    result = estimate_R_parallel(useCascode=args.useCascode, I_E=args.emitterCurrent, beta=args.beta,
+            c_pi=args.Cpi, c_mu=args.Cmu, RC=args.RC, z_target=z_target)
+    if not args.json:
+        print_estimate(result, z_target)
+
+    if args.optimize:
+        fixed = {}
+        if args.fixCurrent:
+            fixed['I_E'] = args.emitterCurrent
+        if args.fixRC:
+            fixed['RC'] = args.RC
+
+        result['optimized'] = DesignOptimizer.optimize_input_match(useCascode=args.useCascode, z_target=z_target,
+                beta=args.beta, c_pi=args.Cpi, c_mu=args.Cmu, RC=args.RC, fixed=fixed, min_gain_db=args.minGain)
+        if not args.json:
+            print_optimized(result['optimized'])
+
+    if args.json:
+        print(json.dumps(CalculationUtils.to_json(result), allow_nan=False))
+
+    return result
+
+if __name__ == '__main__':
+    main()
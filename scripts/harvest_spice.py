@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+import numpy as np
+import argparse
+import os
+import time
+import SpiceLogHarvester
+
+parser = argparse.ArgumentParser(
+        description = "Harvests the operating points of the LTspice runs (.log and .raw) below a directory into " +
+        "an indexed table and looks up bias points in it, e.g. to check the currents calculate_R_values.py predicts")
+
+parser.add_argument('root', nargs = '?',
+        default = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'LTspice'),
+        help = "Directory searched for .log and .raw files")
+parser.add_argument('-x', '--index', default = None,
+        help = "File the table is kept in. Defaults to .spice_harvest.npz in the root")
+parser.add_argument('-j', '--workers', default = os.cpu_count(), type = int,
+        help = "Number of processes parsing changed files")
+parser.add_argument('--force', action = 'store_true',
+        help = "Parse every file again, even if it didn't change")
+parser.add_argument('--noScan', action = 'store_true',
+        help = "Only query the table as it was last harvested")
+parser.add_argument('-c', '--circuit', default = None,
+        help = "Only rows of this circuit, e.g. Cascode/cascode")
+parser.add_argument('-n', '--name', default = None,
+        help = "Only rows of this device or node, e.g. q:u1:1 or vout")
+parser.add_argument('-q', '--quantity', default = None,
+        help = "Only rows of this quantity, e.g. Ic, Vbe, V, totiter")
+parser.add_argument('-k', '--kind', default = None, choices = ['run', 'device', 'node', 'current'],
+        help = "Only rows of this kind")
+parser.add_argument('-e', '--expect', default = None, type = float,
+        help = "Value the selected rows are expected to have, e.g. the emitter current from calculate_R_values.py. " +
+        "Prints the error of every row against it")
+parser.add_argument('-l', '--limit', default = 50, type = int,
+        help = "Largest number of rows printed")
+args = parser.parse_args()
+
+index = SpiceLogHarvester.HarvestIndex(args.root, args.index)
+
+print('\n')
+print('************************************************************\n')
+if not args.noScan:
+    start = time.perf_counter()
+    summary = index.scan(workers=args.workers, force=args.force)
+    print('Scanned ' + args.root + ' in ' + str(round((time.perf_counter() - start)*1e3, 1)) + ' ms: ' +
+          str(summary['parsed']) + ' parsed, ' + str(summary['unchanged']) + ' unchanged, ' +
+          str(summary['rehashed']) + ' touched but identical, ' + str(summary['removed']) + ' removed')
+    for (path, error) in summary['failed']:
+        print('FAILED ' + path + ': ' + error)
+print(str(len(index)) + ' rows from ' + str(len(index.circuits())) + ' circuits\n')
+
+if any(value is not None for value in (args.circuit, args.name, args.quantity, args.kind)):
+    start = time.perf_counter()
+    rows = index.select(circuit=args.circuit, name=args.name, quantity=args.quantity, kind=args.kind)
+    elapsed = time.perf_counter() - start
+
+    for k in range(min(len(rows['value']), args.limit)):
+        line = (rows['circuit'][k] + '  ' + rows['name'][k] + '  ' + rows['quantity'][k] +
+                ('[' + str(rows['step'][k]) + ']' if rows['step'][k] else '') + ' = ' + '%.6g' % rows['value'][k])
+        if args.expect is not None:
+            line += '  (' + '%+.2f' % ((rows['value'][k] - args.expect) / args.expect * 100) + ' %)'
+        print(line)
+    if len(rows['value']) > args.limit:
+        print('... ' + str(len(rows['value']) - args.limit) + ' more')
+
+    print('\n' + str(len(rows['value'])) + ' rows in ' + str(round(elapsed*1e3, 3)) + ' ms')
+    if args.expect is not None and len(rows['value']):
+        error = (rows['value'] - args.expect) / args.expect * 100
+        print('Error against ' + str(args.expect) + ': ' + str(round(np.min(error), 2)) + ' to ' +
+              str(round(np.max(error), 2)) + ' %')
+print('\n************************************************************\n')
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import time
+import MonteCarlo
+
+parser = argparse.ArgumentParser(
+        description = "Estimates the fraction of boards whose emitter current lands in a target window " +
+        "given component tolerances, supply ripple and BJT spread")
+
+parser.add_argument('-d', '--useCascode', action = 'store_true',
+        help = "Flag to indicate which amplifier to use: Cascode if called, Common-Emitter otherwise")
+parser.add_argument('-v', '--Vcc', default = 3.3, type = float,
+        help = "The nominal power supply voltage of the circuit.")
+parser.add_argument('-i', '--i_target',  default = 5e-3, type = float,
+        help = "Target current flow in the emitter branch.")
+parser.add_argument('-w', '--window', default = 10, type = float,
+        help = "Allowed deviation of the emitter current from the target, in percent")
+parser.add_argument('--R1', default = 60.4, type = float,
+        help = "Top resistor in the divider network for common-emitter, middle resistor for cascode")
+parser.add_argument('--R2', default = 357, type = float,
+        help = "Bottom resistor in the divider at the input")
+parser.add_argument('--R3', default = 13, type = float,
+        help = "Top resistor in the divider at the input of a cascode")
+parser.add_argument('--RE', default = 412, type = float,
+        help = "Emitter resistor value")
+parser.add_argument('-t', '--tolerance', default = 0.01, type = float,
+        help = "Relative tolerance of every resistor, e.g. 0.01 or 0.05")
+parser.add_argument('--normalTolerance', action = 'store_true',
+        help = "Treat the resistor tolerance as a 3 sigma bound of a normal distribution instead of uniform")
+parser.add_argument('--ripple', default = 0.05, type = float,
+        help = "Peak supply ripple in volts. Vcc is drawn uniformly within +- ripple")
+parser.add_argument('--Vbe', default = 0.76, type = float,
+        help = "Mean base emitter voltage of the BJT")
+parser.add_argument('--VbeSigma', default = 0.02, type = float,
+        help = "Standard deviation of the base emitter voltage")
+parser.add_argument('--betaMin', default = 100, type = float,
+        help = "Lowest current amplification factor. beta is drawn uniformly between betaMin and betaMax")
+parser.add_argument('--betaMax', default = 500, type = float,
+        help = "Highest current amplification factor")
+parser.add_argument('-N', '--samples', default = 10**6, type = int,
+        help = "Number of boards to simulate")
+parser.add_argument('--chunkSize', default = 2**18, type = int,
+        help = "Number of boards drawn at once")
+parser.add_argument('-s', '--seed', default = 0, type = int,
+        help = "Master seed. The same seed gives the same result for any number of workers")
+parser.add_argument('-j', '--workers', default = os.cpu_count(), type = int,
+        help = "Number of worker processes")
+args = parser.parse_args()
+if args.samples < 1 or args.chunkSize < 1:
+    parser.error("--samples and --chunkSize must be at least 1")
+
+### Design Parameters ###
+I_E = args.i_target
+I_min = I_E * (1 - args.window/100)
+I_max = I_E * (1 + args.window/100)
+
+nominal = {'Vbe': args.Vbe, 'beta': (args.betaMin + args.betaMax)/2, 'Vcc': args.Vcc,
+           'R1': args.R1, 'R2': args.R2, 'R3': args.R3 if args.useCascode else None, 'RE': args.RE}
+
+resistor_distribution = ('normal_tolerance' if args.normalTolerance else 'uniform_tolerance', args.tolerance)
+distributions = {'R1': resistor_distribution, 'R2': resistor_distribution, 'R3': resistor_distribution,
+                 'RE': resistor_distribution,
+                 'Vcc': ('uniform_offset', args.ripple),
+                 'Vbe': ('normal', args.VbeSigma),
+                 'beta': ('uniform', args.betaMin, args.betaMax)}
+
+# worker processes re-import this file on platforms without fork
+if __name__ == '__main__':
+    start = time.perf_counter()
+    result = MonteCarlo.run_monte_carlo(useCascode=args.useCascode, nominal=nominal, distributions=distributions,
+            I_min=I_min, I_max=I_max, n_samples=args.samples, chunk_size=args.chunkSize, seed=args.seed,
+            workers=args.workers)
+    elapsed = time.perf_counter() - start
+
+    quantiles = [0.001, 0.01, 0.5, 0.99, 0.999]
+
+    print('\n')
+    print('************************************************************\n')
+    print("Calculating for amplifier type: " + ("Cascode" if args.useCascode else "Common-Emitter"))
+    print('Simulated ' + str(result.n) + ' boards in ' + str(round(elapsed, 2)) + ' s')
+    print('Yield = ' + str(round(result.yield_fraction*100, 3)) + ' % of boards with ' +
+          str(round(I_min*1e3, 3)) + ' mA <= I_E <= ' + str(round(I_max*1e3, 3)) + ' mA\n')
+    print('I_E mean = ' + str(round(result.mean*1e3, 4)) + ' mA')
+    print('I_E std = ' + str(round(result.std*1e3, 4)) + ' mA')
+    for (q, value) in zip(quantiles, result.quantile(quantiles)):
+        print('I_E ' + str(q*100) + ' % quantile = ' + str(round(value*1e3, 4)) + ' mA')
+    print('\n************************************************************\n')
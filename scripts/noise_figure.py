@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+import numpy as np
+import argparse
+import sys
+import CalculationUtils
+import NoiseModel
+import SmallSignalModel
+import SpiceModelLibrary
+
+parser = argparse.ArgumentParser(
+        description = "Calculates the noise figure of a single stage amplifier design over the NMR band and " +
+        "how much every noise source contributes to it")
+
+parser.add_argument('-d', '--useCascode', action = 'store_true',
+        help = "Flag to indicate which amplifier to use: Cascode if called, Common-Emitter otherwise")
+parser.add_argument('-i', '--emitterCurrent',  default = 5e-3, type = float,
+        help = "Target current flow in the emitter branch.")
+parser.add_argument('-b', '--beta', default = 330, type = float,
+        help = "Current amplification factor of the transistor")
+parser.add_argument('--Cpi', default = 0.595e-12, type = float,
+        help = "C_pi of the chosen transistor in the Hybrid Pi Model")
+parser.add_argument('--Cmu', default = 0.147e-12, type = float,
+        help = "C_mu of the chosen transistor in the Hybrid Pi Model")
+parser.add_argument('--rb', default = 5.5, type = float,
+        help = "Base resistance of the transistor")
+parser.add_argument('--RC', default = 50, type = float,
+        help = "Collector resistor value")
+parser.add_argument('-r', '--rParallel', default = 50, type = float,
+        help = "R1||R2 of the bias network")
+parser.add_argument('-p', '--part', default = None,
+        help = "Transistor in the SPICE library to derive beta, C_pi, C_mu, g_m and r_b from at the emitter " +
+        "current. Overrides --beta, --Cpi, --Cmu and --rb")
+parser.add_argument('--lib', default = SpiceModelLibrary.DEFAULT_LIBRARY,
+        help = "SPICE model library used with --part")
+parser.add_argument('-z', '--sourceImpedance', default = 50, type = float,
+        help = "Impedance of the source (the NMR coil match) driving the amplifier")
+parser.add_argument('-n', '--numPoints', default = 1000, type = int,
+        help = "Number of frequency points across the NMR band")
+parser.add_argument('--noPlot', '--no-plot', action = 'store_true',
+        help = "Only print the results")
+args = parser.parse_args()
+
+### Transistor ###
+(beta, c_pi, c_mu, r_b, v_t) = (args.beta, args.Cpi, args.Cmu, args.rb, SmallSignalModel.V_T)
+if args.part is not None:
+    library = SpiceModelLibrary.ModelLibrary(args.lib)
+    transistor = library.part_parameters(args.part, args.emitterCurrent)
+    (beta, c_pi, c_mu, v_t) = (transistor['beta'], transistor['c_pi'], transistor['c_mu'], transistor['v_t'])
+    r_b = float(library.npn_parameters([args.part])['RB'][0])
+
+model = SmallSignalModel.HybridPiModel(useCascode=args.useCascode, I_E=args.emitterCurrent, beta=beta,
+        c_pi=c_pi, c_mu=c_mu, RC=args.RC, R_parallel=args.rParallel, v_t=v_t)
+f = SmallSignalModel.nmr_band(args.numPoints)
+results = NoiseModel.evaluate(model, f, z_source=args.sourceImpedance, r_b=r_b)
+
+gain_db = 20*np.log10(CalculationUtils.magnitude(results['gain']))
+centre = len(f)//2
+added = sum(results['sources'].values())
+
+print('\n')
+print('************************************************************\n')
+print(model.amp_type + ' amplifier, I_E = ' + str(args.emitterCurrent*1e3) + ' mA, beta = ' + str(round(beta, 1)) +
+      ', r_b = ' + str(round(r_b, 2)) + ' Ohms, source ' + str(args.sourceImpedance) + ' Ohms\n')
+for k in [0, centre, -1]:
+    print('f = ' + str(round(f[k]/1e6, 1)) + ' MHz: NF = ' + str(round(results['noise_figure'][k], 3)) + ' dB, gain = ' +
+          str(round(gain_db[k], 2)) + ' dB')
+print('\nInput referred noise at ' + str(round(f[centre]/1e6, 1)) + ' MHz: ' +
+      str(round(np.sqrt(results['input_noise'][centre])*1e9, 3)) + ' nV/rtHz, of the added noise:')
+for (name, value) in sorted(results['sources'].items(), key=lambda item: -item[1][centre]):
+    print('  ' + name + ': ' + str(round(value[centre] / added[centre] * 100, 1)) + ' %')
+print('\n************************************************************\n')
+
+if args.noPlot:
+    sys.exit(0)
+
+import matplotlib.pyplot as plt
+
+plt.figure()
+plt.plot(f*1e-6, results['noise_figure'])
+plt.xlabel("Frequency (MHz)")
+plt.ylabel("Noise Figure (dB)")
+plt.title(model.amp_type + " Noise Figure")
+
+plt.figure()
+for (name, value) in results['sources'].items():
+    plt.semilogy(f*1e-6, np.sqrt(value)*1e9, label = name)
+plt.xlabel("Frequency (MHz)")
+plt.ylabel("Input Referred Noise (nV/" + r'$\sqrt{Hz}$' + ")")
+plt.title(model.amp_type + " Noise Contributions")
+plt.legend()
+
+plt.show()
@@ -2,7 +2,8 @@
 
 import matplotlib.pyplot as plt
 import numpy as np
-import argparse, CalculationUtils
+import argparse
+import BiasCalculations
 
 parser = argparse.ArgumentParser(
         description = "Plots amplifier sensitivity to changes in BJT properties")
@@ -21,6 +22,10 @@ parser.add_argument('--R3', default = 13, type = float,
         help = "Top resistor in the divider at the input of a cascode")
 parser.add_argument('--RE', default = 412, type = float,
         help = "Emitter resistor value")
+parser.add_argument('-n', '--resolution', default = 100, type = int,
+        help = "Number of Vbe and beta values along each side of the collector current error map")
+parser.add_argument('--float32', action = 'store_true',
+        help = "Compute the collector current error map in single precision to reduce memory use")
 args = parser.parse_args()
 
 ### Design Parameters ###
@@ -31,18 +36,6 @@ R2 = args.R2
 R3 = args.R3
 RE = args.RE
 
-def get_I_E_cascode(Vbe, beta, Vcc, R1, R2, R3, RE):
-        Vdiv = Vcc * R2 / (R1 + R2 + R3)
-        Rbott = R2 * (2*R3 + R1) / (R1 + R2 + R3)
-
-        return (Vdiv - Vbe) / (Rbott / beta + RE) 
-
-def get_I_E_CE(Vbe, beta, Vcc, R1, R2, RE):
-        Vdiv = Vcc * R2 / (R1 + R2)
-        Rbott = CalculationUtils.parallel(R1, R2)
-
-        return (Vdiv - Vbe) / (Rbott / beta + RE) 
-
 ### Plot Vbe Sensitivity ###
 Vbe = np.linspace(0.5, 1.25, 1000, endpoint= True)
 beta = np.linspace(100, 500, 5, endpoint = True)
@@ -50,9 +43,9 @@ beta = np.linspace(100, 500, 5, endpoint = True)
 plt.figure(figsize=(7,6))
 for beta_val in beta:
 	if args.useCascode:
-		I = get_I_E_cascode(Vbe=Vbe, beta=beta_val, Vcc=Vcc, R1=R1, R2=R2, R3=R3, RE=RE)
+		I = BiasCalculations.get_I_E_cascode(Vbe=Vbe, beta=beta_val, Vcc=Vcc, R1=R1, R2=R2, R3=R3, RE=RE)
 	else:
-		I = get_I_E_CE(Vbe=Vbe, beta=beta_val, Vcc=Vcc, R1=R1, R2=R2, RE=RE)
+		I = BiasCalculations.get_I_E_CE(Vbe=Vbe, beta=beta_val, Vcc=Vcc, R1=R1, R2=R2, RE=RE)
 	
 	plt.plot(Vbe, I, label = r'$\beta=$' + str(int(beta_val)))
 
@@ -68,9 +61,9 @@ beta = np.linspace(1, 500, 1000, endpoint = True)
 plt.figure(figsize=(7,6))
 for Vbe_val in Vbe:
 	if args.useCascode:
-		I = get_I_E_cascode(Vbe=Vbe_val, beta=beta, Vcc=Vcc, R1=R1, R2=R2, R3=R3, RE=RE)
+		I = BiasCalculations.get_I_E_cascode(Vbe=Vbe_val, beta=beta, Vcc=Vcc, R1=R1, R2=R2, R3=R3, RE=RE)
 	else:
-		I = get_I_E_CE(Vbe=Vbe_val, beta=beta, Vcc=Vcc, R1=R1, R2=R2, RE=RE)
+		I = BiasCalculations.get_I_E_CE(Vbe=Vbe_val, beta=beta, Vcc=Vcc, R1=R1, R2=R2, RE=RE)
 	
 	plt.semilogx(beta, I, label = r'$V_{be}=$' + str(round(Vbe_val,1)))
 
@@ -80,18 +73,13 @@ plt.title("Collector Current Sensitivity to BJT Current Amplification")
 plt.legend(loc='lower right')
 
 ### Plot Percent Difference From Target Current Due to BJT Characteristics ###
-Vbe = np.linspace(0.5, 1.25, 100, endpoint= True)
-beta = np.logspace(0, 2.7, 100, endpoint = True)
+Vbe = np.linspace(0.5, 1.25, args.resolution, endpoint= True)
+beta = np.logspace(0, 2.7, args.resolution, endpoint = True)
 
-I_per_error = np.empty([len(Vbe), len(beta)])
-for i in range(len(Vbe)):
-	for j in range((len(beta))):
-		if args.useCascode:
-			I = get_I_E_cascode(Vbe=Vbe[i], beta=beta[j], Vcc=Vcc, R1=R1, R2=R2, R3=R3, RE=RE)
-		else:
-			I = get_I_E_CE(Vbe=Vbe[i], beta=beta[j], Vcc=Vcc, R1=R1, R2=R2, RE=RE)
-		
-		I_per_error[i][j] = (I - I_E) / I_E * 100
+I_per_error = BiasCalculations.sensitivity_grid(useCascode=args.useCascode, I_target=I_E,
+		axes={'Vbe': Vbe, 'beta': beta},
+		fixed={'Vcc': Vcc, 'R1': R1, 'R2': R2, 'R3': R3, 'RE': RE},
+		dtype=np.float32 if args.float32 else np.float64)
 
 plt.figure(figsize=(7,6))
 c = plt.pcolor(Vbe, beta, I_per_error.T)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+import numpy as np
+import argparse
+import sys
+import time
+import ResultsStore
+
+parser = argparse.ArgumentParser(
+        description = "Queries a results store written by sweep_designs.py or calculate_R_values.py --store. " +
+        "Only the chunks and columns needed to answer the query are read")
+
+parser.add_argument('store',
+        help = "Directory of the results store")
+parser.add_argument('-w', '--where', action = 'append', default = [],
+        help = "Predicate 'column op value' with op one of ==, !=, <, <=, >, >=, between, in. " +
+        "between takes two values, in a comma separated list, e.g. -w 'feasible == 1' -w 'z_in_error < 2' " +
+        "-w 'I_E between 4e-3 6e-3'. Repeat to combine with AND")
+parser.add_argument('-c', '--columns', nargs = '+', default = None,
+        help = "Columns to output. All by default")
+parser.add_argument('-n', '--limit', default = None, type = int,
+        help = "Output at most this many rows")
+parser.add_argument('-s', '--sortBy', default = None,
+        help = "Sort the matching rows by this column")
+parser.add_argument('--descending', action = 'store_true',
+        help = "Sort from the largest value down")
+parser.add_argument('-o', '--output', default = None,
+        help = "CSV file the rows are written to. Printed to stdout if not provided")
+parser.add_argument('--count', action = 'store_true',
+        help = "Only print the number of matching rows")
+parser.add_argument('--describe', action = 'store_true',
+        help = "Print the columns, their dtypes and ranges and the number of rows and chunks")
+args = parser.parse_args()
+
+def parse_predicate(text):
+    tokens = text.split()
+    if len(tokens) < 3 or tokens[1] not in ResultsStore.OPERATORS:
+        raise ValueError("Can't parse predicate '" + text + "', expected 'column op value'")
+
+    (column, op) = tokens[:2]
+    values = [float(value) for value in ' '.join(tokens[2:]).replace(',', ' ').split()]
+    if op == 'between':
+        if len(values) != 2:
+            raise ValueError("between takes two values: '" + text + "'")
+        return (column, op, tuple(values))
+    if op == 'in':
+        return (column, op, values)
+    if len(values) != 1:
+        raise ValueError("'" + text + "' compares against more than one value")
+    return (column, op, values[0])
+
+store = ResultsStore.ResultsStore(args.store)
+
+if args.describe:
+    print(args.store + ': ' + str(len(store)) + ' rows in ' + str(len(store.chunks)) + ' chunks\n')
+    for (name, dtype) in store.metadata['columns'].items():
+        ranges = [chunk['stats'][name] for chunk in store.chunks if chunk['stats'].get(name) and chunk['stats'][name][0] is not None]
+        # stats are [min, max] or, in stores written since NaNs are counted, [min, max, nans]
+        span = (' [' + str(min(stats[0] for stats in ranges)) + ', ' + str(max(stats[1] for stats in ranges)) + ']') if ranges else ''
+        nans = sum(chunk['stats'][name][2] for chunk in store.chunks if len(chunk['stats'].get(name) or ()) > 2)
+        if nans:
+            span += ', ' + str(nans) + ' NaN'
+        print('  ' + name + ' (' + str(np.dtype(dtype)) + ')' + span)
+    sys.exit(0)
+
+where = [parse_predicate(text) for text in args.where]
+start = time.perf_counter()
+
+if args.count:
+    print(store.count(where))
+    print('Query took ' + str(round((time.perf_counter() - start)*1e3, 1)) + ' ms', file = sys.stderr)
+    sys.exit(0)
+
+columns = args.columns if args.columns is not None else store.columns
+sort_column = args.sortBy
+requested = columns + ([sort_column] if sort_column is not None and sort_column not in columns else [])
+
+# the limit can only be pushed into the scan if the rows don't need sorting first
+rows = store.query(where, requested, limit=None if sort_column is not None else args.limit)
+if sort_column is not None:
+    order = np.argsort(rows[sort_column], kind='stable')
+    if args.descending:
+        order = order[::-1]
+    rows = {name: value[order][:args.limit] for (name, value) in rows.items()}
+
+elapsed = time.perf_counter() - start
+
+table = np.column_stack([rows['row']] + [rows[name].astype(float) for name in columns]) if len(rows['row']) else \
+        np.empty((0, len(columns) + 1))
+np.savetxt(args.output if args.output is not None else sys.stdout, table, delimiter=',',
+        header=','.join(['row'] + columns), comments='', fmt='%.6g')
+
+print(str(len(rows['row'])) + ' rows in ' + str(round(elapsed*1e3, 1)) + ' ms', file = sys.stderr)
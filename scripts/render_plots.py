@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import sys
+import time
+import PlotRenderer
+
+parser = argparse.ArgumentParser(
+        description = "Renders the gain, phase, input impedance, sensitivity and simulation figures " +
+        "of every design in a manifest to image files, without a display")
+
+parser.add_argument('manifest',
+        help = "json manifest listing the designs and simulation files to plot")
+parser.add_argument('-j', '--workers', default = os.cpu_count(), type = int,
+        help = "Number of worker processes")
+parser.add_argument('-f', '--force', action = 'store_true',
+        help = "Render every figure, even if its inputs haven't changed")
+parser.add_argument('--chunkSize', default = 8, type = int,
+        help = "Number of figures handed to a worker at once")
+args = parser.parse_args()
+
+# worker processes re-import this file on platforms without fork
+if __name__ == '__main__':
+    start = time.perf_counter()
+    jobs = PlotRenderer.load_manifest(args.manifest)
+    (rendered, skipped, failed) = PlotRenderer.render_all(jobs, workers=args.workers, force=args.force,
+            chunk_size=args.chunkSize)
+    elapsed = time.perf_counter() - start
+
+    print('Rendered ' + str(rendered) + ' figures, skipped ' + str(skipped) + ' unchanged, ' +
+          str(len(failed)) + ' failed in ' + str(round(elapsed, 2)) + ' s')
+    for (path, error) in failed:
+        print(path + ': ' + error, file = sys.stderr)
+
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+import Benchmarks
+
+parser = argparse.ArgumentParser(
+        description = "Times the compute paths of the scripts on realistic sizes, traces their peak memory " +
+        "and records the results as json")
+
+parser.add_argument('-o', '--output', default = None,
+        help = "json file to write the results to")
+parser.add_argument('-c', '--compare', default = None,
+        help = "json file of an earlier run to compare against")
+parser.add_argument('-t', '--threshold', default = 20, type = float,
+        help = "Slowdown in percent (of the fastest run) reported as a regression with --compare")
+parser.add_argument('-f', '--filter', default = None, nargs = '+',
+        help = "Only run benchmarks whose name contains one of these strings")
+parser.add_argument('-q', '--quick', action = 'store_true',
+        help = "Only run the smallest sizes")
+parser.add_argument('-r', '--repeats', default = 5, type = int,
+        help = "Minimum number of timed runs per benchmark")
+args = parser.parse_args()
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output = True, text = True,
+                cwd = os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+names = [name for name in Benchmarks.BENCHMARKS
+         if args.filter is None or any(pattern in name for pattern in args.filter)]
+
+results = {}
+for name in names:
+    (_, sizes, quick_sizes) = Benchmarks.BENCHMARKS[name]
+    for size in (quick_sizes if args.quick else sizes):
+        key = name + '[' + str(size) + ']'
+        results[key] = Benchmarks.run(name, size, repeats = args.repeats)
+        print('{:<40}{:>12.3f} ms{:>12.3f} ms median{:>10.1f} MB peak'.format(key, results[key]['min']*1e3,
+                results[key]['median']*1e3, results[key]['peak_bytes'] / 2**20))
+        if 'reference_min' in results[key]:
+            print('{:<40}{:>12.3f} ms{:>19}{:>10.1f} MB peak'.format('  previous implementation',
+                    results[key]['reference_min']*1e3, '', results[key]['reference_peak_bytes'] / 2**20))
+        sys.stdout.flush()
+
+record = {
+    'commit': git_commit(),
+    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    'python': platform.python_version(),
+    'numpy': np.__version__,
+    'machine': platform.machine(),
+    'processor': platform.processor(),
+    'cpu_count': os.cpu_count(),
+    'results': results,
+}
+
+if args.output is not None:
+    with open(args.output, 'w') as output_file:
+        json.dump(record, output_file, indent = 1)
+
+if args.compare is not None:
+    with open(args.compare) as baseline_file:
+        baseline = json.load(baseline_file)
+
+    regressions = []
+    print('\nCompared with ' + args.compare + ' (commit ' + str(baseline.get('commit')) + '):')
+    for (key, result) in results.items():
+        if key not in baseline['results']:
+            continue
+        change = (result['min'] / baseline['results'][key]['min'] - 1) * 100
+        print('{:<40}{:>+10.1f} %'.format(key, change))
+        if change > args.threshold:
+            regressions.append(key)
+
+    if regressions:
+        print('\n' + str(len(regressions)) + ' regressions above ' + str(args.threshold) + ' %: ' + ', '.join(regressions))
+        sys.exit(1)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+import numpy as np
+import argparse
+import CalculationUtils
+import DesignOptimizer
+import SmallSignalModel
+import SpiceModelLibrary
+
+parser = argparse.ArgumentParser(
+        description = "Evaluates the gain and input match of one amplifier design with every transistor " +
+        "in a SPICE model library, using bias dependent hybrid-pi parameters from each model card")
+
+parser.add_argument('-d', '--useCascode', action = 'store_true',
+        help = "Flag to indicate which amplifier to use: Cascode if called, Common-Emitter otherwise")
+parser.add_argument('-i', '--emitterCurrent',  default = 5e-3, type = float,
+        help = "Target current flow in the emitter branch.")
+parser.add_argument('--Vce', default = 1.0, type = float,
+        help = "Collector-emitter voltage of the transistor, sets C_mu and the transit time")
+parser.add_argument('--RC', default = 50, type = float,
+        help = "Collector resistor value")
+parser.add_argument('-r', '--rParallel', default = 50, type = float,
+        help = "The parallel combination of the input resistors (R1 || R2)")
+parser.add_argument('-z', '--targetImpedance', default = 50, type = float,
+        help = "The impedance to match the input to")
+parser.add_argument('-n', '--numPoints', default = 200, type = int,
+        help = "Number of frequency points across the NMR band")
+parser.add_argument('-s', '--sortBy', default = 'gain', choices = ['gain', 'match'],
+        help = "Rank parts by lowest band gain or by worst input reflection")
+parser.add_argument('--top', default = 20, type = int,
+        help = "Number of parts to list")
+parser.add_argument('--lib', default = SpiceModelLibrary.DEFAULT_LIBRARY,
+        help = "SPICE model library to screen")
+args = parser.parse_args()
+
+library = SpiceModelLibrary.ModelLibrary(args.lib)
+f = SmallSignalModel.nmr_band(args.numPoints)
+
+# every part along the first axis, frequency along the second
+op = library.operating_point(args.emitterCurrent, Vce=args.Vce)
+model = library.hybrid_pi(useCascode=args.useCascode, I_E=args.emitterCurrent, Vce=args.Vce,
+        RC=args.RC, R_parallel=args.rParallel)
+results = model.evaluate(f)
+
+gain_db = 20*np.log10(CalculationUtils.magnitude(results['gain']))
+reflection = np.abs(DesignOptimizer.reflection_coefficient(results['z_in'], args.targetImpedance))
+
+min_gain = np.min(gain_db, axis=-1)
+max_reflection = np.max(reflection, axis=-1)
+order = np.argsort(-min_gain if args.sortBy == 'gain' else max_reflection, kind='stable')
+
+print('\n')
+print('************************************************************\n')
+print("Calculating for amplifier type: " + model.amp_type)
+print("Screened " + str(len(library.parts)) + " parts at I_E = " + str(args.emitterCurrent*1e3) + " mA\n")
+print('{:<16}{:>8}{:>10}{:>10}{:>10}{:>10}{:>10}'.format('part', 'beta', 'Cpi (pF)', 'Cmu (fF)',
+        'gm (mS)', 'Gmin (dB)', '|G|max'))
+for i in order[:args.top]:
+    print('{:<16}{:>8.1f}{:>10.3f}{:>10.2f}{:>10.1f}{:>10.2f}{:>10.3f}'.format(library.parts[i],
+            op['beta'][i], op['c_pi'][i]*1e12, op['c_mu'][i]*1e15, op['g_m'][i]*1e3,
+            min_gain[i], max_reflection[i]))
+print('\n************************************************************\n')
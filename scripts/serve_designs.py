@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import DesignServer
+import ResultCache
+import SpiceModelLibrary
+
+parser = argparse.ArgumentParser(
+        description = "Runs a persistent JSON-RPC server answering R-value, gain, input impedance and " +
+        "sensitivity queries, one request or batch per line. Serves stdin/stdout unless a socket or port is given")
+
+parser.add_argument('-s', '--socket', default = None,
+        help = "Unix socket to listen on")
+parser.add_argument('-p', '--port', default = None, type = int,
+        help = "TCP port to listen on. Only the local host is served")
+parser.add_argument('--lib', default = SpiceModelLibrary.DEFAULT_LIBRARY,
+        help = "SPICE model library loaded at startup and used for requests naming a part")
+parser.add_argument('--cacheDir', default = os.environ.get('NMR_CACHE_DIR'),
+        help = "Directory of the on-disk result cache. Defaults to $NMR_CACHE_DIR, results are kept in memory if neither is set")
+parser.add_argument('--cacheSize', default = 256, type = float,
+        help = "Size limit of the on-disk result cache in MB")
+parser.add_argument('--cacheItems', default = 64, type = int,
+        help = "Number of results kept in memory")
+args = parser.parse_args()
+
+cache = ResultCache.ResultCache(args.cacheDir, max_bytes=args.cacheSize*2**20, memory_items=args.cacheItems)
+server = DesignServer.DesignServer(cache=cache, library=args.lib)
+
+# parse (or load the index of) the library before the first request needs it
+server.library()
+
+# stopping with kill still removes the socket and trims the cache
+signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+def listening(_):
+    print('Serving designs on ' + (args.socket or '127.0.0.1:' + str(args.port)), file = sys.stderr)
+
+try:
+    if args.socket is not None or args.port is not None:
+        asyncio.run(server.serve_socket(path=args.socket, port=args.port, ready=listening))
+    else:
+        asyncio.run(server.serve_stdio(sys.stdin.buffer, sys.stdout.buffer))
+except KeyboardInterrupt:
+    pass
+finally:
+    if args.socket is not None and os.path.exists(args.socket):
+        os.remove(args.socket)
+    if cache.directory is not None:
+        cache.evict()
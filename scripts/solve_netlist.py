@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+import numpy as np
+import argparse
+import sys
+import time
+import matplotlib.pyplot as plt
+import CalculationUtils
+import DesignOptimizer
+import MNASolver
+import SmallSignalModel
+
+parser = argparse.ArgumentParser(
+        description = "Solves the AC analysis of an LTspice netlist with hybrid-pi transistor models, " +
+        "optionally comparing it with the single stage amplifier model")
+
+parser.add_argument('netlist', nargs = '?', default = '../LTspice/Cascode/cascode.net',
+        help = "LTspice netlist (.net) to solve")
+parser.add_argument('-t', '--trace', default = 'V(vout)/V(vin)',
+        help = "Trace to plot, e.g. V(vout) or V(vout)/V(vin)")
+parser.add_argument('-i', '--emitterCurrent',  default = 5e-3, type = float,
+        help = "Emitter current of every transistor")
+parser.add_argument('--Vce', default = 1.0, type = float,
+        help = "Collector-emitter voltage of every transistor, used for the model card capacitances")
+parser.add_argument('-b', '--beta', default = None, type = float,
+        help = "Current amplification factor of every transistor. Taken from the model card if not provided")
+parser.add_argument('--Cpi', default = None, type = float,
+        help = "C_pi of every transistor. Taken from the model card if not provided")
+parser.add_argument('--Cmu', default = None, type = float,
+        help = "C_mu of every transistor. Taken from the model card if not provided")
+parser.add_argument('--gm', default = None, type = float,
+        help = "Transconductance of every transistor. Taken from the model card if not provided")
+parser.add_argument('-c', '--compare', action = 'store_true',
+        help = "Compare the gain with the hybrid-pi amplifier model of amp_gain_calculator.py")
+parser.add_argument('-d', '--useCascode', action = 'store_true',
+        help = "Amplifier type used with --compare: Cascode if called, Common-Emitter otherwise")
+parser.add_argument('--RC', default = 50, type = float,
+        help = "Collector resistor value used with --compare")
+parser.add_argument('-s', '--sweep', default = None, nargs = 3, metavar = ('ELEMENT', 'START', 'STOP'),
+        help = "Sweep the value of one R, C or L between START and STOP instead of solving once, e.g. -s R1 20 200")
+parser.add_argument('--sweepPoints', default = 500, type = int,
+        help = "Number of values in the sweep")
+parser.add_argument('--logSweep', action = 'store_true',
+        help = "Space the swept values logarithmically")
+parser.add_argument('-z', '--targetImpedance', default = 50, type = float,
+        help = "Impedance to match to when sweeping a Z(source) trace")
+args = parser.parse_args()
+
+overrides = {name: value for (name, value) in
+             [('beta', args.beta), ('c_pi', args.Cpi), ('c_mu', args.Cmu), ('g_m', args.gm)] if value is not None}
+
+# one element swept over many values, every value solved with a rank-1 update
+if args.sweep is not None:
+    (element, low, high) = (args.sweep[0], float(args.sweep[1]), float(args.sweep[2]))
+    values = (np.geomspace if args.logSweep else np.linspace)(low, high, args.sweepPoints)
+
+    start = time.perf_counter()
+    circuit = MNASolver.ACCircuit(args.netlist, I_E=args.emitterCurrent, Vce=args.Vce, overrides=overrides)
+    (f, traces) = circuit.sweep(element, values, [args.trace])
+    elapsed = time.perf_counter() - start
+    surface = traces[args.trace]
+
+    # impedances are ranked by their worst reflection, gains by their lowest magnitude in the band
+    if args.trace.strip().lower().startswith('z('):
+        worst = np.max(np.abs(DesignOptimizer.reflection_coefficient(surface, args.targetImpedance)), axis=1)
+        best = np.argmin(worst)
+        summary = 'max |reflection| = ' + str(round(worst[best], 4)) + ' against ' + str(args.targetImpedance) + ' Ohms'
+    else:
+        lowest = np.min(20*np.log10(CalculationUtils.magnitude(surface)), axis=1)
+        best = np.argmax(lowest)
+        summary = 'lowest magnitude in the band = ' + str(round(lowest[best], 3)) + ' dB'
+
+    print('\n')
+    print('************************************************************\n')
+    print('Swept ' + element + ' of ' + circuit.netlist.title + ' over ' + str(len(values)) + ' values x ' +
+          str(len(f)) + ' frequencies in ' + str(round(elapsed, 3)) + ' s\n')
+    print('Best ' + element + ' = ' + str(round(values[best], 4)) + ': ' + summary)
+    print('\n************************************************************\n')
+
+    plt.figure(figsize=(7,6))
+    c = plt.pcolormesh(f/1e6, values, 20*np.log10(CalculationUtils.magnitude(surface)), shading = 'auto')
+    if args.logSweep:
+        plt.yscale('log')
+    plt.xlabel("Frequency (MHz)")
+    plt.ylabel(element + " Value")
+    plt.title(args.trace + " of " + circuit.netlist.title)
+    cbar = plt.colorbar(c)
+    cbar.set_label("Magnitude (dB)")
+    plt.show()
+    sys.exit(0)
+
+start = time.perf_counter()
+circuit = MNASolver.ACCircuit(args.netlist, I_E=args.emitterCurrent, Vce=args.Vce, overrides=overrides)
+result = circuit.solve()
+elapsed = time.perf_counter() - start
+
+f = result.axis
+trace = result[args.trace]
+
+print('\n')
+print('************************************************************\n')
+print('Solved ' + circuit.netlist.title + ': ' + str(len(circuit.nodes)) + ' nodes, ' +
+      str(len(circuit.transistors)) + ' transistors, ' + str(len(f)) + ' frequencies in ' +
+      str(round(elapsed*1e3, 1)) + ' ms\n')
+for transistor in circuit.transistors:
+    p = transistor['parameters']
+    print(transistor['name'] + ' (' + transistor['part'] + '): beta = ' + str(round(p['beta'], 1)) +
+          ', C_pi = ' + str(round(p['c_pi']*1e12, 4)) + ' pF, C_mu = ' + str(round(p['c_mu']*1e12, 4)) +
+          ' pF, g_m = ' + str(round(p['g_m']*1e3, 2)) + ' mS')
+
+if args.compare:
+    # same transistor parameters as the first transistor of the netlist
+    p = circuit.transistors[0]['parameters']
+    model = SmallSignalModel.HybridPiModel(useCascode=args.useCascode, I_E=p['I_E'], beta=p['beta'],
+            c_pi=p['c_pi'], c_mu=p['c_mu'], RC=args.RC, v_t=p['I_E']/p['g_m'])
+    # the model leaves out the inversion of the amplifier
+    model_gain = -model.gain(f)
+
+    error_db = 20*np.log10(CalculationUtils.magnitude(trace)/CalculationUtils.magnitude(model_gain))
+    error_deg = np.rad2deg(np.angle(trace/model_gain))
+    print('\nCompared with the ' + model.amp_type + ' hybrid-pi model:')
+    print('Max magnitude difference = ' + str(round(np.max(np.abs(error_db)), 4)) + ' dB')
+    print('Max phase difference = ' + str(round(np.max(np.abs(error_deg)), 3)) + ' degrees')
+print('\n************************************************************\n')
+
+fig, ax1 = plt.subplots(figsize=(8,5))
+
+color = 'tab:red'
+ax1.set_xlabel('Frequency (MHz)')
+ax1.set_ylabel('Magnitude (dB)', color=color)
+ax1.semilogx(f/1e6, 20*np.log10(CalculationUtils.magnitude(trace)), color = color)
+ax1.tick_params(axis='y', labelcolor = color)
+ax1.title.set_text(args.trace + " of " + circuit.netlist.title)
+
+ax2 = ax1.twinx()
+
+color = 'tab:blue'
+ax2.set_ylabel('Phase (degrees)', color=color)
+ax2.semilogx(f/1e6, np.rad2deg(CalculationUtils.phase(trace)), color = color)
+ax2.tick_params(axis='y', labelcolor=color)
+
+fig.tight_layout()
+plt.show()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+import numpy as np
+import argparse
+import time
+import BiasCalculations
+import CalculationUtils
+import DesignOptimizer
+import NoiseModel
+import ResultsStore
+import SmallSignalModel
+
+parser = argparse.ArgumentParser(
+        description = "Sweeps emitter current, RC and R1||R2 of an amplifier design and appends the resistor " +
+        "values, feasibility and gain/input impedance/noise figure summaries of every design to a results store")
+
+parser.add_argument('store',
+        help = "Directory of the results store. Created if it doesn't exist, appended to otherwise")
+parser.add_argument('-d', '--useCascode', action = 'store_true',
+        help = "Flag to indicate which amplifier to use: Cascode if called, Common-Emitter otherwise")
+parser.add_argument('-v', '--Vcc', default = 3.3, type = float,
+        help = "The power supply voltage of the circuit.")
+parser.add_argument('--Vbe', default = 0.76, type = float,
+        help = "The base emitter voltage of the BJT")
+parser.add_argument('--Vce1', default = 1, type = float,
+        help = "The desired collector-emitter voltage of the BJT. V_CE for Q1 if cascode")
+parser.add_argument('--Vce2', default = 0.4, type = float,
+        help = "The desired collector-emitter voltage for Q2 in a cascode amplifier")
+parser.add_argument('-i', '--emitterCurrent', nargs = 3, default = [1e-3, 20e-3, 100], type = float,
+        metavar = ('START', 'STOP', 'N'), help = "Emitter currents swept")
+parser.add_argument('--RC', nargs = 3, default = [20, 200, 100], type = float,
+        metavar = ('START', 'STOP', 'N'), help = "Collector resistor values swept")
+parser.add_argument('-r', '--rParallel', nargs = 3, default = [20, 200, 100], type = float,
+        metavar = ('START', 'STOP', 'N'), help = "Values of R1||R2 swept")
+parser.add_argument('-m', '--maximum_input_impedance', action = 'store_true',
+        help = "Ignore the R1||R2 sweep and maximize the resistor combination of every design")
+parser.add_argument('-b', '--beta', default = 330, type = float,
+        help = "Current amplification factor of the transistor")
+parser.add_argument('--Cpi', default = 0.595e-12, type = float,
+        help = "C_pi of the chosen transistor in the Hybrid Pi Model")
+parser.add_argument('--Cmu', default = 0.147e-12, type = float,
+        help = "C_mu of the chosen transistor in the Hybrid Pi Model")
+parser.add_argument('--rb', default = 5.5, type = float,
+        help = "Base resistance of the transistor, for the noise figure")
+parser.add_argument('-z', '--targetImpedance', default = 50, type = float,
+        help = "Impedance the input is matched to. z_in_error is |Z_in - target| at the band centre. Also the " +
+        "source impedance of the noise figure")
+parser.add_argument('-n', '--numPoints', default = 100, type = int,
+        help = "Number of frequency points across the NMR band for the gain and reflection summaries")
+parser.add_argument('--chunkSize', default = 2**14, type = int,
+        help = "Number of designs evaluated and stored per chunk")
+args = parser.parse_args()
+
+### Sweep ###
+axes = [np.linspace(args.emitterCurrent[0], args.emitterCurrent[1], int(args.emitterCurrent[2])),
+        np.linspace(args.RC[0], args.RC[1], int(args.RC[2])),
+        np.linspace(args.rParallel[0], args.rParallel[1], int(args.rParallel[2]))]
+shape = tuple(len(axis) for axis in axes)
+n_designs = int(np.prod(shape))
+
+f = SmallSignalModel.nmr_band(args.numPoints)
+f_centre = (SmallSignalModel.F_MIN + SmallSignalModel.F_MAX)/2
+
+store = ResultsStore.ResultsStore(args.store)
+start = time.perf_counter()
+
+# the grid is never built as a whole, every chunk unravels its own flat indices
+for first in range(0, n_designs, args.chunkSize):
+    (i, j, k) = np.unravel_index(np.arange(first, min(first + args.chunkSize, n_designs)), shape)
+    (I_E, RC, R_parallel) = (axes[0][i], axes[1][j], axes[2][k])
+
+    results = BiasCalculations.solve_R_values(useCascode=args.useCascode, Vcc=args.Vcc, Vbe=args.Vbe,
+            Vce1=args.Vce1, Vce2=args.Vce2, I_E=I_E, RC=RC, R_parallel=R_parallel,
+            maximize_input_impedance=args.maximum_input_impedance)
+
+    model = SmallSignalModel.HybridPiModel(useCascode=args.useCascode, I_E=I_E, beta=args.beta,
+            c_pi=args.Cpi, c_mu=args.Cmu, RC=RC, R_parallel=results['R_parallel'])
+    band = NoiseModel.evaluate(model, f, z_source=args.targetImpedance, r_b=args.rb)
+    gain_db = 20*np.log10(CalculationUtils.magnitude(band['gain']))
+    z_centre = model.input_impedance(f_centre)
+
+    columns = {
+        'useCascode': args.useCascode, 'Vcc': float(args.Vcc), 'Vbe': float(args.Vbe), 'Vce1': float(args.Vce1),
+        'Vce2': float(args.Vce2), 'I_E': I_E, 'RC': RC, 'z_target': float(args.targetImpedance),
+        'gain_min_db': gain_db.min(axis=-1), 'gain_max_db': gain_db.max(axis=-1),
+        'z_in_real': z_centre.real, 'z_in_imag': z_centre.imag,
+        'z_in_error': CalculationUtils.magnitude(z_centre - args.targetImpedance),
+        'max_reflection': np.abs(DesignOptimizer.reflection_coefficient(band['z_in'], args.targetImpedance)).max(axis=-1),
+        'nf_min_db': band['noise_figure'].min(axis=-1), 'nf_max_db': band['noise_figure'].max(axis=-1),
+    }
+    columns.update(results)
+    store.append(columns)
+
+elapsed = time.perf_counter() - start
+print('Stored ' + str(n_designs) + ' designs in ' + str(round(elapsed, 2)) + ' s, ' + args.store +
+      ' now holds ' + str(len(store)) + ' designs in ' + str(len(store.chunks)) + ' chunks')